@@ -0,0 +1,124 @@
+"""
+故障现场记录开销基准
+在本机启动的Chromium中用本地页面模拟任务（输入提示词、点击生成、等待结果出现、几个网络请求），
+分别在关闭和开启故障现场记录时执行同样的任务，比较每个任务的平均耗时；
+另外单独测量写出一个失败现场的耗时（只在任务失败时发生）
+
+用法: python benchmarks/bench_flight_recorder.py [任务数] [--executable Chrome路径]
+（未安装Playwright自带的浏览器时，用 --executable 指定本机的Chrome/Chromium）
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.config_manager import config_manager
+from src.flight_recorder import flight_recorder
+from src.retry_engine import TaskFailure, FailureKind
+from src.task_source import TaskRecord
+
+SITE = 'https://bench.invalid/'
+PAGE = """
+<textarea class="prompt"></textarea>
+<div class="btn-group"><button id="generate">生成</button></div>
+<div id="cards"></div>
+<script>
+document.getElementById('generate').onclick = async () => {
+    const response = await fetch('/api/generate', {method: 'POST', body: document.querySelector('textarea').value});
+    const card = document.createElement('div');
+    card.className = 'card';
+    card.innerHTML = '<video src="/video.mp4"></video>' + '<p>' + (await response.text()) + '</p>';
+    for (let i = 0; i < 50; i++) card.innerHTML += '<div class="history-item">历史记录 ' + i + '</div>';
+    document.getElementById('cards').prepend(card);
+};
+</script>
+"""
+
+
+async def serve(route):
+    if route.request.url == SITE:
+        await route.fulfill(content_type='text/html; charset=utf-8', body=PAGE)
+    elif route.request.url.endswith('/api/generate'):
+        await route.fulfill(content_type='application/json', body='{"task_id": "bench"}')
+    else:
+        await route.fulfill(status=204)
+
+
+async def run_task(page, index: int):
+    await page.fill('textarea.prompt', f'提示词 {index}')
+    await page.click('#generate')
+    await page.wait_for_selector(f'.card >> nth={index}', state='attached')
+    await page.evaluate("document.querySelectorAll('.card').length")
+
+
+async def measure(context, page, tasks: int, recorder: bool) -> list:
+    config_manager.get_user_config()['flight_recorder'] = {'enabled': recorder}
+    if recorder:
+        await flight_recorder.attach(context, page)
+    await page.goto(SITE)
+    durations = []
+    for index in range(tasks):
+        task = TaskRecord('bench', None, index + 1, '', '')
+        start = time.perf_counter()
+        await flight_recorder.begin_task(f'bench #{index}')
+        await run_task(page, index)
+        await flight_recorder.end_task(task, True, page)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="故障现场记录开销基准")
+    parser.add_argument('tasks', type=int, nargs='?', default=50)
+    parser.add_argument('--executable', help="Chrome/Chromium可执行文件路径")
+    args = parser.parse_args()
+
+    from playwright.async_api import async_playwright
+    dump_dir = Path(tempfile.mkdtemp(prefix='flight_recorder_bench_'))
+    flight_recorder.dump_dir = lambda: dump_dir
+    config_manager.user_config = config_manager.get_default_config()
+
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(executable_path=args.executable)
+        results = {}
+        # 开启记录后追踪会一直保留在上下文上，两种情况各用一个新的上下文
+        for name, recorder in (('关闭记录', False), ('开启记录', True)):
+            context = await browser.new_context()
+            await context.route('https://bench.invalid/**', serve)
+            page = await context.new_page()
+            await measure(context, page, 5, recorder)          # 预热
+            results[name] = await measure(context, page, args.tasks, recorder)
+
+            if recorder:
+                # 写出一个失败现场
+                task = TaskRecord('bench', None, 0, '', 'bench')
+                task.last_failure = TaskFailure(FailureKind.SELECTOR_NOT_FOUND, '基准测试中的失败')
+                await flight_recorder.begin_task('bench failure')
+                await run_task(page, args.tasks + 5)
+                start = time.perf_counter()
+                await flight_recorder.end_task(task, False, page)
+                dump_seconds = time.perf_counter() - start
+            await context.close()
+        await browser.close()
+
+    print(f"任务数: {args.tasks}")
+    print(f"{'情况':<8} {'平均(ms)':>10} {'中位数(ms)':>11} {'p95(ms)':>9}")
+    for name, durations in results.items():
+        ordered = sorted(durations)
+        print(f"{name:<8} {statistics.mean(durations) * 1000:>10.1f} {statistics.median(durations) * 1000:>11.1f} "
+              f"{ordered[int(len(ordered) * 0.95) - 1] * 1000:>9.1f}")
+    base, recorded = statistics.mean(results['关闭记录']), statistics.mean(results['开启记录'])
+    print(f"每个任务增加: {(recorded - base) * 1000:.1f} ms（{recorded / base - 1:+.0%}）")
+    dumps = list(dump_dir.glob('*.zip'))
+    size = dumps[0].stat().st_size / 1024 if dumps else 0
+    print(f"写出一个失败现场: {dump_seconds * 1000:.0f} ms，{size:.0f} KB（{dump_dir}）")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""
+任务清单解析性能基准
+生成相同内容的 xlsx / csv / jsonl / parquet 清单，比较各格式的解析耗时
+
+用法: python benchmarks/bench_manifest_formats.py [行数] [重复次数]
+"""
+
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.task_source import iter_manifest_rows
+
+PROMPT_COLUMN = 3
+STATUS_COLUMN = 5
+HEADER = ['序号', '图片', '提示词', '备注', '状态']
+
+
+def build_rows(row_count):
+    """生成测试数据，每10行有1行已完成"""
+    return [
+        [i, f'{i}_image.jpg', f'第{i}个视频的提示词，镜头缓慢推进', '', '已生成视频' if i % 10 == 0 else '']
+        for i in range(1, row_count + 1)
+    ]
+
+
+def write_xlsx(path, rows):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def write_jsonl(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(HEADER, row)), ensure_ascii=False) + '\n')
+
+
+def write_parquet(path, rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = list(zip(*rows))
+    table = pa.table({name: [str(v) for v in values] for name, values in zip(HEADER, columns)})
+    pq.write_table(table, path)
+
+
+WRITERS = [
+    ('.xlsx', write_xlsx),
+    ('.csv', write_csv),
+    ('.jsonl', write_jsonl),
+    ('.parquet', write_parquet),
+]
+
+
+def time_parse(path, repeat):
+    """返回 (最短耗时秒, 待处理行数)"""
+    best = None
+    pending = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pending = sum(
+            1 for _, prompt, status, _ in iter_manifest_rows(path, PROMPT_COLUMN, STATUS_COLUMN)
+            if prompt and status != '已生成视频'
+        )
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, pending
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    rows = build_rows(row_count)
+
+    print(f"行数: {row_count}, 重复: {repeat} 次（取最短耗时）")
+    print(f"{'格式':<10} {'文件大小(KB)':>12} {'解析耗时(ms)':>14} {'每千行(ms)':>12} {'待处理':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for ext, writer in WRITERS:
+            path = os.path.join(tmp_dir, f'tasks{ext}')
+            try:
+                writer(path, rows)
+            except ImportError as e:
+                print(f"{ext:<10} 跳过（缺少依赖: {e.name}）")
+                continue
+            elapsed, pending = time_parse(path, repeat)
+            size_kb = os.path.getsize(path) / 1024
+            per_k = elapsed * 1000 / row_count * 1000
+            print(f"{ext:<10} {size_kb:>12.1f} {elapsed * 1000:>14.1f} {per_k:>12.2f} {pending:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+页面状态检查往返次数基准
+用模拟页面（每次调用固定延迟，模拟一次CDP往返）跑一个任务的三个检查步骤：
+上传验证、基础参数设置、等待生成完成，比较改造前逐元素查询和页面探针的往返次数与耗时
+
+用法: python benchmarks/bench_page_probe.py [单次往返延迟ms] [生成轮询次数]
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.config_manager import config_manager
+from src.page_probe import in_popup
+from src.selector_resolver import selector_resolver
+
+CHECK_INTERVAL = 0.01           # 模拟的生成检查间隔（秒）
+UPLOAD_PREVIEW_DELAY = 0.6      # 上传后预览框出现的时间（秒）
+VIDEO_URL = 'https://example.com/video.mp4'
+
+
+class SimPage:
+    """模拟页面：每个Playwright调用计一次往返并等待固定延迟"""
+
+    def __init__(self, rtt: float, generating_checks: int):
+        self.rtt = rtt
+        self.round_trips = 0
+        self.start = time.monotonic()
+        self.popup_open = False
+        self.params_done = False                # 参数设置完成后才开始模拟生成卡片
+        self.probe_installed = False
+        self.checks_left = generating_checks    # 还有几次检查显示"生成中"
+        self.selected = {'quality_options.faster', 'fps_options.fps_60'}
+        self.xpaths = self._option_xpaths()
+
+    @staticmethod
+    def _option_xpaths():
+        xpaths = {}
+        for group in ('quality_options', 'fps_options', 'resolution_options'):
+            for name, xpath in config_manager.get_web_element(f'elements.{group}').items():
+                xpaths[in_popup(xpath)] = f'{group}.{name}'
+        return xpaths
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt)
+
+    def _preview_visible(self):
+        return time.monotonic() - self.start >= UPLOAD_PREVIEW_DELAY
+
+    def _card_html(self):
+        if self.checks_left > 0:
+            self.checks_left -= 1
+            return '<div class="loadding"><div class="queue"><div class="desc">排队中，前面还有 3 人</div></div></div>'
+        return f'<video class="video-container loaded"><source type="video/mp4" src="{VIDEO_URL}"></video>'
+
+    def _exists(self, selector):
+        if selector == config_manager.get_web_element('elements.preview_box'):
+            return self._preview_visible()
+        if selector == config_manager.get_web_element('elements.basic_params_popup') or selector in self.xpaths:
+            return self.popup_open
+        return selector == config_manager.get_web_element('elements.generation_card')
+
+    # ---------- 逐元素查询接口 ----------
+
+    async def query_selector(self, selector):
+        await self._round_trip()
+        if not self._exists(selector):
+            return None
+        if selector == config_manager.get_web_element('elements.generation_card'):
+            return SimElement(self, self._card_html())
+        return SimElement(self, '')
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        await self._round_trip()
+        while not self._exists(selector):
+            await asyncio.sleep(0.05)
+
+    async def click(self, selector, timeout=None):
+        await self._round_trip()
+        if selector == selector_resolver.primary('basic_params_button'):
+            self.popup_open = not self.popup_open
+            self.params_done = not self.popup_open
+        elif selector in self.xpaths:
+            self.selected.add(self.xpaths[selector])
+
+    # ---------- 页面探针接口 ----------
+
+    async def evaluate(self, script, arg=None):
+        await self._round_trip()
+        if arg is not None:
+            self.probe_installed = True
+        if not self.probe_installed:
+            return None
+        elements = {'preview_box': {'visible': True, 'selected': False} if self._preview_visible() else None}
+        if self.popup_open:
+            elements['basic_params_popup'] = {'visible': True, 'selected': False}
+            for key in self.xpaths.values():
+                elements[key] = {'visible': True, 'selected': key in self.selected}
+        state = {'url': 'https://chatglm.cn/video', 'elements': elements, 'rate_limit': None, 'card': None}
+        if self.params_done:
+            generating = 'loadding' in self._card_html()
+            state['card'] = {
+                'generating': generating, 'finished': not generating,
+                'video_src': None if generating else VIDEO_URL, 'video_visible': not generating,
+                'queue_text': '排队中，前面还有 3 人' if generating else '', 'progress_text': '',
+            }
+        return state
+
+    async def wait_for_function(self, expression, timeout=None, polling=None):
+        await self._round_trip()
+        while not (self._preview_visible() if 'preview_box' in expression else self.popup_open):
+            await asyncio.sleep(0.05)
+
+
+class SimElement:
+    def __init__(self, page: SimPage, html: str):
+        self.page = page
+        self.html = html
+
+    async def inner_html(self):
+        await self.page._round_trip()
+        return self.html
+
+    async def query_selector(self, selector):
+        await self.page._round_trip()
+        if 'video' in selector and 'video' in self.html:
+            return SimElement(self.page, self.html)
+        return None
+
+    async def get_attribute(self, name):
+        await self.page._round_trip()
+        return VIDEO_URL
+
+    async def is_visible(self):
+        await self.page._round_trip()
+        return True
+
+
+# ---------- 基线：改造前的逐元素检查逻辑 ----------
+
+async def legacy_verify_upload(page):
+    preview_box_xpath = config_manager.get_web_element('elements.preview_box')
+    while not await page.query_selector(preview_box_xpath):
+        await asyncio.sleep(0.2)
+
+
+async def legacy_setup_basic_params(page):
+    button = selector_resolver.primary('basic_params_button')
+    await page.click(button)
+    await page.wait_for_selector(config_manager.get_web_element('elements.basic_params_popup'))
+    for key in ('quality_options.better', 'fps_options.fps_60', 'resolution_options.resolution_4k'):
+        xpath = in_popup(config_manager.get_web_element(f'elements.{key}'))
+        await page.wait_for_selector(xpath)
+        await page.click(xpath)
+    await page.click(button)
+
+
+async def legacy_wait_for_generation(page):
+    card_xpath = config_manager.get_web_element('elements.generation_card')
+    while True:
+        card = await page.query_selector(card_xpath)
+        html = await card.inner_html()
+        if 'loadding' in html:
+            await asyncio.sleep(CHECK_INTERVAL)
+            continue
+        source = await card.query_selector('source[type="video/mp4"]')
+        if source:
+            url = await source.get_attribute('src')
+            video = await card.query_selector('video')
+            if url and video and await video.is_visible():
+                await asyncio.sleep(2)  # 与控制器相同：额外等待视频加载
+                return url
+        await asyncio.sleep(CHECK_INTERVAL)
+
+
+async def run_legacy(page):
+    await legacy_verify_upload(page)
+    await legacy_setup_basic_params(page)
+    return await legacy_wait_for_generation(page)
+
+
+async def run_probe(page):
+    from src.browser_controller import BrowserController
+
+    controller = BrowserController()
+    controller.page = page
+    await controller.verify_upload('image.jpg')
+    await controller.setup_basic_params({'quality': '质量更佳', 'framerate': '帧率60', 'resolution': '4k'})
+    return await controller.wait_for_generation_complete()
+
+
+async def measure(runner, rtt, generating_checks):
+    page = SimPage(rtt, generating_checks)
+    start = time.perf_counter()
+    url = await runner(page)
+    assert url == VIDEO_URL
+    return page.round_trips, time.perf_counter() - start
+
+
+def main():
+    rtt_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    generating_checks = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+
+    # 去掉与往返无关的等待，保持两种实现的检查节奏一致
+    config = config_manager.get_default_config()
+    config['smart_delay'] = {key: 0 for key in config['smart_delay']}
+    config['generation_poll'] = {'min_interval': CHECK_INTERVAL, 'max_interval': CHECK_INTERVAL}
+    config_manager.user_config = config
+    config_manager.web_elements_config.setdefault('wait_times', {})['generation_check'] = CHECK_INTERVAL * 1000
+
+    print(f"单次往返延迟: {rtt_ms} ms, 生成中检查次数: {generating_checks}")
+    print(f"{'实现':<10} {'往返次数':>10} {'耗时(ms)':>10}")
+    results = {}
+    for name, runner in (('逐元素查询', run_legacy), ('页面探针', run_probe)):
+        round_trips, elapsed = asyncio.run(measure(runner, rtt_ms / 1000, generating_checks))
+        results[name] = round_trips
+        print(f"{name:<10} {round_trips:>10} {elapsed * 1000:>10.1f}")
+    print(f"往返次数减少: {1 - results['页面探针'] / results['逐元素查询']:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+本地模拟视频生成接口（用于开发和验证接口直连模式）
+模拟网站背后的三个接口，均要求登录Cookie：
+    POST /api/upload                multipart，文件字段 file，返回 {"code": 0, "data": {"image_id": ...}}
+    POST /api/video/generate        JSON {prompt, image_id, options}，返回 {"code": 0, "data": {"task_id": ...}}
+    GET  /api/video/status?task_id= 前两次返回生成中，之后返回 {"data": {"status": "done", "video_url": ...}}
+    GET  /videos/<task_id>.mp4
+shape=2 时返回结构改变（模拟网站改版），用于验证退回页面操作
+
+用法:
+    python benchmarks/stand_in_api.py [端口]         启动服务
+    python benchmarks/stand_in_api.py --selftest     模拟一次页面操作 -> 推断接口 -> 重放 -> 改版后检测
+"""
+
+import asyncio
+import itertools
+import json
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+SESSION_COOKIE = 'chatglm_token'
+SESSION_VALUE = 'stand-in-session'
+PENDING_POLLS = 2
+
+
+class StandInState:
+    def __init__(self):
+        self.shape = 1
+        self.serial = itertools.count(1001)
+        self.images = {}
+        self.tasks = {}
+        self.calls = []
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    state: StandInState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload=None, body=None, content_type='application/json'):
+        data = body if body is not None else json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        return f'{SESSION_COOKIE}={SESSION_VALUE}' in (self.headers.get('Cookie') or '')
+
+    def _wrap(self, data):
+        if self.state.shape == 1:
+            return {'code': 0, 'data': data}
+        return {'status': 'ok', 'result': data}
+
+    def do_GET(self):
+        path = urlsplit(self.path)
+        self.state.calls.append(('GET', path.path))
+        match = re.fullmatch(r'/videos/(\w+)\.mp4', path.path)
+        if match:
+            return self._reply(200, body=b'\x00\x00\x00\x18ftypmp42' + b'\x00' * 2048, content_type='video/mp4')
+        if not self._authorized():
+            return self._reply(401, {'code': 401, 'message': '未登录'})
+        if path.path == '/api/video/status':
+            task_id = parse_qs(path.query).get('task_id', [''])[0]
+            task = self.state.tasks.get(task_id)
+            if task is None:
+                return self._reply(404, {'code': 404, 'message': '任务不存在'})
+            task['polls'] += 1
+            if task['polls'] <= PENDING_POLLS:
+                return self._reply(200, self._wrap({'status': 'generating', 'progress': task['polls'] * 30}))
+            host = self.headers.get('Host')
+            return self._reply(200, self._wrap({'status': 'done', 'video_url': f'http://{host}/videos/{task_id}.mp4'}))
+        self._reply(404, {'code': 404})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        self.state.calls.append(('POST', path))
+        if not self._authorized():
+            return self._reply(401, {'code': 401, 'message': '未登录'})
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if path == '/api/upload':
+            if b'name="file"; filename=' not in body:
+                return self._reply(400, {'code': 400, 'message': '缺少文件'})
+            image_id = f'img_{next(self.state.serial)}'
+            self.state.images[image_id] = len(body)
+            return self._reply(200, self._wrap({'image_id': image_id}))
+        if path == '/api/video/generate':
+            request = json.loads(body)
+            if request.get('image_id') not in self.state.images or not request.get('prompt'):
+                return self._reply(400, {'code': 400, 'message': '参数错误'})
+            task_id = f'task{next(self.state.serial)}'
+            self.state.tasks[task_id] = {'polls': 0, 'request': request}
+            return self._reply(200, self._wrap({'task_id': task_id}))
+        self._reply(404, {'code': 404})
+
+
+def start_server(port=0):
+    """在后台线程启动服务，返回 (server, state, base_url)"""
+    state = StandInState()
+    handler = type('Handler', (StandInHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+async def _record_ui_exchanges(request_context, base_url, image_path, prompt, video_options):
+    """模拟页面操作时网站发出的请求，整理成 api_mode 记录的格式"""
+    exchanges = []
+
+    async def send(method, url, headers, post_data=None, **kwargs):
+        response = await request_context.fetch(url, method=method, headers=headers, **kwargs)
+        exchanges.append({
+            'method': method, 'url': url, 'headers': {k.lower(): v for k, v in headers.items()},
+            'post_data': post_data, 'status': response.status, 'response': await response.json(),
+        })
+        return exchanges[-1]['response']
+
+    boundary = 'StandInBoundary'
+    image = Path(image_path).read_bytes()
+    multipart = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="scene"\r\n\r\nvideo\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="a.jpg"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + image + f'\r\n--{boundary}--\r\n'.encode()
+    common = {'X-App-Version': '2.3.1'}
+    await send('GET', f'{base_url}/api/video/status?task_id=none', common)     # 无关请求（404）
+    uploaded = await send('POST', f'{base_url}/api/upload',
+                          {**common, 'Content-Type': f'multipart/form-data; boundary={boundary}'},
+                          post_data=multipart, data=multipart)
+    body = {'prompt': prompt, 'image_id': uploaded['data']['image_id'], 'options': video_options, 'source': 'web'}
+    body_bytes = json.dumps(body, ensure_ascii=False).encode()
+    created = await send('POST', f'{base_url}/api/video/generate',
+                         {**common, 'Content-Type': 'application/json'}, post_data=body_bytes, data=body_bytes)
+    task_id = created['data']['task_id']
+    while True:
+        status = await send('GET', f'{base_url}/api/video/status?task_id={task_id}', common)
+        if status['data'].get('video_url'):
+            return exchanges, status['data']['video_url']
+
+
+async def selftest():
+    import tempfile
+    from playwright.async_api import async_playwright
+    from src.config_manager import config_manager
+    from src.api_mode import ApiMode, ApiContractError, infer_contract
+
+    config = config_manager.get_default_config()
+    config['video_generation_timeout'] = 10000
+    config_manager.user_config = config
+    config_manager.web_elements_config.setdefault('wait_times', {})['generation_check'] = 50
+
+    server, state, base_url = start_server()
+    video_options = {'quality': '质量更佳', 'framerate': '帧率60', 'resolution': '4k'}
+    prompt = '一只猫在草地上奔跑'
+    with tempfile.TemporaryDirectory() as folder:
+        image_path = str(Path(folder) / 'a.jpg')
+        Path(image_path).write_bytes(b'\xff\xd8\xff' + b'\x00' * 4096)
+        async with async_playwright() as p:
+            cookies = [{'name': SESSION_COOKIE, 'value': SESSION_VALUE, 'domain': '127.0.0.1', 'path': '/',
+                        'expires': -1, 'httpOnly': False, 'secure': False, 'sameSite': 'Lax'}]
+            context = await p.request.new_context(storage_state={'cookies': cookies, 'origins': []})
+
+            exchanges, video_url = await _record_ui_exchanges(context, base_url, image_path, prompt, video_options)
+            contract = infer_contract(exchanges, prompt, video_url, video_options)
+            assert contract, '未能推断接口'
+            print('推断的接口:')
+            print(json.dumps(contract, ensure_ascii=False, indent=2))
+
+            api = ApiMode()
+            api.contract = contract
+            api._loaded = True
+            assert api.ready_for(video_options) and not api.ready_for({'resolution': '1080p'})
+            state.calls.clear()
+            url = await api.generate(context, image_path, '海边日落', video_options)
+            request = state.tasks[urlsplit(url).path.split('/')[-1][:-4]]['request']
+            assert request['prompt'] == '海边日落' and request['source'] == 'web', request
+            print(f"重放成功: {url}（{len(state.calls)} 次请求）")
+
+            state.shape = 2
+            try:
+                await api.generate(context, image_path, '改版后', video_options)
+                raise AssertionError('接口改版后应抛出 ApiContractError')
+            except ApiContractError as e:
+                print(f"改版检测成功: {e}")
+            await context.dispose()
+    server.shutdown()
+    print('自检通过')
+
+
+def main():
+    if '--selftest' in sys.argv:
+        asyncio.run(selftest())
+        return
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server, _, base_url = start_server(port)
+    print(f"模拟接口已启动: {base_url}（Cookie {SESSION_COOKIE}={SESSION_VALUE}），Ctrl+C 退出")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,7 @@
 
 import sys
 import os
-import asyncio
-import yaml
+from concurrent.futures import CancelledError
 import json
 from pathlib import Path
 from PyQt6.QtWidgets import (
@@ -19,7 +18,6 @@ from PyQt6.QtCore import QThread, pyqtSignal, Qt, QTimer
 from PyQt6.QtGui import QFont, QIcon, QPalette, QColor
 from loguru import logger
 from src.config_manager import config_manager
-from src.task_processor import task_processor
 from src.logger_handler import gui_log_handler, setup_gui_logging
 
 
@@ -35,18 +33,36 @@ class TaskWorker(QThread):
     def run(self):
         """在后台线程中运行任务"""
         try:
+            from src.session_manager import session_manager
+            
             # 直接将配置传递给config_manager
             config_manager.set_user_config(self.config_data)
             
-            # 运行异步任务
-            asyncio.run(self.run_task())
+            # 在常驻事件循环上运行，浏览器会话可以在多次运行之间复用
+            session_manager.run(self.run_task())
             
+        except CancelledError:
+            # 停止按钮取消了常驻事件循环上的运行（future.result() 抛出的是 concurrent.futures 的 CancelledError），
+            # 停止时界面已经处理了结束状态，这里不再发送完成信号
+            logger.info("任务已取消")
         except Exception as e:
             logger.error(f"任务执行失败: {e}")
             self.task_completed.emit(False)
     
+    def stop(self, timeout_ms=5000):
+        """取消正在运行的任务，超时仍未结束时强制终止线程"""
+        from src.session_manager import session_manager
+        
+        session_manager.cancel_current()
+        if not self.wait(timeout_ms):
+            self.terminate()
+            self.wait()
+    
     async def run_task(self):
         """运行主任务"""
+        # 任务处理器会间接加载Playwright等重量级模块，延迟到任务开始时再导入
+        from src.task_processor import task_processor
+        
         try:
             self.progress_updated.emit("正在初始化...")
             await task_processor.initialize()
@@ -71,6 +87,7 @@ class VideoGeneratorGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.worker = None
+        self.extra_config = {}  # 界面上没有对应控件的配置项（来自预设或已保存配置），原样保留
         self.auto_save_timer = QTimer()
         self.init_ui()
         self.setup_auto_save()  # 先设置自动保存（包含日志连接）
@@ -274,9 +291,14 @@ class VideoGeneratorGUI(QMainWindow):
         self.completed_status_edit = QLineEdit()
         self.completed_status_edit.setPlaceholderText("已生成视频")
         
+        self.priority_column_spinbox = QSpinBox()
+        self.priority_column_spinbox.setRange(0, 50)
+        self.priority_column_spinbox.setSpecialValueText("不使用")
+        
         excel_layout.addRow("提示词所在列:", self.prompt_column_spinbox)
         excel_layout.addRow("状态所在列:", self.status_column_spinbox)
         excel_layout.addRow("完成状态标记:", self.completed_status_edit)
+        excel_layout.addRow("优先级所在列:", self.priority_column_spinbox)
         
         layout.addWidget(excel_group)
         
@@ -305,9 +327,12 @@ class VideoGeneratorGUI(QMainWindow):
         self.resolution_combo = QComboBox()
         self.resolution_combo.addItems(["4k", "1080p"])
         
+        self.group_by_options_checkbox = QCheckBox("按视频参数分组调度（减少参数切换）")
+        
         video_layout.addRow("画质选择:", self.quality_combo)
         video_layout.addRow("帧率选择:", self.framerate_combo)
         video_layout.addRow("分辨率选择:", self.resolution_combo)
+        video_layout.addRow("", self.group_by_options_checkbox)
         
         layout.addWidget(video_group)
         
@@ -463,8 +488,7 @@ class VideoGeneratorGUI(QMainWindow):
     def get_config_file_path(self):
         """获取配置文件路径"""
         # 保存在用户主目录的隐藏文件
-        home_dir = Path.home()
-        return home_dir / ".chatglm_video_config.json"
+        return config_manager.get_user_config_file_path()
     
     def auto_save_config(self):
         """自动保存配置"""
@@ -513,12 +537,14 @@ class VideoGeneratorGUI(QMainWindow):
             self.prompt_column_spinbox.setValue(config.get('prompt_column', 3))
             self.status_column_spinbox.setValue(config.get('status_column', 5))
             self.completed_status_edit.setText(config.get('completed_status', '已生成视频'))
+            self.priority_column_spinbox.setValue(config.get('priority_column', 0))
             
             # 视频选项
             video_options = config.get('video_options', {})
             self.quality_combo.setCurrentText(video_options.get('quality', '速度更快'))
             self.framerate_combo.setCurrentText(video_options.get('framerate', '帧率60'))
             self.resolution_combo.setCurrentText(video_options.get('resolution', '4k'))
+            self.group_by_options_checkbox.setChecked(config.get('group_by_video_options', False))
             
             # 智能延时
             smart_delay = config.get('smart_delay', {})
@@ -531,6 +557,10 @@ class VideoGeneratorGUI(QMainWindow):
             # 下载配置
             self.download_timeout_spinbox.setValue(config.get('download_timeout', 60))
             
+            # 界面上没有的配置项原样保留
+            ui_keys = self.get_ui_config_data().keys()
+            self.extra_config = {k: v for k, v in config.items() if k not in ui_keys}
+            
         except Exception as e:
             logger.error(f"设置配置到UI失败: {e}")
     
@@ -551,12 +581,14 @@ class VideoGeneratorGUI(QMainWindow):
             self.prompt_column_spinbox.setValue(config.get('prompt_column', 3))
             self.status_column_spinbox.setValue(config.get('status_column', 5))
             self.completed_status_edit.setText(config.get('completed_status', '已生成视频'))
+            self.priority_column_spinbox.setValue(config.get('priority_column', 0))
             
             # 视频选项
             video_options = config.get('video_options', {})
             self.quality_combo.setCurrentText(video_options.get('quality', '速度更快'))
             self.framerate_combo.setCurrentText(video_options.get('framerate', '帧率60'))
             self.resolution_combo.setCurrentText(video_options.get('resolution', '4k'))
+            self.group_by_options_checkbox.setChecked(config.get('group_by_video_options', False))
             
             # 智能延时
             smart_delay = config.get('smart_delay', {})
@@ -569,6 +601,9 @@ class VideoGeneratorGUI(QMainWindow):
             # 下载配置
             self.download_timeout_spinbox.setValue(config.get('download_timeout', 60))
             
+            ui_keys = self.get_ui_config_data().keys()
+            self.extra_config = {k: v for k, v in config.items() if k not in ui_keys}
+            
             logger.info("默认配置加载完成")
             
         except Exception as e:
@@ -595,6 +630,8 @@ class VideoGeneratorGUI(QMainWindow):
         )
         if file_path:
             try:
+                import yaml
+                
                 config_data = self.get_config_data()
                 
                 if file_path.endswith('.json') or "JSON文件" in selected_filter:
@@ -621,6 +658,8 @@ class VideoGeneratorGUI(QMainWindow):
                     with open(file_path, 'r', encoding='utf-8') as f:
                         config = json.load(f)
                 else:
+                    import yaml
+                    
                     with open(file_path, 'r', encoding='utf-8') as f:
                         config = yaml.safe_load(f)
                 
@@ -633,12 +672,19 @@ class VideoGeneratorGUI(QMainWindow):
                 QMessageBox.critical(self, "错误", f"加载预设失败: {str(e)}")
     
     def get_config_data(self):
+        """获取完整配置数据（界面配置 + 界面上没有的配置项）"""
+        config = dict(self.extra_config)
+        config.update(self.get_ui_config_data())
+        return config
+    
+    def get_ui_config_data(self):
         """获取界面配置数据"""
         return {
             'root_directory': self.root_dir_edit.text(),
             'prompt_column': self.prompt_column_spinbox.value(),
             'status_column': self.status_column_spinbox.value(),
             'completed_status': self.completed_status_edit.text(),
+            'priority_column': self.priority_column_spinbox.value(),
             'bit_browser_id': self.browser_id_edit.text(),
             'headless': self.headless_checkbox.isChecked(),
             'timeout': self.timeout_spinbox.value(),
@@ -648,6 +694,7 @@ class VideoGeneratorGUI(QMainWindow):
                 'framerate': self.framerate_combo.currentText(),
                 'resolution': self.resolution_combo.currentText()
             },
+            'group_by_video_options': self.group_by_options_checkbox.isChecked(),
             'smart_delay': {
                 'min': self.min_delay_spinbox.value(),
                 'max': self.max_delay_spinbox.value(),
@@ -705,8 +752,7 @@ class VideoGeneratorGUI(QMainWindow):
     def stop_generation(self):
         """停止生成"""
         if self.worker and self.worker.isRunning():
-            self.worker.terminate()
-            self.worker.wait()
+            self.worker.stop()
         
         self.task_finished(False)
         self.status_label.setText("任务已停止")
@@ -764,8 +810,7 @@ class VideoGeneratorGUI(QMainWindow):
             )
             
             if reply == QMessageBox.StandardButton.Yes:
-                self.worker.terminate()
-                self.worker.wait()
+                self.worker.stop()
                 event.accept()
             else:
                 event.ignore()
@@ -793,7 +838,13 @@ def main():
     logger.info("请在'基本配置'选项卡中设置任务根目录和比特浏览器ID")
     logger.warning("使用前请确保比特浏览器已正确安装并获取窗口ID")
     
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    
+    # 退出前断开保留的浏览器会话（只有运行过任务才会加载会话管理器）
+    if 'src.session_manager' in sys.modules:
+        sys.modules['src.session_manager'].session_manager.close()
+    
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
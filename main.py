@@ -12,37 +12,97 @@ from pathlib import Path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+# 启动前需要确认已安装的依赖：(模块名, pip包名)
+REQUIRED_MODULES = [
+    ("PyQt6", "PyQt6"),
+    ("yaml", "PyYAML"),
+    ("pandas", "pandas"),
+    ("requests", "requests"),
+    ("loguru", "loguru"),
+]
+
 def check_dependencies():
-    """检查关键依赖"""
-    try:
-        from PyQt6.QtWidgets import QApplication
-        import yaml
-        import pandas
-        import requests
-        import loguru
-        return True
-    except ImportError as e:
-        print(f"错误：缺少必要依赖 - {e}")
+    """检查关键依赖（只查找模块，不真正导入，避免拖慢启动）"""
+    from importlib.util import find_spec
+
+    missing = [package for module, package in REQUIRED_MODULES if find_spec(module) is None]
+    if missing:
+        print(f"错误：缺少必要依赖 - {', '.join(missing)}")
         print("\n请运行以下命令安装依赖：")
         print("pip install -r requirements.txt")
         print("\n或者运行检测脚本：")
         print("python test_install.py")
         return False
+    return True
+
+def _measure_imports(statement, top_n):
+    """
+    使用 python -X importtime 在子进程中执行导入语句
+    返回: (总耗时毫秒, [(累计耗时毫秒, 自身耗时毫秒, 模块名), ...])
+    """
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=str(project_root), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "导入失败")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        # 格式: "import time:       123 |       456 |   package.module"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            entries.append((int(cumulative_us) / 1000, int(self_us) / 1000, name.rstrip()))
+        except ValueError:
+            continue
+
+    # 顶层模块（缩进最少）的累计耗时之和即为总耗时
+    top_level = [e for e in entries if not e[2].startswith("  ")]
+    total_ms = sum(e[0] for e in top_level)
+    entries.sort(key=lambda e: e[0], reverse=True)
+    return total_ms, entries[:top_n]
+
+def profile_startup(top_n=20):
+    """打印启动阶段与运行阶段（延迟加载）的导入耗时分布"""
+    stages = [
+        ("启动阶段（显示窗口前）", "import gui_main"),
+        ("运行阶段（点击开始后才加载）", "import gui_main; import src.task_processor, playwright.async_api, pandas, requests"),
+    ]
+    for title, statement in stages:
+        print("=" * 60)
+        try:
+            total_ms, entries = _measure_imports(statement, top_n)
+        except Exception as e:
+            print(f"{title}: 测量失败 - {e}")
+            continue
+        print(f"{title}: 导入总耗时 {total_ms:.1f} ms")
+        print(f"{'累计(ms)':>10} {'自身(ms)':>10}  模块")
+        for cumulative_ms, self_ms, name in entries:
+            print(f"{cumulative_ms:>10.1f} {self_ms:>10.1f}  {name}")
+    print("=" * 60)
 
 def main():
     """主函数"""
+    if "--profile-startup" in sys.argv[1:]:
+        profile_startup()
+        return
+
     print("ChatGLM视频自动生成工具启动中...")
-    
+
     # 检查Python版本
     if sys.version_info < (3, 8):
         print("错误：需要Python 3.8或更高版本")
         print(f"当前版本：{sys.version_info.major}.{sys.version_info.minor}")
         sys.exit(1)
-    
+
     # 检查依赖
     if not check_dependencies():
         sys.exit(1)
-    
+
     # 导入并启动GUI
     try:
         from gui_main import main as gui_main
@@ -57,4 +117,7 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    # 打包成EXE后，视频元数据解析的子进程需要
+    from multiprocessing import freeze_support
+    freeze_support()
+    main()
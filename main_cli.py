@@ -9,7 +9,6 @@ import sys
 import os
 from pathlib import Path
 from loguru import logger
-from src.task_processor import task_processor
 
 
 def setup_logging():
@@ -38,27 +37,56 @@ def setup_logging():
     )
 
 
-async def main():
+async def main(args):
     """主函数"""
+    from src.config_manager import config_manager
+    from src.task_processor import task_processor
+    
     try:
         logger.info("=" * 60)
         logger.info("视频生成自动化程序启动")
         logger.info("=" * 60)
+        # 加载配置：指定的配置文件，或GUI自动保存的配置
+        if args.config or config_manager.get_user_config_file_path().exists():
+            config_manager.load_user_config_file(args.config)
+        if args.serve:
+            # 服务模式：常驻并保持浏览器连接，通过本地HTTP接口接收作业
+            from src.job_service import job_service
+            await job_service.serve(args.host, args.port)
+            return
         # 直接初始化任务处理器
         await task_processor.initialize()
-        await task_processor.process_all_tasks()
+        if args.watch:
+            await task_processor.watch_all_tasks()
+        else:
+            await task_processor.process_all_tasks()
         logger.info("程序执行完成")
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logger.warning("用户中断程序执行")
     except Exception as e:
         logger.error(f"程序执行失败: {e}")
         raise
     finally:
         await task_processor.cleanup()
+        await task_processor.shutdown()
         logger.info("程序退出")
 
 
-def run():
+def parse_args(argv=None):
+    """解析命令行参数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="ChatGLM视频自动生成工具 - 命令行版本")
+    parser.add_argument("--config", help="配置文件路径（JSON或YAML），默认使用GUI自动保存的配置")
+    parser.add_argument("--watch", action="store_true", help="监视模式：持续监视任务目录，自动处理新增任务")
+    parser.add_argument("--serve", action="store_true", help="服务模式：常驻运行，通过本地HTTP/JSON接口提交和查询作业")
+    parser.add_argument("--host", help="服务模式监听地址，默认127.0.0.1")
+    parser.add_argument("--port", type=int, help="服务模式监听端口，默认8765")
+    parser.add_argument("-y", "--yes", action="store_true", help="跳过启动确认")
+    return parser.parse_args(argv)
+
+
+def run(args):
     """运行程序的入口函数"""
     # 设置日志
     setup_logging()
@@ -70,19 +98,26 @@ def run():
     
     try:
         # 运行异步主函数
-        asyncio.run(main())
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
         logger.error(f"程序运行失败: {e}")
         sys.exit(1)
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.yes:
+        run(args)
+        sys.exit(0)
+    
     print("注意：这是命令行版本的备份")
     print("推荐使用GUI版本：python main.py")
     print("确定要使用命令行版本吗？(y/N): ", end="")
     
     choice = input().strip().lower()
     if choice in ['y', 'yes']:
-        run()
+        run(args)
     else:
-        print("请运行 'python main.py' 启动GUI版本") 
\ No newline at end of file
+        print("请运行 'python main.py' 启动GUI版本")
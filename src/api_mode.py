@@ -0,0 +1,441 @@
+"""
+接口直连模式（hybrid）
+通过页面操作完成一个任务时，记录网站背后的 上传 / 提交生成 / 查询状态 三个接口，
+之后的任务用浏览器上下文的 context.request（共用登录Cookie）直接调用这些接口，不再操作页面；
+接口返回的结构与记录不符时抛出 ApiContractError，由调用方退回页面操作并重新记录
+
+接口记录保存在数据目录的 api_contract.json，结构:
+    headers   重放时附带的请求头（运行中随页面请求更新）
+    upload    {url, file_field, fields, ref_path}          上传图片，ref_path 为返回中图片标识的位置
+    generate  {url, method, variants, task_id_path}        variants: {视频参数: 请求体模板}
+    status    {url, method, body, video_path}               url/body 中的 {{task_id}} 在重放时替换
+"""
+
+import asyncio
+import json
+import mimetypes
+import os
+import re
+import time
+import weakref
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+from loguru import logger
+from src.config_manager import config_manager
+from src.retry_engine import TaskFailure, FailureKind
+
+CONTRACT_FILENAME = 'api_contract.json'
+CONTRACT_VERSION = 1
+
+# 不重放的请求头：由浏览器或请求库自动生成，或与单次请求相关
+_SKIPPED_HEADERS = {
+    'host', 'content-length', 'content-type', 'cookie', 'connection', 'accept-encoding',
+    'origin', 'referer', 'priority',
+}
+
+
+class ApiContractError(Exception):
+    """接口与记录不符（地址、返回结构或状态码变化），应退回页面操作"""
+
+
+# ---------- JSON工具 ----------
+
+def iter_leaves(obj: Any, path: Tuple = ()) -> Iterator[Tuple[Tuple, Any]]:
+    """遍历JSON中的所有叶子节点，返回 (路径, 值)"""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from iter_leaves(value, path + (key,))
+    elif isinstance(obj, list):
+        for index, value in enumerate(obj):
+            yield from iter_leaves(value, path + (index,))
+    else:
+        yield path, obj
+
+
+def get_path(obj: Any, path: List) -> Any:
+    """按路径取值，路径不存在时抛出 KeyError"""
+    for key in path:
+        if isinstance(obj, list) and isinstance(key, int) and key < len(obj):
+            obj = obj[key]
+        elif isinstance(obj, dict) and key in obj:
+            obj = obj[key]
+        else:
+            raise KeyError(key)
+    return obj
+
+
+def make_template(obj: Any, replacements: Dict[str, str]) -> Any:
+    """把等于某个取值的叶子替换成占位符，如 {提示词: '{{prompt}}'}"""
+    if isinstance(obj, dict):
+        return {key: make_template(value, replacements) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [make_template(value, replacements) for value in obj]
+    if obj is not None and not isinstance(obj, bool) and str(obj) in replacements:
+        return replacements[str(obj)]
+    return obj
+
+
+def fill_template(template: Any, values: Dict[str, Any]) -> Any:
+    """把占位符替换回实际取值"""
+    if isinstance(template, dict):
+        return {key: fill_template(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [fill_template(value, values) for value in template]
+    if isinstance(template, str) and template in values:
+        return values[template]
+    return template
+
+
+def options_key(video_options: Optional[dict]) -> str:
+    """视频参数的字符串键（用于区分不同参数的请求体模板）"""
+    options = video_options or config_manager.get_user_config('video_options') or {}
+    return json.dumps(options, ensure_ascii=False, sort_keys=True)
+
+
+def parse_multipart(body: bytes, content_type: str) -> Tuple[Optional[str], Dict[str, str]]:
+    """解析multipart请求体，返回 (文件字段名, 其它文本字段)"""
+    match = re.search(r'boundary="?([^";]+)"?', content_type or '')
+    if not match or not body:
+        return None, {}
+    file_field = None
+    fields = {}
+    for part in body.split(b'--' + match.group(1).encode()):
+        head, _, value = part.partition(b'\r\n\r\n')
+        disposition = re.search(rb'name="([^"]*)"(;\s*filename="([^"]*)")?', head)
+        if not disposition:
+            continue
+        name = disposition.group(1).decode('utf-8', 'replace')
+        if disposition.group(2):
+            file_field = name
+        else:
+            fields[name] = value.rstrip(b'\r\n').decode('utf-8', 'replace')
+    return file_field, fields
+
+
+def _as_json(data) -> Any:
+    if data is None:
+        return None
+    try:
+        return json.loads(data if isinstance(data, str) else data.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _same_video(value: Any, video_url: str) -> bool:
+    if not isinstance(value, str) or not value.startswith('http'):
+        return False
+    a, b = urlsplit(value), urlsplit(video_url)
+    return (a.netloc, a.path) == (b.netloc, b.path)
+
+
+# ---------- 从一次页面操作中推断接口 ----------
+
+def infer_contract(exchanges: List[Dict], prompt: str, video_url: str, video_options: Optional[dict]) -> Optional[Dict]:
+    """
+    从一次页面操作期间的请求记录推断接口，识别不完整时返回None
+    exchanges: [{method, url, headers, post_data(bytes), status, response(JSON)}]，按发出顺序
+    """
+    # 1. 提交生成：请求体是JSON且包含提示词
+    generate_index = None
+    for index, exchange in enumerate(exchanges):
+        body = _as_json(exchange['post_data'])
+        if body is not None and any(value == prompt for _, value in iter_leaves(body)):
+            generate_index = index
+            break
+    if generate_index is None:
+        logger.info("未识别到提交生成的接口（请求体中没有提示词）")
+        return None
+    generate = exchanges[generate_index]
+    generate_body = _as_json(generate['post_data'])
+    generate_leaves = {str(value) for _, value in iter_leaves(generate_body) if value is not None}
+
+    # 2. 上传：提交生成之前的multipart请求，返回中有一个值出现在提交生成的请求体里
+    upload = None
+    for exchange in reversed(exchanges[:generate_index]):
+        file_field, fields = parse_multipart(exchange['post_data'], exchange['headers'].get('content-type', ''))
+        if not file_field or exchange['response'] is None:
+            continue
+        for path, value in iter_leaves(exchange['response']):
+            if isinstance(value, (str, int)) and not isinstance(value, bool) \
+                    and len(str(value)) >= 4 and str(value) in generate_leaves:
+                upload = {
+                    'url': exchange['url'],
+                    'file_field': file_field,
+                    'fields': fields,
+                    'ref_path': list(path),
+                    '_ref': str(value),
+                }
+                break
+        if upload:
+            break
+    if upload is None:
+        logger.info("未识别到上传图片的接口")
+        return None
+
+    # 3. 查询状态：之后的请求地址或请求体中包含提交生成返回的任务标识，且最后一次返回中有视频链接
+    status = None
+    for path, task_id in iter_leaves(generate['response']):
+        if isinstance(task_id, bool) or not isinstance(task_id, (str, int)) or len(str(task_id)) < 4:
+            continue
+        task_id = str(task_id)
+        for exchange in exchanges[generate_index + 1:]:
+            if task_id not in exchange['url'] and task_id not in (exchange['post_data'] or b'').decode('utf-8', 'replace'):
+                continue
+            video_path = next(
+                (p for p, value in iter_leaves(exchange['response']) if _same_video(value, video_url)), None
+            )
+            if video_path is None:
+                continue
+            body = _as_json(exchange['post_data'])
+            status = {
+                'url': exchange['url'].replace(task_id, '{{task_id}}'),
+                'method': exchange['method'],
+                'body': make_template(body, {task_id: '{{task_id}}'}) if body is not None else None,
+                'video_path': list(video_path),
+            }
+            generate_task_id_path = list(path)
+            break
+        if status:
+            break
+    if status is None:
+        logger.info("未识别到查询生成状态的接口")
+        return None
+
+    headers = {
+        name: value for name, value in generate['headers'].items()
+        if name.lower() not in _SKIPPED_HEADERS and not name.startswith(':') and not name.lower().startswith('sec-')
+    }
+    template = make_template(generate_body, {prompt: '{{prompt}}', upload.pop('_ref'): '{{image_ref}}'})
+    return {
+        'version': CONTRACT_VERSION,
+        'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'headers': headers,
+        'upload': upload,
+        'generate': {
+            'url': generate['url'],
+            'method': generate['method'],
+            'variants': {options_key(video_options): template},
+            'task_id_path': generate_task_id_path,
+        },
+        'status': status,
+    }
+
+
+class ApiMode:
+    """
+    接口直连模式
+    - 记录：页面操作期间收集 xhr/fetch 请求，任务完成后推断接口并保存
+    - 重放：ready_for 为真时直接调用接口完成上传、提交和轮询
+    - 接口不符时 mark_broken，之后的任务退回页面操作并重新记录
+    """
+
+    def __init__(self):
+        self.contract: Optional[Dict] = None
+        self._loaded = False
+        self._recording: Optional[Dict] = None
+        self._exchanges: List[Dict] = []
+        self._pending = set()
+        self._attached_pages = weakref.WeakSet()
+        self.api_tasks = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return config_manager.get_user_config('generation_mode') == 'hybrid'
+
+    @staticmethod
+    def contract_path():
+        return config_manager.get_data_dir() / CONTRACT_FILENAME
+
+    def load(self) -> Optional[Dict]:
+        """读取已保存的接口记录"""
+        if not self._loaded:
+            self._loaded = True
+            try:
+                with open(self.contract_path(), 'r', encoding='utf-8') as f:
+                    contract = json.load(f)
+                if contract.get('version') == CONTRACT_VERSION and not contract.get('broken'):
+                    self.contract = contract
+                    logger.info(f"已加载接口记录（{contract.get('recorded_at')}）")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"读取接口记录失败: {e}")
+        return self.contract
+
+    def save(self):
+        with open(self.contract_path(), 'w', encoding='utf-8') as f:
+            json.dump(self.contract, f, ensure_ascii=False, indent=2)
+
+    def ready_for(self, video_options: Optional[dict]) -> bool:
+        """是否已记录可用于该视频参数的接口"""
+        contract = self.load()
+        return bool(contract) and options_key(video_options) in contract['generate']['variants']
+
+    def mark_broken(self, reason: str):
+        """接口已变化：停用当前记录，下一个任务通过页面操作重新记录"""
+        logger.warning(f"网站接口已变化（{reason}），退回页面操作并重新记录")
+        self.fallbacks += 1
+        if self.contract:
+            self.contract['broken'] = reason
+            self.save()
+        self.contract = None
+
+    # ---------- 记录 ----------
+
+    def attach(self, page):
+        """监听页面请求（同一页面只注册一次）"""
+        if page is None or page in self._attached_pages or not self.enabled():
+            return
+        page.on('requestfinished', self._on_request_finished)
+        self._attached_pages.add(page)
+
+    def start_recording(self, prompt: str, video_options: Optional[dict]):
+        self._recording = {'prompt': prompt, 'video_options': video_options}
+        self._exchanges = []
+
+    def cancel_recording(self):
+        """页面操作失败：丢弃本次记录"""
+        self._recording = None
+        self._exchanges = []
+
+    async def _on_request_finished(self, request):
+        if request.resource_type not in ('xhr', 'fetch'):
+            return
+        # 运行中随页面请求更新需要重放的请求头（如会随时间刷新的令牌）
+        if self.contract and urlsplit(request.url).netloc == urlsplit(self.contract['generate']['url']).netloc:
+            for name in self.contract['headers']:
+                value = request.headers.get(name.lower())
+                if value:
+                    self.contract['headers'][name] = value
+        if self._recording is None:
+            return
+        exchange_task = asyncio.ensure_future(self._capture(request))
+        self._pending.add(exchange_task)
+        exchange_task.add_done_callback(self._pending.discard)
+
+    async def _capture(self, request):
+        position = len(self._exchanges)
+        self._exchanges.append(None)    # 先占位，保持请求发出的顺序
+        try:
+            response = await request.response()
+            body = await response.body() if response else None
+            self._exchanges[position] = {
+                'method': request.method,
+                'url': request.url,
+                'headers': await request.all_headers(),
+                'post_data': request.post_data_buffer,
+                'status': response.status if response else None,
+                'response': _as_json(body),
+            }
+        except Exception as e:
+            logger.debug(f"记录请求失败: {request.url} {e}")
+
+    async def finish_recording(self, video_url: str):
+        """页面操作完成：推断接口并保存（与已有记录合并视频参数模板）"""
+        recording, self._recording = self._recording, None
+        if recording is None:
+            return
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        exchanges = [exchange for exchange in self._exchanges if exchange]
+        self._exchanges = []
+        contract = infer_contract(exchanges, recording['prompt'], video_url, recording['video_options'])
+        if contract is None:
+            logger.info("本次未能完整识别网站接口，下一个任务继续使用页面操作")
+            return
+        if self.contract and self.contract['generate']['url'] == contract['generate']['url']:
+            self.contract['generate']['variants'].update(contract['generate']['variants'])
+            self.contract['headers'].update(contract['headers'])
+        else:
+            self.contract = contract
+        self.save()
+        logger.info(f"已记录网站接口，之后相同视频参数的任务将直接调用接口: {self.contract_path()}")
+
+    # ---------- 重放 ----------
+
+    async def _call(self, request_context, step: str, method: str, url: str,
+                    extra_headers: Optional[Dict] = None, **kwargs) -> Any:
+        """调用接口并返回JSON，状态码或返回格式异常时抛出 ApiContractError"""
+        headers = {**self.contract['headers'], **(extra_headers or {})}
+        response = await request_context.fetch(url, method=method, headers=headers, **kwargs)
+        if response.status == 429:
+            raise TaskFailure(FailureKind.RATE_LIMITED, f"{step}接口返回429")
+        if response.status >= 400:
+            raise ApiContractError(f"{step}接口返回 {response.status}")
+        try:
+            return await response.json()
+        except Exception:
+            raise ApiContractError(f"{step}接口返回的不是JSON")
+
+    @staticmethod
+    def _extract(data: Any, path: List, step: str) -> Any:
+        try:
+            return get_path(data, path)
+        except KeyError:
+            raise ApiContractError(f"{step}接口返回中没有 {'.'.join(map(str, path))}")
+
+    async def generate(self, request_context, image_path: str, prompt: str,
+                       video_options: Optional[dict]) -> str:
+        """直接调用接口生成视频，返回视频链接"""
+        contract = self.contract
+        if not os.path.isfile(image_path):
+            raise TaskFailure(FailureKind.IMAGE_MISSING, f"图片文件不存在: {image_path}")
+
+        # 1. 上传图片
+        upload = contract['upload']
+        with open(image_path, 'rb') as f:
+            multipart = dict(upload['fields'])
+            multipart[upload['file_field']] = {
+                'name': os.path.basename(image_path),
+                'mimeType': mimetypes.guess_type(image_path)[0] or 'image/jpeg',
+                'buffer': f.read(),
+            }
+        data = await self._call(request_context, '上传', 'POST', upload['url'], multipart=multipart)
+        image_ref = self._extract(data, upload['ref_path'], '上传')
+        logger.info(f"接口上传图片成功: {image_ref}")
+
+        # 2. 提交生成
+        generate = contract['generate']
+        body = fill_template(generate['variants'][options_key(video_options)],
+                             {'{{prompt}}': prompt, '{{image_ref}}': image_ref})
+        data = await self._call(request_context, '提交生成', generate['method'], generate['url'],
+                                data=json.dumps(body, ensure_ascii=False),
+                                extra_headers={'content-type': 'application/json'})
+        task_id = self._extract(data, generate['task_id_path'], '提交生成')
+        logger.info(f"接口提交生成成功，任务标识: {task_id}")
+
+        # 3. 轮询状态直到返回视频链接
+        status = contract['status']
+        values = {'{{task_id}}': task_id}
+        url = status['url'].replace('{{task_id}}', str(task_id))
+        body = fill_template(status['body'], values) if status['body'] is not None else None
+        timeout = config_manager.get_user_config('video_generation_timeout') / 1000
+        interval = config_manager.get_wait_time('generation_check') / 1000
+        start = time.monotonic()
+        while time.monotonic() - start < timeout:
+            kwargs = {'data': json.dumps(body, ensure_ascii=False),
+                      'extra_headers': {'content-type': 'application/json'}} if body is not None else {}
+            data = await self._call(request_context, '查询状态', status['method'], url, **kwargs)
+            try:
+                video_url = get_path(data, status['video_path'])
+            except KeyError:
+                video_url = None    # 生成中的返回没有视频链接
+            if isinstance(video_url, str) and video_url.startswith('http'):
+                self.api_tasks += 1
+                logger.info(f"接口生成完成: {video_url}")
+                return video_url
+            await asyncio.sleep(interval)
+        raise TaskFailure(FailureKind.GENERATION_TIMEOUT, f"视频生成超时（{timeout:.0f} 秒）")
+
+    def report(self):
+        if self.api_tasks or self.fallbacks:
+            logger.info(f"接口直连: {self.api_tasks} 个任务，退回页面操作 {self.fallbacks} 次")
+
+    def reset(self):
+        self.api_tasks = 0
+        self.fallbacks = 0
+
+
+# 全局接口直连模式实例
+api_mode = ApiMode()
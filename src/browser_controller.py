@@ -4,12 +4,23 @@
 """
 
 import asyncio
+import os
 import time
 from typing import Optional
-from playwright.async_api import async_playwright, Page, Browser, BrowserContext
 from loguru import logger
 from src.config_manager import config_manager
-from bit_api import openBrowser, closeBrowser
+from src.session_manager import session_manager
+from src.retry_engine import TaskFailure, FailureKind
+from src.generation_monitor import generation_monitor
+from src.page_probe import page_probe, in_popup
+from src.video_capture import video_capture
+from src.api_mode import api_mode, ApiContractError
+from src.phase_stats import phase_stats
+from src.selector_resolver import selector_resolver
+from src.deadline import TaskDeadline
+from src.generation_timeout import generation_timeout
+from src.flight_recorder import flight_recorder
+from src.resource_policy import resource_policy
 
 
 class BrowserController:
@@ -21,50 +32,27 @@ class BrowserController:
         self.is_initialized = False
         self.basic_params_set = False  # 标记基础参数是否已设置
     
+    @staticmethod
+    def _timeout(deadline: Optional[TaskDeadline], default: Optional[float] = None) -> Optional[float]:
+        """等待的超时（毫秒）：有时间预算时不超过当前阶段剩余的时间"""
+        return default if deadline is None else deadline.timeout_ms(default)
+    
     async def smart_delay(self, delay_type=None):
         """智能延时"""
         delay_time = config_manager.get_smart_delay(delay_type)
         logger.debug(f"智能延时: {delay_time:.2f}秒")
+        phase_stats.note_delay(delay_time)
         await asyncio.sleep(delay_time)
     
     async def initialize(self):
-        """初始化浏览器 - 连接到指定比特浏览器窗口"""
+        """初始化浏览器 - 连接到指定比特浏览器窗口（同一进程内复用已有会话）"""
         try:
-            self.playwright = await async_playwright().start()
-            # 从配置读取窗口ID
-            bit_browser_id = config_manager.get_user_config('bit_browser_id')
-            if not bit_browser_id or bit_browser_id == "请填写比特浏览器窗口ID":
-                raise Exception("请在GUI界面中配置比特浏览器窗口ID")
-            # 打开指定窗口，获取ws地址
-            open_res = openBrowser(bit_browser_id)
-            logger.info(f"open_res: {open_res}")
-            # 自动适配ws_url的获取方式
-            ws_data = open_res.get('data', {}).get('ws')
-            if isinstance(ws_data, dict):
-                ws_url = ws_data.get('selenium')
-            else:
-                ws_url = ws_data
-            if not ws_url:
-                raise Exception(f"未获取到比特浏览器ws地址，open_res: {open_res}")
-            self._bit_browser_id = bit_browser_id  # 保存ID用于后续关闭
-            self.browser = await self.playwright.chromium.connect_over_cdp(ws_url)
-            logger.info(f"成功连接到比特浏览器: {ws_url}")
-            # 获取浏览器上下文
-            contexts = self.browser.contexts
-            if contexts:
-                self.context = contexts[0]
-                logger.info("使用现有的浏览器上下文")
-            else:
-                self.context = await self.browser.new_context()
-                logger.info("创建新的浏览器上下文")
-            pages = self.context.pages
-            if pages:
-                self.page = pages[0]
-                logger.info("使用现有的浏览器页面")
-            else:
-                self.page = await self.context.new_page()
-                logger.info("创建新的浏览器页面")
-            self.page.set_default_timeout(config_manager.get_user_config('timeout'))
+            self.page = await session_manager.acquire()
+            self.playwright = session_manager.playwright
+            self.browser = session_manager.browser
+            self.context = session_manager.context
+            self._bit_browser_id = session_manager.bit_browser_id  # 保存ID用于后续关闭
+            await self._attach_page()
             self.is_initialized = True
             logger.info("浏览器初始化成功")
         except Exception as e:
@@ -72,9 +60,55 @@ class BrowserController:
             await self.cleanup()
             raise
     
+    async def _attach_page(self):
+        # 拦截第三方统计、字体等资源（需在导航前注册）
+        await resource_policy.attach(self.page)
+        # 记录页面加载的视频响应，完成后可直接取用，无需重新下载
+        video_capture.attach(self.page)
+        # hybrid模式：记录网站接口，之后直接调用
+        api_mode.attach(self.page)
+        # 录制每个任务的追踪，失败时保存现场
+        await flight_recorder.attach(self.context, self.page)
+    
+    async def recycle_page(self) -> bool:
+        """
+        回收页面（长时间运行后内存和DOM过大时调用）：打开新页面、导航、初始设置，完成后再关闭旧页面
+        新页面准备失败时关闭新页面，继续使用旧页面
+        """
+        old_page = self.page
+        try:
+            self.page = session_manager.page = await session_manager.open_page()
+            session_manager.page_prepared = False
+            await self._attach_page()
+            target_url = config_manager.get_target_url()
+            await self.page.goto(target_url)
+            await asyncio.sleep(config_manager.get_wait_time('page_load') / 1000)
+            await self.setup_initial_settings()
+        except Exception as e:
+            logger.error(f"回收页面失败，继续使用原页面: {e}")
+            new_page, self.page = self.page, old_page
+            session_manager.page = old_page
+            session_manager.page_prepared = True
+            if new_page is not old_page:
+                try:
+                    await new_page.close()
+                except Exception:
+                    pass
+            return False
+        try:
+            await old_page.close()
+        except Exception as e:
+            logger.warning(f"关闭旧页面失败: {e}")
+        logger.info("页面已回收，新页面准备完成")
+        return True
+    
     async def navigate_to_target(self):
         """导航到目标网站，并关闭其他标签页"""
         try:
+            # 复用的页面仍处于可用状态时无需重新导航
+            if await session_manager.revalidate_page():
+                logger.info("页面状态有效，跳过导航")
+                return
             target_url = config_manager.get_target_url()
             current_url = self.page.url
             # 检查是否已经在目标网站
@@ -96,14 +130,14 @@ class BrowserController:
             raise
     
     async def setup_initial_settings(self):
-        """设置初始参数（只在第一次运行时执行）"""
-        if self.basic_params_set:
-            logger.info("基础参数已设置，跳过")
+        """设置初始参数（页面准备好之后不再重复执行）"""
+        if session_manager.page_prepared:
+            logger.info("页面已准备好，跳过初始设置")
             return
         try:
             # 1. 点击创作历史按钮
             await self.click_creation_history()
-            # 不再在此处设置self.basic_params_set
+            session_manager.page_prepared = True
             logger.info("初始设置完成")
         except Exception as e:
             logger.error(f"初始设置失败: {e}")
@@ -112,8 +146,7 @@ class BrowserController:
     async def click_creation_history(self):
         """点击创作历史按钮"""
         try:
-            xpath = config_manager.get_web_element('elements.creation_history_btn')
-            await self.page.click(xpath)
+            await selector_resolver.click(self.page, 'creation_history_btn')
             
             # 等待页面加载
             await asyncio.sleep(config_manager.get_wait_time('page_load') / 1000)
@@ -125,49 +158,36 @@ class BrowserController:
             logger.error(f"点击创作历史按钮失败: {e}")
             raise
     
-    async def setup_basic_params(self):
-        """设置基础参数，支持用户自定义选项，确保在弹窗内查找并等待元素"""
+    async def setup_basic_params(self, video_options: Optional[dict] = None, deadline: Optional[TaskDeadline] = None):
+        """
+        设置基础参数，支持用户自定义选项，确保在弹窗内查找并等待元素
+        video_options: 本任务的视频参数，为None时使用全局配置
+        deadline: 任务的时间预算，每次等待不超过剩余时间
+        """
         try:
-            video_options = config_manager.get_user_config('video_options') or {}
+            video_options = video_options or config_manager.get_user_config('video_options') or {}
             quality = video_options.get('quality', '质量更佳')
             framerate = video_options.get('framerate', '帧率60')
             resolution = video_options.get('resolution', '4K')
             # 点击基础参数按钮
-            basic_params_botton = config_manager.get_web_element('elements.basic_params_button')
-            await self.page.click(basic_params_botton)
-            # 等待弹窗出现
-            popup_xpath = config_manager.get_web_element('elements.basic_params_popup')
-            await self.page.wait_for_selector(popup_xpath, timeout=10000)
-            # 在弹窗内查找参数选项
-            def in_popup(xpath):
-                # 保证在弹窗下任意深度查找
-                return f"{popup_xpath}//{xpath.lstrip('/')}"
-            # 选择质量
-            if quality == "质量更佳":
-                quality_xpath = config_manager.get_web_element('elements.quality_options.better')
-            else:
-                quality_xpath = config_manager.get_web_element('elements.quality_options.faster')
-            quality_xpath = in_popup(quality_xpath)
-            await self.page.wait_for_selector(quality_xpath, timeout=5000)
-            await self.page.click(quality_xpath)
-            # 选择帧率
-            if framerate == "帧率60":
-                framerate_xpath = config_manager.get_web_element('elements.fps_options.fps_60')
-            else:
-                framerate_xpath = config_manager.get_web_element('elements.fps_options.fps_30')
-            framerate_xpath = in_popup(framerate_xpath)
-            await self.page.wait_for_selector(framerate_xpath, timeout=5000)
-            await self.page.click(framerate_xpath)
-            # 选择分辨率
-            if resolution == "4K":
-                resolution_xpath = config_manager.get_web_element('elements.resolution_options.resolution_4k')
-            else:
-                resolution_xpath = config_manager.get_web_element('elements.resolution_options.resolution_1080p')
-            resolution_xpath = in_popup(resolution_xpath)
-            await self.page.wait_for_selector(resolution_xpath, timeout=5000)
-            await self.page.click(resolution_xpath)
+            await selector_resolver.click(self.page, 'basic_params_button', timeout=self._timeout(deadline))
+            # 等待弹窗出现，一次快照取得所有选项的状态
+            await page_probe.wait_for(self.page, "s.elements.basic_params_popup", timeout=self._timeout(deadline, 10000))
+            state = await page_probe.snapshot(self.page)
+            quality_key = 'quality_options.better' if quality == "质量更佳" else 'quality_options.faster'
+            framerate_key = 'fps_options.fps_60' if framerate == "帧率60" else 'fps_options.fps_30'
+            resolution_key = ('resolution_options.resolution_4k' if resolution.lower() == "4k"
+                              else 'resolution_options.resolution_1080p')
+            for option_key in (quality_key, framerate_key, resolution_key):
+                option = page_probe.element(state, option_key)
+                if option is None:
+                    raise TaskFailure(FailureKind.SELECTOR_NOT_FOUND, f"基础参数弹窗中未找到选项: {option_key}")
+                # 已选中的选项不再点击
+                if not option['selected']:
+                    await selector_resolver.click(self.page, option_key, transform=in_popup,
+                                                  timeout=self._timeout(deadline))
             # 再次点击基础参数按钮关闭浮窗
-            await self.page.click(basic_params_botton)
+            await selector_resolver.click(self.page, 'basic_params_button', timeout=self._timeout(deadline))
             # 智能延时
             await self.smart_delay('click_after')
             logger.info(f"基础参数设置成功: 质量={quality}, 帧率={framerate}, 分辨率={resolution}")
@@ -176,73 +196,66 @@ class BrowserController:
             logger.error(f"设置基础参数失败: {e}")
             raise
     
-    async def upload_image(self, image_path: str):
+    async def upload_image(self, image_path: str, deadline: Optional[TaskDeadline] = None):
         """上传图片"""
         try:
-            uploader_xpath = config_manager.get_web_element('elements.image_uploader')
-            file_input_selector = config_manager.get_web_element('elements.file_input')
-            upload_btn_xpath = config_manager.get_web_element('elements.upload_btn')
+            if not os.path.isfile(image_path):
+                raise TaskFailure(FailureKind.IMAGE_MISSING, f"图片文件不存在: {image_path}")
             
             # 查找文件输入元素
-            file_input = await self.page.query_selector(file_input_selector)
-            if file_input:
-                await file_input.set_input_files(image_path)
-            else:
+            state = await page_probe.snapshot(self.page)
+            if not page_probe.element(state, 'file_input'):
                 # 如果没有找到文件输入，尝试点击上传区域
-                await self.page.click(uploader_xpath)
+                await selector_resolver.click(self.page, 'image_uploader', timeout=self._timeout(deadline))
                 await asyncio.sleep(5)  # 增加等待时间
-                file_input = await self.page.query_selector(file_input_selector)
-                if file_input:
-                    await file_input.set_input_files(image_path)
-                else:
-                    raise Exception("未找到文件上传输入元素")
+                state = await page_probe.snapshot(self.page)
+                if not page_probe.element(state, 'file_input'):
+                    raise TaskFailure(FailureKind.SELECTOR_NOT_FOUND, "未找到文件上传输入元素")
+            
+            await selector_resolver.set_input_files(self.page, 'file_input', image_path,
+                                                    timeout=self._timeout(deadline))
             
             # 新增：点击上传按钮
             try:
-                await self.page.click(upload_btn_xpath)
+                await selector_resolver.click(self.page, 'upload_btn', timeout=self._timeout(deadline))
                 logger.info("点击上传按钮成功")
             except Exception as e:
+                # 超出时间预算时不再继续；找不到按钮等其它失败按可选步骤处理
+                if isinstance(e, TaskFailure) and e.kind in (FailureKind.DEADLINE_EXCEEDED,
+                                                             FailureKind.GENERATION_TIMEOUT):
+                    raise
                 logger.warning(f"点击上传按钮失败（可能已自动上传）: {e}")
             
             # 上传后延时
             await self.smart_delay('upload_after')
             
             # 验证上传是否成功
-            if await self.verify_upload(image_path):
+            if await self.verify_upload(image_path, deadline):
                 logger.info(f"图片上传成功: {image_path}")
             else:
-                raise Exception("图片上传验证失败")
+                raise TaskFailure(FailureKind.UPLOAD_FAILED, "图片上传验证失败")
                 
         except Exception as e:
             logger.error(f"上传图片失败: {e}")
             raise
     
-    async def verify_upload(self, image_path: str) -> bool:
-        """验证图片是否上传成功，只判断preview-box出现，出现即返回"""
+    async def verify_upload(self, image_path: str, deadline: Optional[TaskDeadline] = None) -> bool:
+        """验证图片是否上传成功，只判断preview-box出现，出现即返回（在页面内等待，最多10秒）"""
         try:
-            preview_box_xpath = config_manager.get_web_element('elements.preview_box')
-            max_wait = 10  # 最多等10秒
-            interval = 0.2  # 检查间隔0.2秒
-            waited = 0
-            while waited < max_wait:
-                preview_box = await self.page.query_selector(preview_box_xpath)
-                if preview_box:
-                    return True
-                await asyncio.sleep(interval)
-                waited += interval
-            raise Exception("上传后未检测到图片预览框元素（preview-box），图片可能未上传成功")
+            await page_probe.wait_for(self.page, "s.elements.preview_box", timeout=self._timeout(deadline, 10000))
+            return True
+        except TaskFailure:
+            raise
         except Exception as e:
             logger.error(f"验证上传失败: {e}")
-            raise
+            raise TaskFailure(FailureKind.UPLOAD_FAILED, "上传后未检测到图片预览框元素（preview-box），图片可能未上传成功")
     
-    async def input_prompt(self, prompt: str):
+    async def input_prompt(self, prompt: str, deadline: Optional[TaskDeadline] = None):
         """输入提示词"""
         try:
-            textarea_xpath = config_manager.get_web_element('elements.prompt_textarea')
-            
             # 清空并输入提示词
-            await self.page.fill(textarea_xpath, "")
-            await self.page.fill(textarea_xpath, prompt)
+            await selector_resolver.fill(self.page, 'prompt_textarea', "", timeout=self._timeout(deadline))
+            await selector_resolver.fill(self.page, 'prompt_textarea', prompt, timeout=self._timeout(deadline))
             
             # 输入后延时
             await self.smart_delay('input_after')
@@ -253,11 +266,10 @@ class BrowserController:
             logger.error(f"输入提示词失败: {e}")
             raise
     
-    async def click_generate(self):
+    async def click_generate(self, deadline: Optional[TaskDeadline] = None):
         """点击生成按钮"""
         try:
-            generate_btn_xpath = config_manager.get_web_element('elements.generate_btn')
-            await self.page.click(generate_btn_xpath)
+            await selector_resolver.click(self.page, 'generate_btn', timeout=self._timeout(deadline))
             
             # 点击后延时
             await self.smart_delay('click_after')
@@ -268,143 +280,139 @@ class BrowserController:
             logger.error(f"点击生成按钮失败: {e}")
             raise
     
-    async def wait_for_generation_complete(self) -> Optional[str]:
+    async def wait_for_generation_complete(self, deadline: Optional[TaskDeadline] = None) -> str:
         """
         等待视频生成完成并获取视频URL
-        返回视频下载链接，如果失败返回None
+        每次检查只做一次页面探针快照，返回视频下载链接，超时、生成卡片消失或被限流时抛出 TaskFailure
+        deadline: 任务的时间预算，有预算时最长等待剩余的预算（按同参数历史耗时自适应），否则为 video_generation_timeout
         """
         try:
-            generation_card_xpath = config_manager.get_web_element('elements.generation_card')
-            timeout = config_manager.get_user_config('video_generation_timeout')
+            if deadline is None:
+                timeout = config_manager.get_user_config('video_generation_timeout')
+            else:
+                timeout = deadline.timeout_ms()
             check_interval = config_manager.get_wait_time('generation_check') / 1000
             
+            generation_monitor.start_task()
             start_time = time.time()
             last_video_url = None  # 记录上一次获取到的视频URL
             generation_started = False  # 标记是否已经开始生成
             
             while time.time() - start_time < timeout / 1000:
                 try:
+                    state = await page_probe.snapshot(self.page)
+                    if state['rate_limit']:
+                        raise TaskFailure(FailureKind.RATE_LIMITED, f"网站提示: {state['rate_limit']}")
+                    
                     # 检查生成卡片是否存在
-                    card_element = await self.page.query_selector(generation_card_xpath)
-                    if not card_element:
+                    card = state['card']
+                    if not card:
                         if not generation_started:
                             # 如果还没开始生成，继续等待
                             await asyncio.sleep(check_interval)
                             continue
                         else:
                             # 如果已经开始生成但卡片消失了，说明生成失败
-                            logger.error("生成卡片消失，可能生成失败")
-                            return None
-                    
-                    # 获取卡片内容
-                    card_html = await card_element.inner_html()
+                            raise TaskFailure(FailureKind.CARD_VANISHED, "生成卡片消失，可能生成失败")
                     
                     # 检查是否还在生成中
-                    if "视频生成中" in card_html or "processing" in card_html or "loadding" in card_html:
+                    if card['generating']:
                         if not generation_started:
                             generation_started = True
                             logger.info("视频开始生成...")
-                        else:
-                            logger.info("视频生成中，继续等待...")
-                        await asyncio.sleep(check_interval)
+                        # 根据排队位置和进度调整检查间隔
+                        generation_monitor.observe(card['queue_text'], card['progress_text'])
+                        interval = generation_monitor.next_interval(check_interval)
+                        interval = min(interval, max(timeout / 1000 - (time.time() - start_time), 0.1))
+                        logger.info(f"{generation_monitor.describe()}，{interval:.0f} 秒后再次检查")
+                        await asyncio.sleep(interval)
                         continue
                     
-                    # 检查是否生成完成 - 查找video-container loaded类
-                    if "video-container loaded" in card_html or "finished" in card_html:
-                        # 查找视频源链接 - 优先从source标签获取
-                        source_element = await card_element.query_selector('source[type="video/mp4"]')
-                        if source_element:
-                            video_url = await source_element.get_attribute('src')
-                            if video_url and video_url != last_video_url:
-                                # 验证视频元素是否是新生成的
-                                video_element = await card_element.query_selector('video')
-                                if video_element:
-                                    # 检查视频元素是否可见
-                                    is_visible = await video_element.is_visible()
-                                    if is_visible:
-                                        # 额外等待2秒，确保视频完全加载
-                                        await asyncio.sleep(2)
-                                        logger.info(f"视频生成完成，获取到新的下载链接: {video_url}")
-                                        return video_url
-                        
-                        # 如果没有找到source，尝试从video元素的src属性获取
-                        video_element = await card_element.query_selector('video.video-container')
-                        if video_element:
-                            video_url = await video_element.get_attribute('src')
-                            if video_url and video_url != last_video_url:
-                                # 验证视频元素是否是新生成的
-                                is_visible = await video_element.is_visible()
-                                if is_visible:
-                                    # 额外等待2秒，确保视频完全加载
-                                    await asyncio.sleep(2)
-                                    logger.info(f"视频生成完成，获取到新的下载链接: {video_url}")
-                                    return video_url
-                        
-                        # 最后尝试从任何video元素获取
-                        video_element = await card_element.query_selector('video')
-                        if video_element:
-                            video_url = await video_element.get_attribute('src')
-                            if video_url and video_url != last_video_url:
-                                # 验证视频元素是否是新生成的
-                                is_visible = await video_element.is_visible()
-                                if is_visible:
-                                    # 额外等待2秒，确保视频完全加载
-                                    await asyncio.sleep(2)
-                                    logger.info(f"视频生成完成，获取到新的下载链接: {video_url}")
-                                    return video_url
+                    # 检查是否生成完成：有新的视频链接且视频元素可见
+                    video_url = card['video_src']
+                    if card['finished'] and video_url and video_url != last_video_url and card['video_visible']:
+                        # 额外等待2秒，确保视频完全加载
+                        await asyncio.sleep(2)
+                        logger.info(f"视频生成完成，获取到新的下载链接: {video_url}")
+                        generation_monitor.finish_task(True)
+                        return video_url
                     
                     await asyncio.sleep(check_interval)
                     
+                except TaskFailure:
+                    raise
                 except Exception as e:
                     logger.warning(f"检查生成状态时出错: {e}")
                     await asyncio.sleep(check_interval)
             
-            logger.error("视频生成超时")
-            return None
+            raise TaskFailure(FailureKind.GENERATION_TIMEOUT, f"视频生成超时（{timeout / 1000:.0f} 秒）")
             
         except Exception as e:
+            generation_monitor.finish_task(False)
             logger.error(f"等待视频生成完成失败: {e}")
-            return None
-
-
+            raise
 
-    async def process_single_task(self, image_path: str, prompt: str) -> Optional[str]:
+    async def process_single_task(self, image_path: str, prompt: str, video_options: Optional[dict] = None,
+                                  deadline: Optional[TaskDeadline] = None) -> str:
         """
         处理单个任务：上传图片、输入提示词、生成视频
-        返回视频下载链接
+        video_options: 本任务的视频参数，为None时使用全局配置
+        deadline: 任务的时间预算，为None时按配置新建；某个阶段或整个任务超出预算时立即失败
+        返回视频下载链接，失败时抛出异常（由重试引擎分类）
         """
+        deadline = deadline or TaskDeadline.for_task(video_options)
+        if api_mode.enabled() and api_mode.ready_for(video_options):
+            try:
+                logger.info(f"开始处理任务（接口直连）: {image_path} -> {prompt}")
+                return await deadline.run_phase(
+                    'generation', api_mode.generate(self.context.request, image_path, prompt, video_options)
+                )
+            except ApiContractError as e:
+                api_mode.mark_broken(str(e))
         try:
             logger.info(f"开始处理任务: {image_path} -> {prompt}")
+            if api_mode.enabled():
+                api_mode.start_recording(prompt, video_options)
+            # 各阶段耗时记录下来，供模拟器估算批量任务用时；每个阶段在各自的时间预算内执行
             # 1. 上传图片
-            await self.upload_image(image_path)
+            with phase_stats.measure('upload'):
+                await deadline.run_phase('upload', self.upload_image(image_path, deadline))
             # 2. 设置基础参数（每次上传图片后都设置）
-            await self.setup_basic_params()
+            with phase_stats.measure('params'):
+                await deadline.run_phase('params', self.setup_basic_params(video_options, deadline))
             # 3. 输入提示词
-            await self.input_prompt(prompt)
+            with phase_stats.measure('prompt'):
+                await deadline.run_phase('prompt', self.input_prompt(prompt, deadline))
             # 4. 点击生成
-            await self.click_generate()
+            with phase_stats.measure('submit'):
+                await deadline.run_phase('submit', self.click_generate(deadline))
             # 5. 等待生成完成
-            video_url = await self.wait_for_generation_complete()
-            if video_url:
-                logger.info("任务处理成功")
-                return video_url
-            else:
-                logger.error("任务处理失败：未获取到视频链接")
-                return None
+            # 生成耗时同时按视频参数记录，用于自适应生成超时
+            with phase_stats.measure('generation', generation_timeout.key(video_options)):
+                video_url = await deadline.run_phase('generation', self.wait_for_generation_complete(deadline))
+            if api_mode.enabled():
+                await api_mode.finish_recording(video_url)
+            logger.info("任务处理成功")
+            return video_url
         except Exception as e:
+            api_mode.cancel_recording()
             logger.error(f"处理任务失败: {e}")
-            return None
+            raise
 
     async def cleanup(self):
-        """清理资源，只关闭Playwright资源，不关闭浏览器窗口"""
+        """运行结束：保留浏览器连接和页面，供同一进程内的下次运行复用"""
+        session_manager.release()
+        self.is_initialized = False
+    
+    async def shutdown(self):
+        """断开连接并停止Playwright，不关闭浏览器窗口（进程退出时调用）"""
         try:
-            if self.page:
-                await self.page.close()
-            if self.context:
-                await self.context.close()
-            # 不再关闭self.browser和比特浏览器窗口
-            if self.playwright:
-                await self.playwright.stop()
+            await session_manager.shutdown()
+            self.playwright = None
+            self.browser = None
+            self.context = None
+            self.page = None
+            self.is_initialized = False
             logger.info("Playwright资源清理完成（浏览器窗口未关闭）")
         except Exception as e:
             logger.error(f"清理浏览器资源失败: {e}")
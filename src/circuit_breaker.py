@@ -0,0 +1,124 @@
+"""
+熔断器
+网站限流或故障时（连续生成超时、卡片消失、出现限流提示），暂停提交新任务，
+按退避时间只放行一个探测任务，探测成功后自动恢复，避免每个任务都白白等满生成超时
+"""
+
+import asyncio
+import time
+from typing import Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.retry_engine import TaskFailure, FailureKind
+
+
+# 视为网站整体异常的失败类型（其它失败只与单个任务有关，不影响熔断）
+SITE_FAILURE_KINDS = {
+    FailureKind.GENERATION_TIMEOUT,
+    FailureKind.CARD_VANISHED,
+    FailureKind.RATE_LIMITED,
+}
+
+
+class CircuitBreaker:
+    """
+    熔断器（所有工作循环共用）
+    - closed: 正常提交；连续网站异常达到阈值（出现限流提示时立即）进入 open
+    - open: 暂停提交，冷却时间到后进入 half_open
+    - half_open: 只放行一个探测任务，成功则恢复 closed，失败则冷却时间加倍后重新 open
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.cooldown = 0.0
+        self.open_until = 0.0
+        self._probe_in_flight = False
+        self._opened_at: Optional[float] = None
+        self.trip_count = 0
+        self.total_open_time = 0.0
+
+    def reset(self):
+        self.__init__()
+
+    @staticmethod
+    def _settings() -> dict:
+        settings = {'failure_threshold': 3, 'base_cooldown': 60.0, 'max_cooldown': 900.0}
+        settings.update(config_manager.get_user_config('circuit_breaker') or {})
+        return settings
+
+    async def before_submit(self):
+        """提交生成任务前调用：熔断期间等待，半开状态下只放行一个探测任务"""
+        while True:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN and now >= self.open_until:
+                self.state = self.HALF_OPEN
+                logger.info("熔断冷却结束，提交一个探测任务")
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            wait = self.open_until - now if self.state == self.OPEN else 1.0
+            await asyncio.sleep(min(max(wait, 0.1), 5.0))
+
+    def record_success(self):
+        """生成成功：清零连续失败计数，探测成功时恢复提交"""
+        self.consecutive_failures = 0
+        if self.state != self.CLOSED:
+            paused = time.monotonic() - self._opened_at
+            self.total_open_time += paused
+            logger.info(f"探测任务成功，恢复提交（本次暂停 {paused:.0f} 秒）")
+            self.state = self.CLOSED
+            self.cooldown = 0.0
+            self._opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self, failure: TaskFailure) -> bool:
+        """
+        生成失败：返回该失败是否属于网站整体异常期间（触发熔断或探测失败），
+        这类失败不应消耗任务自己的重试次数
+        """
+        was_probe = self._probe_in_flight
+        self._probe_in_flight = False
+        if failure.kind not in SITE_FAILURE_KINDS:
+            # 与网站状态无关的失败不改变熔断状态，探测名额留给下一个任务
+            return False
+
+        settings = self._settings()
+        self.consecutive_failures += 1
+        if was_probe:
+            self.cooldown = min(self.cooldown * 2, float(settings['max_cooldown']))
+            self._open(f"探测任务失败（{failure.label}）")
+            return True
+        if self.state == self.CLOSED and (
+                failure.kind == FailureKind.RATE_LIMITED
+                or self.consecutive_failures >= int(settings['failure_threshold'])):
+            self.cooldown = float(settings['base_cooldown'])
+            self.trip_count += 1
+            self._opened_at = time.monotonic()
+            self._open(f"连续 {self.consecutive_failures} 次{failure.label}")
+            return True
+        return self.state != self.CLOSED
+
+    def _open(self, reason: str):
+        self.state = self.OPEN
+        self.open_until = time.monotonic() + self.cooldown
+        logger.warning(f"网站可能限流或故障（{reason}），暂停提交 {self.cooldown:.0f} 秒后探测")
+
+    def report(self):
+        """输出熔断统计"""
+        if not self.trip_count:
+            return
+        open_time = self.total_open_time
+        if self._opened_at is not None:
+            open_time += time.monotonic() - self._opened_at
+        logger.info(f"熔断次数: {self.trip_count}，累计暂停 {open_time:.0f} 秒")
+
+
+# 全局熔断器实例
+circuit_breaker = CircuitBreaker()
@@ -3,25 +3,86 @@
 负责加载和管理用户配置和网页元素配置
 """
 
-import yaml
 import os
 from pathlib import Path
 from loguru import logger
 
+# web_elements.yaml 中必须存在的元素（热加载时校验）
+REQUIRED_ELEMENTS = [
+    'creation_history_btn', 'basic_params_button', 'basic_params_popup', 'quality_options', 'fps_options',
+    'resolution_options', 'image_uploader', 'file_input', 'upload_btn', 'prompt_textarea', 'generate_btn',
+    'generation_card', 'preview_box',
+]
+
+
+def file_signature(path):
+    """文件签名（修改时间+大小），文件不存在时为None"""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def _is_selector(value) -> bool:
+    """单个选择器字符串，或非空的备选选择器列表"""
+    if isinstance(value, str):
+        return bool(value.strip())
+    return isinstance(value, list) and bool(value) and all(isinstance(item, str) and item.strip() for item in value)
+
+
+def validate_web_elements(config) -> list:
+    """校验网页元素配置，返回问题列表（空列表表示有效）"""
+    if not isinstance(config, dict) or not isinstance(config.get('elements'), dict):
+        return ["缺少 elements"]
+    errors = []
+    if not isinstance(config.get('target_url'), str):
+        errors.append("target_url 无效")
+    elements = config['elements']
+    for name in REQUIRED_ELEMENTS:
+        value = elements.get(name)
+        if isinstance(value, dict):
+            errors.extend(f"{name}.{option} 无效" for option, selector in value.items() if not _is_selector(selector))
+        elif not _is_selector(value):
+            errors.append(f"{name} 缺失或无效")
+    return errors
+
 
 class ConfigManager:
     def __init__(self):
         self.project_root = Path(__file__).parent.parent
         self.user_config = None
-        self.web_elements_config = None
-        self.load_web_elements_config()
+        # 网页元素配置延迟到第一次使用时再解析，避免导入本模块时读取YAML拖慢启动
+        self._web_elements_config = None
+        # 热加载：已加载的文件及其签名，校验失败的签名（不重复报错）
+        self._web_elements_signature = None
+        self._user_config_path = None
+        self._user_config_signature = None
+        self._rejected_signatures = {}
+    
+    @property
+    def web_elements_config(self):
+        """网页元素配置（首次访问时加载）"""
+        if self._web_elements_config is None:
+            self.load_web_elements_config()
+        return self._web_elements_config
+    
+    @web_elements_config.setter
+    def web_elements_config(self, value):
+        self._web_elements_config = value
+    
+    @property
+    def web_elements_path(self):
+        return self.project_root / "config" / "web_elements.yaml"
     
     def load_web_elements_config(self):
         """加载网页元素配置"""
         try:
-            web_elements_path = self.project_root / "config" / "web_elements.yaml"
-            with open(web_elements_path, 'r', encoding='utf-8') as f:
-                self.web_elements_config = yaml.safe_load(f)
+            import yaml
+            
+            self._web_elements_signature = file_signature(self.web_elements_path)
+            with open(self.web_elements_path, 'r', encoding='utf-8') as f:
+                self._web_elements_config = yaml.safe_load(f)
             logger.info("网页元素配置加载成功")
         except Exception as e:
             logger.error(f"网页元素配置加载失败: {e}")
@@ -30,8 +91,111 @@ class ConfigManager:
     def set_user_config(self, config_data):
         """直接设置用户配置数据（从GUI传入）"""
         self.user_config = config_data
+        # GUI修改配置时会自动保存到该文件，运行中据此热加载
+        self._user_config_path = self.get_user_config_file_path()
+        self._user_config_signature = file_signature(self._user_config_path)
         logger.info("用户配置已从GUI更新")
     
+    def get_user_config_file_path(self):
+        """获取GUI自动保存的配置文件路径（用户主目录下的隐藏文件）"""
+        return Path.home() / ".chatglm_video_config.json"
+    
+    def get_data_dir(self):
+        """程序运行数据目录（用户主目录下，保存接口记录、统计等持久化数据）"""
+        data_dir = Path.home() / ".chatglm_video"
+        data_dir.mkdir(parents=True, exist_ok=True)
+        return data_dir
+    
+    def load_user_config_file(self, config_path=None):
+        """
+        从文件加载用户配置（JSON或YAML），供命令行模式使用
+        config_path为None时使用GUI自动保存的配置文件
+        """
+        config_path = Path(config_path) if config_path else self.get_user_config_file_path()
+        if not config_path.exists():
+            raise FileNotFoundError(f"配置文件不存在: {config_path}")
+        
+        self._user_config_signature = file_signature(config_path)
+        self.user_config = self._read_config_file(config_path)
+        self._user_config_path = config_path
+        logger.info(f"用户配置已从文件加载: {config_path}")
+    
+    @staticmethod
+    def _read_config_file(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            if config_path.suffix.lower() == '.json':
+                import json
+                return json.load(f)
+            import yaml
+            return yaml.safe_load(f) or {}
+    
+    def validate_user_config(self, config) -> list:
+        """校验用户配置：必须是字典，已知配置项的类型与默认值一致（整数和小数可互换）"""
+        if not isinstance(config, dict):
+            return ["配置不是字典"]
+        errors = []
+        for key, default in self.get_default_config().items():
+            if key not in config or default is None or config[key] is None:
+                continue
+            value = config[key]
+            if isinstance(default, bool) or isinstance(value, bool):
+                valid = isinstance(value, bool) == isinstance(default, bool)
+            elif isinstance(default, (int, float)):
+                valid = isinstance(value, (int, float))
+            else:
+                valid = isinstance(value, type(default))
+            if not valid:
+                errors.append(f"{key} 类型应为 {type(default).__name__}")
+        return errors
+    
+    def reload_if_changed(self) -> set:
+        """
+        检查 web_elements.yaml 和用户配置文件是否被修改，校验通过后整体替换（由调用方在任务之间调用）
+        返回发生变化的配置: {'web_elements', 'user_config'} 的子集；校验失败时保留原配置
+        """
+        changed = set()
+        if not self.get_user_config('hot_reload'):
+            return changed
+        
+        if self._web_elements_config is not None:
+            new_config = self._reload_file('web_elements', self.web_elements_path, self._web_elements_signature,
+                                           validate_web_elements)
+            if new_config is not None:
+                self._web_elements_signature = file_signature(self.web_elements_path)
+                self._web_elements_config = new_config
+                changed.add('web_elements')
+                logger.info("网页元素配置已重新加载")
+        
+        if self._user_config_path is not None:
+            new_config = self._reload_file('user_config', self._user_config_path, self._user_config_signature,
+                                           self.validate_user_config)
+            if new_config is not None:
+                old_config = self.user_config or {}
+                keys = sorted(key for key in set(old_config) | set(new_config) if old_config.get(key) != new_config.get(key))
+                self._user_config_signature = file_signature(self._user_config_path)
+                if keys:
+                    self.user_config = new_config
+                    changed.add('user_config')
+                    logger.info(f"用户配置已重新加载，变化的配置项: {', '.join(keys)}")
+        return changed
+    
+    def _reload_file(self, name, path, signature, validate):
+        """文件签名变化时读取并校验，返回新配置；未变化、读取或校验失败时返回None"""
+        current = file_signature(path)
+        if current is None or current == signature or current == self._rejected_signatures.get(name):
+            return None
+        try:
+            new_config = self._read_config_file(Path(path))
+        except Exception as e:
+            errors = [f"无法解析: {e}"]
+        else:
+            errors = validate(new_config)
+        if errors:
+            self._rejected_signatures[name] = current
+            logger.error(f"{path} 已修改但校验未通过，继续使用原配置: {'；'.join(errors)}")
+            return None
+        return new_config
+    
     def get_default_config(self):
         """获取默认配置"""
         return {
@@ -55,7 +219,73 @@ class ConfigManager:
                 'input_after': 1.0,
                 'click_after': 1.5
             },
-            'download_timeout': 60
+            'download_timeout': 60,
+            # 调度配置
+            'priority_column': 0,               # Excel优先级所在列，0表示不使用
+            'folder_priorities': {},            # {文件夹名: 优先级}，数值越大越优先
+            'group_by_video_options': False,    # 同优先级下尽量连续处理相同视频参数的任务
+            'scheduler_lookahead': 50,          # 每个文件夹预读的任务数，0表示整表预读
+            'watch_poll_interval': 5.0,         # 监视模式下无任务时的检查间隔（秒）
+            # 作业服务（只监听本机）
+            'service_host': '127.0.0.1',
+            'service_port': 8765,
+            'job_retention': 86400,             # 已结束的作业保留多久（秒），之后不再能查询
+            'max_finished_jobs': 1000,          # 最多保留的已结束作业数
+            # 失败重试：按失败类型覆盖默认重试次数，如 {'generation_timeout': 0}
+            'retry_budgets': {},
+            'retry_backoff': {'base': 10.0, 'max': 300.0},  # 指数退避的初始和最大等待（秒）
+            'max_outage_requeues': 5,           # 每个任务因网站整体异常免费重新排队的次数，超过后按正常重试次数处理
+            # 熔断：连续网站异常达到阈值后暂停提交，冷却后用一个任务探测，失败则冷却加倍
+            'circuit_breaker': {'failure_threshold': 3, 'base_cooldown': 60.0, 'max_cooldown': 900.0},
+            # 生成状态检查间隔（秒）：按排队位置和进度在上下限之间自动调整
+            'generation_poll': {'min_interval': 2.0, 'max_interval': 30.0},
+            # 视频下载连接池：http2 需要安装 httpx[http2]；use_browser_cookies 带上浏览器的Cookie和User-Agent
+            'download_client': {'http2': False, 'pool_connections': 4, 'pool_maxsize': 8, 'use_browser_cookies': True},
+            # 下载总带宽上限（MB/s，0为不限）
+            'download_scheduler': {'max_bandwidth_mbps': 0},
+            'capture_browser_video': False,     # 直接保存浏览器预览时已加载的视频，不完整时再下载
+            # 生成方式：ui 全程操作页面；hybrid 首次通过页面操作并记录网站接口，之后直接调用接口，接口变化时退回页面操作
+            'generation_mode': 'ui',
+            # 视频保存后检查实际分辨率/帧率并写入根目录的 video_catalog.db，不符时标记为需重新生成
+            'video_catalog': {
+                'enabled': True,
+                'workers': 2,                   # 元数据解析进程数
+                'requeue_mismatched': True,     # 不符的任务写入 mismatch_status，下次运行重新生成
+                'mismatch_status': '需重新生成'
+            },
+            # 元素有多个备选选择器时：首选先用短超时尝试，失败后所有备选同时等待（毫秒）；
+            # 可以加 timeout 单独设置等待备选的总超时，未设置时使用上面的 timeout
+            'selector_race': {'fast_timeout': 1500},
+            # 页面操作各阶段的时间预算（秒）和整个任务的总预算，超出时立即取消并失败；
+            # 等待生成的预算默认按同参数的历史耗时自适应（见 adaptive_timeout），也可以在这里用 generation 固定
+            'phase_budgets': {'upload': 60, 'params': 45, 'prompt': 20, 'submit': 20, 'total': 480},
+            # 自适应生成超时：按视频参数取最近 window 次生成耗时的 percentile 百分位数 × multiplier，
+            # 限制在 min_timeout ~ max_timeout 秒之间；样本少于 min_samples 时使用 video_generation_timeout
+            'adaptive_timeout': {'enabled': True, 'percentile': 95, 'multiplier': 1.5, 'window': 50, 'min_samples': 10,
+                                 'min_timeout': 60, 'max_timeout': 900},
+            # 故障现场记录：每个任务录制Playwright追踪，只保存失败任务的追踪（~/.chatglm_video/flight_recorder，最多 keep 个）；
+            # snapshots 记录DOM快照，screenshots 记录截图（开销较大）；max_events 为内存中保留的最近页面事件数
+            'flight_recorder': {'enabled': True, 'snapshots': True, 'screenshots': False, 'max_events': 300, 'keep': 30},
+            # 页面内存监控：每 sample_every 个任务采样一次JS堆、DOM节点数和页面查询耗时，
+            # 任一项超过阈值时回收页面（两次回收至少间隔 min_tasks_between_recycles 个任务）
+            'page_watchdog': {'enabled': True, 'sample_every': 5, 'max_heap_mb': 400, 'max_nodes': 100000,
+                              'max_probe_ms': 800, 'min_tasks_between_recycles': 10},
+            # 按 config/resource_policy.yaml 拦截受控页面上的第三方统计、字体等资源；排查网站问题时可关闭
+            'resource_blocking': True,
+            'hot_reload': True,                 # 运行中修改 web_elements.yaml 或配置文件后，在任务之间自动生效
+            # 模拟器（python -m src.simulator）在没有足够运行记录时使用的耗时分布：[均值, 标准差]，单位秒
+            'simulation': {
+                'phases': {
+                    'upload': [6.0, 2.0],
+                    'params': [3.0, 1.0],
+                    'prompt': [1.5, 0.5],
+                    'submit': [1.0, 0.3],
+                    'generation': [180.0, 60.0]
+                },
+                'video_mb': [30.0, 10.0],       # 视频大小（MB）
+                'link_mbps': 10.0,              # 单个下载的线路速度（MB/s）
+                'failure_rate': 0.02            # 生成失败的概率
+            }
         }
     
     def get_user_config(self, key=None):
@@ -64,7 +294,10 @@ class ConfigManager:
             self.user_config = self.get_default_config()
         
         if key:
-            return self.user_config.get(key)
+            # GUI传入的配置可能不包含新增的配置项，缺失时使用默认值
+            if key in self.user_config:
+                return self.user_config[key]
+            return self.get_default_config().get(key)
         return self.user_config
     
     def get_web_element(self, element_path):
@@ -0,0 +1,108 @@
+"""
+任务时间预算
+每个任务创建一个 TaskDeadline，浏览器操作的每个阶段（上传、设置参数、输入提示词、提交、等待生成）有各自的预算，
+整个任务另有总预算；阶段内每次Playwright等待的超时取 剩余时间 与原超时的较小值，
+阶段或总预算用完时立即取消当前操作并失败，不再把时间耗在注定失败的后续步骤上
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Dict, Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.retry_engine import TaskFailure, FailureKind
+from src.selector_resolver import is_timeout
+from src.generation_timeout import generation_timeout
+from src.flight_recorder import flight_recorder
+
+# 阶段名称（用于日志）
+PHASE_LABELS = {
+    'upload': '上传图片',
+    'params': '设置基础参数',
+    'prompt': '输入提示词',
+    'submit': '点击生成',
+    'generation': '等待生成',
+}
+
+
+class TaskDeadline:
+    """
+    单个任务的时间预算（秒）
+    - run_phase 在阶段预算和总预算内执行一个阶段，超出时取消并抛出 TaskFailure
+    - timeout_ms 给阶段内的每次等待计算超时（毫秒）
+    """
+
+    def __init__(self, budgets: Dict[str, float], total: float):
+        self.budgets = budgets
+        self.total = total
+        self.started = time.monotonic()
+        self.expires = self.started + total
+        self.phase: Optional[str] = None
+        self._phase_expires: Optional[float] = None
+        self.elapsed: Dict[str, float] = {}     # 已执行阶段的耗时（秒）
+
+    @classmethod
+    def for_task(cls, video_options: Optional[dict] = None) -> 'TaskDeadline':
+        """
+        按配置创建：未单独设置等待生成的预算时，按同参数的历史耗时自适应（样本不足时取 video_generation_timeout）；
+        总预算按 video_generation_timeout 设定，自适应的生成预算更长时总预算相应延长
+        """
+        settings = {'upload': 60, 'params': 45, 'prompt': 20, 'submit': 20, 'total': 480}
+        settings.update(config_manager.get_user_config('phase_budgets') or {})
+        budgets = {name: float(value) for name, value in settings.items() if name != 'total'}
+        total = float(settings['total'])
+        if 'generation' not in budgets:
+            budgets['generation'] = generation_timeout.timeout_for(video_options)
+            total += max(budgets['generation'] - generation_timeout.default_timeout(), 0)
+            logger.debug(f"生成超时: {budgets['generation']:.0f} 秒（{generation_timeout.key(video_options)}）")
+        return cls(budgets, total)
+
+    def remaining(self) -> float:
+        """当前阶段（不在阶段中时为整个任务）剩余的秒数"""
+        expires = self.expires if self._phase_expires is None else min(self.expires, self._phase_expires)
+        return max(expires - time.monotonic(), 0.0)
+
+    def timeout_ms(self, default: Optional[float] = None) -> float:
+        """一次等待的超时（毫秒）：剩余时间与原超时的较小值；时间已用完时直接失败"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise self._failure()
+        remaining_ms = remaining * 1000
+        return remaining_ms if default is None else min(default, remaining_ms)
+
+    def _failure(self) -> TaskFailure:
+        label = PHASE_LABELS.get(self.phase, self.phase or '任务')
+        if self._phase_expires is not None and self._phase_expires < self.expires:
+            message = f"{label}超出阶段时间预算（{self.budgets[self.phase]:g} 秒）"
+        else:
+            message = f"{label}时任务超出总时间预算（{self.total:g} 秒）"
+        # 等待生成超时沿用原有的失败类型（重试次数等配置不变）
+        kind = FailureKind.GENERATION_TIMEOUT if self.phase == 'generation' else FailureKind.DEADLINE_EXCEEDED
+        return TaskFailure(kind, message)
+
+    async def run_phase(self, phase: str, awaitable: Awaitable):
+        """在预算内执行一个阶段，预算用完时取消该阶段"""
+        self.phase = phase
+        budget = self.budgets.get(phase)
+        start = time.monotonic()
+        self._phase_expires = start + budget if budget else None
+        flight_recorder.note('phase', f"{PHASE_LABELS.get(phase, phase)}（预算 {self.remaining():.0f} 秒）")
+        try:
+            remaining = self.remaining()
+            if remaining <= 0:
+                if asyncio.iscoroutine(awaitable):
+                    awaitable.close()
+                raise self._failure()
+            try:
+                return await asyncio.wait_for(awaitable, timeout=remaining)
+            except Exception as e:
+                # 阶段内的等待按剩余时间设置了超时，时间用完时它们和本阶段几乎同时超时，都归为超出预算
+                if not is_timeout(e) or self.remaining() > 0.05:
+                    raise
+                failure = self._failure()
+                logger.warning(f"{failure}，已取消")
+                raise failure from None
+        finally:
+            self.elapsed[phase] = time.monotonic() - start
+            self.phase = None
+            self._phase_expires = None
@@ -0,0 +1,194 @@
+"""
+视频下载客户端
+所有下载共用一个连接池（keep-alive），避免每次下载和重试都重新做DNS解析、TCP连接和TLS握手；
+可选HTTP/2（需要安装 httpx[http2]），可带上浏览器上下文的Cookie和请求头
+"""
+
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator
+from urllib.parse import urlsplit
+from loguru import logger
+from src.config_manager import config_manager
+from src.retry_engine import TaskFailure, FailureKind
+
+
+class DownloadResponse:
+    """下载响应（屏蔽requests和httpx的差异）"""
+
+    def __init__(self, status_code: int, headers, chunks: Iterator[bytes]):
+        self.status_code = status_code
+        self.headers = headers
+        self._chunks = chunks
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        return self._chunks
+
+
+class DownloadClient:
+    """
+    共享下载客户端
+    - 默认使用 requests.Session + 连接池；配置 http2 且安装了 httpx[http2] 时使用 httpx
+    - 统计请求数和新建连接数，复用率 = 1 - 新建连接数 / 请求数
+    """
+
+    COOKIE_SYNC_INTERVAL = 300     # 同一主机的浏览器Cookie最多每5分钟同步一次
+
+    def __init__(self):
+        self._client = None
+        self._backend = None
+        self._lock = threading.Lock()
+        self._cookie_synced: Dict[str, float] = {}
+        self._seen_connections = weakref.WeakSet()    # 已统计过的连接对象
+        self.requests = 0
+        self.connections_opened = 0
+        self.bytes_downloaded = 0
+
+    @staticmethod
+    def _settings() -> dict:
+        settings = {'http2': False, 'pool_connections': 4, 'pool_maxsize': 8, 'use_browser_cookies': True}
+        settings.update(config_manager.get_user_config('download_client') or {})
+        return settings
+
+    def _ensure_client(self):
+        """首次下载时才创建客户端（requests/httpx较重，延迟导入）"""
+        with self._lock:
+            if self._client is not None:
+                return self._client
+            settings = self._settings()
+            if settings['http2']:
+                try:
+                    import httpx
+                    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+
+                    limits = httpx.Limits(
+                        max_connections=int(settings['pool_maxsize']),
+                        max_keepalive_connections=int(settings['pool_maxsize'])
+                    )
+                    self._client = httpx.Client(http2=True, limits=limits, follow_redirects=True)
+                    self._backend = 'httpx'
+                    logger.info("下载客户端: httpx（HTTP/2）")
+                    return self._client
+                except ImportError:
+                    logger.warning("未安装 httpx[http2]，下载改用HTTP/1.1连接池")
+
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=int(settings['pool_connections']),
+                pool_maxsize=int(settings['pool_maxsize'])
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._client = session
+            self._backend = 'requests'
+            return self._client
+
+    async def sync_from_browser(self, context, page, url: str):
+        """把浏览器上下文中该地址可用的Cookie、User-Agent和Referer带到下载请求上"""
+        if context is None or not self._settings()['use_browser_cookies']:
+            return
+        host = urlsplit(url).hostname or ''
+        now = time.monotonic()
+        if now - self._cookie_synced.get(host, 0) < self.COOKIE_SYNC_INTERVAL:
+            return
+        try:
+            cookies = await context.cookies(url)
+            headers = {'Referer': config_manager.get_target_url()}
+            if page is not None:
+                headers['User-Agent'] = await page.evaluate("navigator.userAgent")
+            client = self._ensure_client()
+            for cookie in cookies:
+                client.cookies.set(cookie['name'], cookie['value'],
+                                   domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+            client.headers.update(headers)
+            self._cookie_synced[host] = now
+            logger.debug(f"已同步浏览器Cookie到下载客户端: {host}（{len(cookies)} 个）")
+        except Exception as e:
+            logger.warning(f"同步浏览器Cookie失败，使用无Cookie下载: {e}")
+
+    @contextmanager
+    def stream(self, url: str, timeout: float) -> Iterator[DownloadResponse]:
+        """
+        以流方式请求url，网络错误和超时抛出 TaskFailure(HTTP_ERROR)
+        状态码由调用方判断
+        """
+        client = self._ensure_client()
+        self.requests += 1
+        try:
+            if self._backend == 'httpx':
+                with client.stream('GET', url, timeout=timeout) as response:
+                    self._count_httpx_connections()
+                    yield DownloadResponse(response.status_code, response.headers,
+                                           self._counted(response.iter_bytes(chunk_size=65536)))
+            else:
+                with client.get(url, timeout=timeout, stream=True) as response:
+                    self._count_requests_connection(response)
+                    yield DownloadResponse(response.status_code, response.headers,
+                                           self._counted(response.iter_content(chunk_size=65536)))
+        except TaskFailure:
+            raise
+        except Exception as e:
+            if 'timeout' in type(e).__name__.lower():
+                raise TaskFailure(FailureKind.HTTP_ERROR, f"下载超时（{timeout} 秒）")
+            if type(e).__module__.split('.')[0] in ('requests', 'httpx', 'urllib3', 'httpcore'):
+                raise TaskFailure(FailureKind.HTTP_ERROR, f"下载请求失败: {e}")
+            raise
+
+    def _counted(self, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self.bytes_downloaded += len(chunk)
+            yield chunk
+
+    def _count_requests_connection(self, response):
+        """urllib3的连接对象在连接池中复用，按对象识别新建的连接"""
+        connection = getattr(response.raw, '_connection', None) or getattr(response.raw, 'connection', None)
+        self._track_connection(connection)
+
+    def _count_httpx_connections(self):
+        pool = getattr(getattr(self._client, '_transport', None), '_pool', None)
+        for connection in getattr(pool, 'connections', []):
+            self._track_connection(connection)
+
+    def _track_connection(self, connection):
+        if connection is not None and connection not in self._seen_connections:
+            self._seen_connections.add(connection)
+            self.connections_opened += 1
+
+    def stats(self) -> Dict:
+        """连接复用统计"""
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            'backend': self._backend,
+            'requests': self.requests,
+            'connections_opened': self.connections_opened,
+            'reuse_rate': round(reused / self.requests, 3) if self.requests else None,
+            'bytes_downloaded': self.bytes_downloaded,
+        }
+
+    def report(self):
+        """输出连接复用统计"""
+        if not self.requests:
+            return
+        stats = self.stats()
+        logger.info(
+            f"下载连接: {stats['requests']} 次请求，新建 {stats['connections_opened']} 个连接，"
+            f"复用率 {stats['reuse_rate']:.0%}，共 {stats['bytes_downloaded'] / 1024 / 1024:.1f} MB"
+        )
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self._backend = None
+            self._cookie_synced.clear()
+            self._seen_connections.clear()
+
+
+# 全局下载客户端实例
+download_client = DownloadClient()
@@ -0,0 +1,154 @@
+"""
+下载带宽限制
+在 save_video_file 之上为所有下载施加全局带宽上限（按字节的令牌桶），并统计实际吞吐量
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from loguru import logger
+from src.config_manager import config_manager
+from src.file_manager import file_manager
+from src.phase_stats import phase_stats
+from src.task_source import TaskRecord
+
+MB = 1024 * 1024
+
+
+class TokenBucket:
+    """
+    按字节计的令牌桶（线程安全，下载在线程中执行）
+    rate<=0 表示不限速；令牌不足时允许透支，由本次调用等待补足
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def consume(self, size: int):
+        """取走size字节的令牌，不够时阻塞等待"""
+        with self._lock:
+            if self.rate <= 0:
+                return
+            self._refill()
+            self.tokens -= size
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class DownloadScheduler:
+    """
+    下载带宽限制
+    - 所有下载共用一个令牌桶限制总带宽（每个工作循环同时只有一个下载，多个窗口时下载之间平分上限）
+    """
+
+    def __init__(self):
+        self._active = 0
+        self._bucket: Optional[TokenBucket] = None
+        self.downloads = 0
+        self.bytes_total = 0
+        self.busy_seconds = 0.0             # 至少有一个下载进行中的总时长
+        self._busy_since: Optional[float] = None
+
+    @staticmethod
+    def _settings() -> dict:
+        settings = {'max_bandwidth_mbps': 0}
+        settings.update(config_manager.get_user_config('download_scheduler') or {})
+        return settings
+
+    def _download_rate(self) -> float:
+        """下载可用带宽（字节/秒）"""
+        return float(self._settings()['max_bandwidth_mbps']) * MB
+
+    @property
+    def bucket(self) -> TokenBucket:
+        if self._bucket is None:
+            rate = self._download_rate()
+            # 突发容量取0.25秒的流量，避免开始时超出上限太多
+            self._bucket = TokenBucket(rate, max(rate / 4, 256 * 1024))
+        return self._bucket
+
+    def _start(self):
+        self._active += 1
+        if self._busy_since is None:
+            self._busy_since = time.monotonic()
+
+    def _finish(self):
+        self._active -= 1
+        if self._active == 0 and self._busy_since is not None:
+            self.busy_seconds += time.monotonic() - self._busy_since
+            self._busy_since = None
+
+    async def download(self, task: TaskRecord, folder_path: str) -> str:
+        """下载任务的视频，返回保存路径（失败时抛出 TaskFailure）"""
+        self._start()
+        start = time.monotonic()
+        try:
+            video_path, size = await self._transfer(task, folder_path)
+        finally:
+            self._finish()
+
+        elapsed = time.monotonic() - start
+        self.downloads += 1
+        self.bytes_total += size
+        logger.info(f"下载完成: {size / MB:.1f} MB，用时 {elapsed:.1f} 秒（{size / MB / max(elapsed, 1e-6):.2f} MB/s）")
+        return video_path
+
+    async def _transfer(self, task: TaskRecord, folder_path: str) -> Tuple[str, int]:
+        """实际下载（在线程中执行，经令牌桶限速），返回 (保存路径, 字节数)"""
+        start = time.monotonic()
+        video_path = await asyncio.to_thread(
+            file_manager.save_video_file,
+            task.video_url, folder_path, task.image_index, task.prompt, self.bucket.consume
+        )
+        size = os.path.getsize(video_path)
+        # 视频大小和下载速度供模拟器使用
+        phase_stats.record('video_mb', size / MB)
+        phase_stats.record('download_mbps', size / MB / max(time.monotonic() - start, 1e-6))
+        return video_path, size
+
+    def stats(self) -> Dict:
+        busy = self.busy_seconds + (time.monotonic() - self._busy_since if self._busy_since else 0.0)
+        return {
+            'downloads': self.downloads,
+            'active': self._active,
+            'megabytes': round(self.bytes_total / MB, 1),
+            'throughput_mbps': round(self.bytes_total / MB / busy, 2) if busy else None,
+            'bandwidth_cap_mbps': float(self._settings()['max_bandwidth_mbps']) or None,
+        }
+
+    def report(self):
+        """输出下载吞吐量"""
+        if not self.downloads:
+            return
+        stats = self.stats()
+        cap = f"（上限 {stats['bandwidth_cap_mbps']} MB/s）" if stats['bandwidth_cap_mbps'] else ''
+        logger.info(f"下载吞吐: {stats['downloads']} 个文件，{stats['megabytes']} MB，平均 {stats['throughput_mbps']} MB/s{cap}")
+
+    def reset_bandwidth(self):
+        """带宽配置修改后调用，下次下载按新配置创建令牌桶"""
+        self._bucket = None
+    
+    def reset(self):
+        """重置统计（进行中的下载不受影响）"""
+        self.downloads = 0
+        self.bytes_total = 0
+        self.busy_seconds = 0.0
+        self._busy_since = time.monotonic() if self._active else None
+        self._bucket = None
+
+
+# 全局下载调度器实例
+download_scheduler = DownloadScheduler()
@@ -1,14 +1,32 @@
 """
 文件管理器
-负责处理Excel文件读写、图片文件扫描等文件操作
+负责处理任务清单（Excel/CSV/JSONL/Parquet）读写、图片文件扫描等文件操作
 """
 
 import os
-import pandas as pd
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator, Callable
 from loguru import logger
 from src.config_manager import config_manager
+from src.retry_engine import TaskFailure, FailureKind, http_failure
+from src.download_client import download_client
+from src.task_source import (
+    TaskRecord, MANIFEST_EXTENSIONS, STATUS_SIDECAR_SUFFIX,
+    iter_manifest_rows, uses_status_sidecar, append_sidecar_status
+)
+
+# 文件夹级设置文件名（可选）
+FOLDER_SETTINGS_FILENAME = 'folder_config.yaml'
+
+
+def _to_priority(value) -> Optional[int]:
+    """将优先级取值转换为整数，无法转换时返回None"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
 
 
 class FileManager:
@@ -36,24 +54,66 @@ class FileManager:
         """动态获取完成状态"""
         return config_manager.get_user_config('completed_status')
     
-    def find_excel_file(self, folder_path: str) -> Optional[str]:
+    @property
+    def priority_column(self):
+        """动态获取优先级列"""
+        return config_manager.get_user_config('priority_column') or 0
+    
+    def get_folder_settings(self, folder_path: str) -> Dict:
         """
-        在文件夹中查找Excel文件
-        返回Excel文件的完整路径，如果没找到返回None
+        获取文件夹级设置
+        优先级来自文件夹内的 folder_config.yaml 或用户配置 folder_priorities，
+        folder_config.yaml 中还可以为该文件夹单独指定 video_options
+        返回: {'priority': 优先级, 'video_options': 视频参数或None}
+        """
+        settings = {}
+        settings_path = os.path.join(folder_path, FOLDER_SETTINGS_FILENAME)
+        if os.path.exists(settings_path):
+            try:
+                import yaml
+                
+                with open(settings_path, 'r', encoding='utf-8') as f:
+                    settings = yaml.safe_load(f) or {}
+            except Exception as e:
+                logger.warning(f"读取文件夹设置失败，使用默认设置: {settings_path} - {e}")
+                settings = {}
+        
+        folder_priorities = config_manager.get_user_config('folder_priorities') or {}
+        priority = settings.get('priority', folder_priorities.get(os.path.basename(folder_path), 0))
+        return {
+            'priority': _to_priority(priority) or 0,
+            'video_options': settings.get('video_options') or None
+        }
+    
+    def find_task_file(self, folder_path: str) -> Optional[str]:
+        """
+        在文件夹中查找任务清单文件（Excel、CSV、JSONL或Parquet）
+        返回清单文件的完整路径，如果没找到返回None
         """
         try:
-            excel_extensions = ['.xlsx', '.xls']
+            candidates = []
             for filename in os.listdir(folder_path):
-                if any(filename.lower().endswith(ext) for ext in excel_extensions):
-                    excel_path = os.path.join(folder_path, filename)
-                    logger.debug(f"找到Excel文件: {excel_path}")
-                    return excel_path
+                lower_name = filename.lower()
+                # 跳过状态旁路文件和Excel打开时产生的临时锁文件
+                if lower_name.endswith(STATUS_SIDECAR_SUFFIX) or filename.startswith('~$'):
+                    continue
+                ext = os.path.splitext(lower_name)[1]
+                if ext in MANIFEST_EXTENSIONS:
+                    candidates.append((MANIFEST_EXTENSIONS.index(ext), filename))
             
-            logger.warning(f"文件夹 {folder_path} 中未找到Excel文件")
-            return None
+            if not candidates:
+                logger.warning(f"文件夹 {folder_path} 中未找到任务清单文件")
+                return None
+            
+            candidates.sort()
+            if len(candidates) > 1:
+                logger.warning(f"文件夹 {folder_path} 中有多个任务清单，使用: {candidates[0][1]}")
+            task_file_path = os.path.join(folder_path, candidates[0][1])
+            logger.debug(f"找到任务清单文件: {task_file_path}")
+            return task_file_path
             
         except Exception as e:
-            logger.error(f"查找Excel文件失败: {e}")
+            logger.error(f"查找任务清单文件失败: {e}")
             return None
     
     def get_all_task_folders(self) -> List[str]:
@@ -72,9 +132,9 @@ class FileManager:
             for item in os.listdir(root_dir):
                 folder_path = os.path.join(root_dir, item)
                 if os.path.isdir(folder_path):
-                    # 检查文件夹中是否有Excel文件
-                    excel_file = self.find_excel_file(folder_path)
-                    if excel_file:
+                    # 检查文件夹中是否有任务清单文件
+                    task_file = self.find_task_file(folder_path)
+                    if task_file:
                         folders.append(folder_path)
             
             logger.info(f"找到 {len(folders)} 个任务文件夹")
@@ -112,150 +172,144 @@ class FileManager:
             logger.error(f"获取图片文件失败: {e}")
             return []
     
-    def read_excel_tasks(self, folder_path: str) -> pd.DataFrame:
-        """读取Excel任务列表"""
-        try:
-            excel_path = self.find_excel_file(folder_path)
-            if not excel_path:
-                logger.error(f"文件夹 {folder_path} 中未找到Excel文件")
-                return pd.DataFrame()
-            
-            df = pd.read_excel(excel_path)
-            logger.info(f"读取Excel文件成功: {excel_path}")
-            return df
-            
-        except Exception as e:
-            logger.error(f"读取Excel文件失败: {e}")
-            return pd.DataFrame()
-    
-    def get_pending_tasks(self, folder_path: str) -> List[Dict]:
+    def iter_pending_tasks(self, folder_path: str) -> Iterator[TaskRecord]:
         """
-        获取待处理的任务
-        返回: [{'index': 行号, 'image_index': 图片序号, 'image_path': 图片路径, 'prompt': 提示词}, ...]
+        流式获取待处理的任务，只读取提示词列、状态列和优先级列，逐个产出任务
+        行优先级为空时使用文件夹优先级
+        返回: 迭代 TaskRecord
         """
+        task_file_path = self.find_task_file(folder_path)
+        if not task_file_path:
+            logger.error(f"文件夹 {folder_path} 中未找到任务清单文件")
+            return
+        
+        images = self.get_images_in_folder(folder_path)
+        image_dict = {index: path for index, path in images}
+        settings = self.get_folder_settings(folder_path)
+        
+        pending_count = 0
         try:
-            df = self.read_excel_tasks(folder_path)
-            if df.empty:
-                return []
-            
-            images = self.get_images_in_folder(folder_path)
-            image_dict = {index: path for index, path in images}
-            
-            pending_tasks = []
-            
-            for idx, row in df.iterrows():
+            rows = iter_manifest_rows(task_file_path, self.prompt_column, self.status_column, self.priority_column)
+            for excel_row, prompt, status, row_priority in rows:
                 # 检查状态列是否已完成
-                status = row.iloc[self.status_column - 1] if len(row) >= self.status_column else None
-                if pd.isna(status) or status != self.completed_status:
-                    prompt = row.iloc[self.prompt_column - 1] if len(row) >= self.prompt_column else None
-                    if pd.notna(prompt):
-                        # 修改：使用 Excel 行号作为图片序号
-                        image_index = idx + 1  # Excel 行号从 2 开始（第1行是标题），对应 idx + 1
-                        image_path = image_dict.get(image_index)
-                        if image_path:
-                            pending_tasks.append({
-                                'excel_row': idx,
-                                'image_index': image_index,
-                                'image_path': image_path,
-                                'prompt': str(prompt).strip()
-                            })
-                        else:
-                            logger.warning(f"未找到序号为 {image_index} 的图片")
-            
-            logger.info(f"文件夹 {folder_path} 中有 {len(pending_tasks)} 个待处理任务")
-            return pending_tasks
-            
+                if status is not None and status == self.completed_status:
+                    continue
+                if prompt is None or str(prompt).strip() == '':
+                    continue
+                # 使用 Excel 行号作为图片序号（第1行是标题，数据行从序号1开始）
+                image_index = excel_row + 1
+                image_path = image_dict.get(image_index)
+                if not image_path:
+                    logger.warning(f"未找到序号为 {image_index} 的图片")
+                    continue
+                pending_count += 1
+                priority = _to_priority(row_priority)
+                yield TaskRecord(
+                    folder_path, excel_row, image_index, image_path, str(prompt).strip(),
+                    priority=settings['priority'] if priority is None else priority,
+                    video_options=settings['video_options']
+                )
         except Exception as e:
-            logger.error(f"获取待处理任务失败: {e}")
-            return []
+            logger.error(f"读取任务清单失败: {e}")
+        
+        logger.info(f"文件夹 {folder_path} 中有 {pending_count} 个待处理任务")
+    
+    def get_pending_tasks(self, folder_path: str) -> List[TaskRecord]:
+        """获取全部待处理的任务"""
+        return list(self.iter_pending_tasks(folder_path))
     
     def update_task_status(self, folder_path: str, excel_row: int, status: str = None):
-        """更新任务状态到Excel"""
+        """更新任务状态（Excel直接回写，其它格式写入状态旁路文件）"""
         try:
-            excel_path = self.find_excel_file(folder_path)
-            if not excel_path:
-                logger.error(f"文件夹 {folder_path} 中未找到Excel文件")
+            task_file_path = self.find_task_file(folder_path)
+            if not task_file_path:
+                logger.error(f"文件夹 {folder_path} 中未找到任务清单文件")
                 return
             
-            df = pd.read_excel(excel_path)
-            
-            # 确保状态列存在
-            while len(df.columns) < self.status_column:
-                df[f'Column_{len(df.columns) + 1}'] = None
-            
-            # 获取状态列名，并转换为object类型，避免dtype警告
-            status_col_name = df.columns[self.status_column - 1]
-            df[status_col_name] = df[status_col_name].astype('object')
-            
-            # 更新状态
             status = status or self.completed_status
-            df.iloc[excel_row, self.status_column - 1] = status
+            if uses_status_sidecar(task_file_path):
+                append_sidecar_status(task_file_path, excel_row, status)
+            elif task_file_path.lower().endswith('.xls'):
+                self._update_xls_status(task_file_path, excel_row, status)
+            else:
+                from openpyxl import load_workbook
+                
+                workbook = load_workbook(task_file_path)
+                sheet = workbook.worksheets[0]
+                # 确保状态列有表头
+                if sheet.cell(row=1, column=self.status_column).value is None:
+                    sheet.cell(row=1, column=self.status_column).value = f'Column_{self.status_column}'
+                # 第1行是表头，数据行从第2行开始
+                sheet.cell(row=excel_row + 2, column=self.status_column).value = status
+                workbook.save(task_file_path)
             
-            # 保存Excel
-            df.to_excel(excel_path, index=False)
             logger.info(f"更新任务状态成功: 行 {excel_row + 1} -> {status}")
             
         except Exception as e:
             logger.error(f"更新任务状态失败: {e}")
     
-    def save_video_file(self, video_url: str, folder_path: str, image_index: int, prompt: str) -> Optional[str]:
+    def _update_xls_status(self, excel_path: str, excel_row: int, status: str):
+        """更新旧版.xls文件中的任务状态（依赖pandas）"""
+        import pandas as pd
+        
+        df = pd.read_excel(excel_path)
+        
+        # 确保状态列存在
+        while len(df.columns) < self.status_column:
+            df[f'Column_{len(df.columns) + 1}'] = None
+        
+        # 获取状态列名，并转换为object类型，避免dtype警告
+        status_col_name = df.columns[self.status_column - 1]
+        df[status_col_name] = df[status_col_name].astype('object')
+        
+        df.iloc[excel_row, self.status_column - 1] = status
+        df.to_excel(excel_path, index=False)
+    
+    def get_video_path(self, folder_path: str, image_index: int, prompt: str) -> str:
+        """视频保存路径：序号_提示词.mp4"""
+        import re
+        
+        # 清理提示词，移除不适合文件名的字符
+        clean_prompt = re.sub(r'[<>:"/\\|?*\[\].,!?;:，。！？；：]', '', prompt)  # 移除不支持的字符和标点符号
+        clean_prompt = re.sub(r'\s+', '_', clean_prompt)  # 将空格替换为下划线
+        clean_prompt = clean_prompt.strip('_')[:10]  # 移除首尾下划线，限制长度为10个字符
+        
+        # 生成视频文件名：序号_提示词.mp4
+        video_filename = f"{image_index}_{clean_prompt}.mp4"
+        return os.path.join(folder_path, video_filename)
+    
+    def save_video_file(self, video_url: str, folder_path: str, image_index: int, prompt: str,
+                        throttle: Optional[Callable[[int], None]] = None) -> str:
         """
         下载并保存视频文件
-        返回保存的文件路径
+        throttle: 每收到一块数据时以字节数调用（用于限速），为None时不限速
+        返回保存的文件路径；失败时抛出 TaskFailure，由重试引擎按失败类型决定是否重试
         """
-        try:
-            import requests
-            import re
+        video_path = self.get_video_path(folder_path, image_index, prompt)
+        
+        # 下载视频（共用连接池，网络错误和超时由下载客户端转换为 TaskFailure）
+        timeout = config_manager.get_user_config('download_timeout')
+        with download_client.stream(video_url, timeout) as response:
+            if response.status_code != 200:
+                logger.warning(f"下载失败，状态码: {response.status_code}")
+                raise http_failure(response.status_code)
             
-            # 清理提示词，移除不适合文件名的字符
-            clean_prompt = re.sub(r'[<>:"/\\|?*\[\].,!?;:，。！？；：]', '', prompt)  # 移除不支持的字符和标点符号
-            clean_prompt = re.sub(r'\s+', '_', clean_prompt)  # 将空格替换为下划线
-            clean_prompt = clean_prompt.strip('_')[:10]  # 移除首尾下划线，限制长度为10个字符
-            
-            # 生成视频文件名：序号_提示词.mp4
-            video_filename = f"{image_index}_{clean_prompt}.mp4"
-            video_path = os.path.join(folder_path, video_filename)
-            
-            # 最大重试次数
-            max_retries = 3
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    # 下载视频
-                    timeout = config_manager.get_user_config('download_timeout')
-                    response = requests.get(video_url, timeout=timeout, stream=True)
-                    
-                    if response.status_code == 200:
-                        with open(video_path, 'wb') as f:
-                            for chunk in response.iter_content(chunk_size=8192):
-                                f.write(chunk)
-                        
-                        # 验证视频文件
-                        if self._is_valid_video_file(video_path):
-                            logger.info(f"视频下载成功: {video_path}")
-                            return video_path
-                        else:
-                            logger.warning(f"下载的视频文件无效，重试中... ({retry_count + 1}/{max_retries})")
-                            os.remove(video_path)  # 删除无效文件
-                    else:
-                        logger.warning(f"下载失败，状态码: {response.status_code}")
-                
-                except requests.exceptions.Timeout:
-                    logger.warning(f"下载超时，重试中... ({retry_count + 1}/{max_retries})")
-                except Exception as e:
-                    logger.warning(f"下载失败: {e}，重试中... ({retry_count + 1}/{max_retries})")
-                
-                retry_count += 1
-            
-            logger.error(f"视频下载失败，已重试 {max_retries} 次")
-            return None
-            
-        except Exception as e:
-            logger.error(f"保存视频文件失败: {e}")
-            return None
+            with open(video_path, 'wb') as f:
+                for chunk in response.iter_bytes():
+                    if throttle:
+                        throttle(len(chunk))
+                    f.write(chunk)
+        
+        # 验证视频文件
+        if not self.is_valid_video_file(video_path):
+            logger.warning("下载的视频文件无效")
+            os.remove(video_path)  # 删除无效文件
+            raise TaskFailure(FailureKind.INVALID_MP4, "下载的文件不是有效的MP4")
+        
+        logger.info(f"视频下载成功: {video_path}")
+        return video_path
     
-    def _is_valid_video_file(self, file_path: str) -> bool:
+    def is_valid_video_file(self, file_path: str) -> bool:
         """检查视频文件是否有效"""
         try:
             # 检查文件大小
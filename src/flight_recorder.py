@@ -0,0 +1,208 @@
+"""
+故障现场记录（飞行记录仪）
+浏览器上下文开启Playwright追踪，每个任务录制为一个追踪片段（start_chunk / stop_chunk），
+任务成功时直接丢弃，只有失败（包括超出时间预算）的任务才写出追踪文件；
+同时在内存中滚动保留最近的页面事件（请求、响应、控制台错误、元素操作、阶段），
+与失败时的页面HTML和截图一起写入同一个zip
+
+查看: playwright show-trace ~/.chatglm_video/flight_recorder/<文件名>.zip
+"""
+
+import json
+import os
+import time
+import weakref
+import zipfile
+from collections import deque
+from typing import Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.task_source import TaskRecord
+
+DUMP_DIRNAME = 'flight_recorder'
+MAX_DETAIL = 300        # 单条事件最多保留的字符数
+
+
+class FlightRecorder:
+    """
+    故障现场记录
+    - attach 在浏览器初始化时调用：开启追踪并监听页面事件（未调用时其它方法都不做任何事，如模拟器）
+    - begin_task / end_task 由任务处理器在每个任务前后调用
+    - note 供其它模块记录操作，只追加到内存中的滚动窗口
+    """
+
+    def __init__(self):
+        self._events: deque = deque(maxlen=300)
+        self._pages = weakref.WeakSet()
+        self._context = None            # 已开启追踪的浏览器上下文
+        self._tracing = False
+        self._chunk_open = False
+        self.dumps = 0
+        self.tasks = 0
+        self.overhead_seconds = 0.0     # 开始/结束追踪片段的耗时（不含写出失败现场）
+
+    @staticmethod
+    def _settings() -> dict:
+        settings = {'enabled': True, 'snapshots': True, 'screenshots': False, 'max_events': 300, 'keep': 30}
+        settings.update(config_manager.get_user_config('flight_recorder') or {})
+        return settings
+
+    def enabled(self) -> bool:
+        return bool(self._settings()['enabled'])
+
+    def _attached(self) -> bool:
+        return self._tracing or len(self._pages) > 0
+
+    @staticmethod
+    def dump_dir():
+        path = config_manager.get_data_dir() / DUMP_DIRNAME
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    # ---------- 录制 ----------
+
+    async def attach(self, context, page):
+        """开启追踪（每个浏览器上下文一次）并记录页面事件"""
+        if not self.enabled():
+            return
+        settings = self._settings()
+        if self._events.maxlen != int(settings['max_events']):
+            self._events = deque(self._events, maxlen=int(settings['max_events']))
+        if page not in self._pages:
+            self._pages.add(page)
+            page.on('request', lambda request: self.note('request', f"{request.method} {request.url}"))
+            page.on('response', lambda response: self.note('response', f"{response.status} {response.url}"))
+            page.on('requestfailed', self._on_request_failed)
+            page.on('console', self._on_console)
+            page.on('framenavigated', lambda frame: self.note('navigate', frame.url) if frame.parent_frame is None else None)
+        if context is self._context:
+            return
+        self._context = context
+        self._chunk_open = False
+        try:
+            # start 同时开始第一个片段，任务开始时丢弃
+            await context.tracing.start(snapshots=bool(settings['snapshots']),
+                                        screenshots=bool(settings['screenshots']), sources=False)
+            self._tracing = True
+            self._chunk_open = True
+        except Exception as e:
+            self._tracing = False
+            logger.warning(f"无法开启Playwright追踪，任务失败时只保存最近的页面事件: {e}")
+
+    def _on_request_failed(self, request):
+        # 资源拦截主动中止的请求不记录
+        if 'BLOCKED_BY_CLIENT' not in (request.failure or ''):
+            self.note('requestfailed', f"{request.url} {request.failure}")
+
+    def _on_console(self, message):
+        if message.type in ('error', 'warning'):
+            self.note('console', f"{message.type}: {message.text}")
+
+    def note(self, kind: str, detail: str):
+        self._events.append((time.time(), kind, str(detail)[:MAX_DETAIL]))
+
+    async def begin_task(self, title: str):
+        """开始录制一个任务"""
+        if not self._attached():
+            return
+        if not self.enabled():
+            await self._stop_chunk()
+            return
+        self.tasks += 1
+        self.note('task', title)
+        if not self._tracing:
+            return
+        start = time.perf_counter()
+        await self._stop_chunk()
+        try:
+            await self._context.tracing.start_chunk(title=title)
+            self._chunk_open = True
+        except Exception as e:
+            self._tracing = False
+            logger.warning(f"开始追踪片段失败，之后只保存最近的页面事件: {e}")
+        self.overhead_seconds += time.perf_counter() - start
+
+    async def _stop_chunk(self, path: Optional[str] = None):
+        """结束当前片段，path为None时丢弃"""
+        if not self._chunk_open:
+            return
+        self._chunk_open = False
+        try:
+            await self._context.tracing.stop_chunk(path=path)
+        except Exception as e:
+            logger.warning(f"结束追踪片段失败: {e}")
+
+    async def end_task(self, task: TaskRecord, success: bool, page=None):
+        """任务结束：成功时丢弃录制，失败时写出现场记录"""
+        if not self._attached() or not self.enabled():
+            return
+        if success:
+            start = time.perf_counter()
+            await self._stop_chunk()
+            self.overhead_seconds += time.perf_counter() - start
+            return
+        kind = task.last_failure.kind if task.last_failure else 'unknown'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.path.basename(task.folder_path)}_{task.image_index}_{kind}.zip"
+        path = self.dump_dir() / name
+        try:
+            await self._stop_chunk(str(path))
+            await self._write_extras(path, task, page)
+            self.dumps += 1
+            logger.warning(f"已保存失败现场: {path}（查看: playwright show-trace \"{path}\"）")
+        except Exception as e:
+            logger.error(f"保存失败现场失败: {e}")
+        self._prune()
+
+    async def _write_extras(self, path, task: TaskRecord, page):
+        """把滚动窗口中的事件、任务信息、页面HTML和截图追加到zip（没有追踪文件时新建）"""
+        html = screenshot = None
+        if page is not None and not page.is_closed():
+            try:
+                html = await page.content()
+                screenshot = await page.screenshot(timeout=5000)
+            except Exception as e:
+                logger.debug(f"获取失败时的页面内容失败: {e}")
+        info = {
+            'folder': task.folder_path,
+            'image_index': task.image_index,
+            'prompt': task.prompt,
+            'attempt': task.attempts,
+            'failure': task.last_failure.kind if task.last_failure else None,
+            'message': str(task.last_failure) if task.last_failure else None,
+            'video_options': task.video_options,
+        }
+        events = [{'time': time.strftime('%H:%M:%S', time.localtime(stamp)) + f'.{int(stamp % 1 * 1000):03d}',
+                   'kind': kind, 'detail': detail} for stamp, kind, detail in self._events]
+        with zipfile.ZipFile(path, 'a' if os.path.exists(path) else 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('flight_recorder/task.json', json.dumps(info, ensure_ascii=False, indent=2))
+            archive.writestr('flight_recorder/events.json', json.dumps(events, ensure_ascii=False, indent=1))
+            if html is not None:
+                archive.writestr('flight_recorder/page.html', html)
+            if screenshot is not None:
+                archive.writestr('flight_recorder/screenshot.png', screenshot)
+
+    def _prune(self):
+        """只保留最近 keep 个现场记录"""
+        files = sorted(self.dump_dir().glob('*.zip'), key=lambda item: item.stat().st_mtime)
+        for old in files[:max(len(files) - int(self._settings()['keep']), 0)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    def report(self):
+        if not self.tasks:
+            return
+        logger.info(
+            f"故障现场记录: {self.tasks} 个任务，保存 {self.dumps} 个失败现场，"
+            f"录制开销平均 {self.overhead_seconds / self.tasks * 1000:.0f} ms/任务"
+        )
+
+    def reset(self):
+        self.dumps = 0
+        self.tasks = 0
+        self.overhead_seconds = 0.0
+
+
+# 全局故障现场记录实例
+flight_recorder = FlightRecorder()
@@ -0,0 +1,139 @@
+"""
+任务目录监视器
+监视根目录下新增的文件夹、图片和任务清单变化，只报告发生变化的文件夹
+优先使用watchdog（Linux下基于inotify），未安装时退回轮询目录修改时间
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Set, Tuple
+from loguru import logger
+from src.file_manager import file_manager
+
+
+class FolderWatcher:
+    """
+    任务目录监视器
+    每个任务文件夹记录一个签名（文件夹修改时间 + 清单路径 + 清单修改时间），
+    签名变化即视为该文件夹有新增图片或清单内容变化；
+    事件模式下只对收到事件的文件夹计算签名，轮询模式下只做stat，不读取清单内容
+    """
+
+    def __init__(self, root_directory: str):
+        self.root_directory = os.path.abspath(root_directory)
+        self.signatures: Dict[str, Tuple] = {}
+        self._root_mtime = None
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._observer = None
+
+    @property
+    def uses_events(self) -> bool:
+        """是否使用文件系统事件（否则为轮询）"""
+        return self._observer is not None
+
+    def start(self):
+        """启动监视（watchdog不可用时使用轮询）"""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            logger.info("未安装watchdog，使用轮询方式监视任务目录")
+            return
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                watcher._on_event(event.src_path)
+                dest_path = getattr(event, 'dest_path', None)
+                if dest_path:
+                    watcher._on_event(dest_path)
+
+        try:
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), self.root_directory, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+            logger.info(f"已启用文件系统事件监视: {self.root_directory}")
+        except Exception as e:
+            logger.warning(f"启用文件系统事件监视失败，改用轮询: {e}")
+            self._observer = None
+
+    def stop(self):
+        """停止监视"""
+        if self._observer:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+
+    def _on_event(self, path: str):
+        """文件系统事件回调（在watchdog线程中执行），只记录事件所属的任务文件夹"""
+        relative = os.path.relpath(os.path.abspath(path), self.root_directory)
+        if relative.startswith('..') or relative == '.':
+            return
+        folder_name = relative.split(os.sep)[0]
+        with self._lock:
+            self._dirty.add(os.path.join(self.root_directory, folder_name))
+
+    def _compute_signature(self, folder_path: str) -> Optional[Tuple]:
+        """计算文件夹签名，不是任务文件夹时返回None"""
+        try:
+            if not os.path.isdir(folder_path):
+                return None
+            task_file_path = file_manager.find_task_file(folder_path)
+            if not task_file_path:
+                return None
+            return (
+                os.stat(folder_path).st_mtime_ns,
+                task_file_path,
+                os.stat(task_file_path).st_mtime_ns,
+            )
+        except OSError:
+            return None
+
+    def _candidate_folders(self) -> Set[str]:
+        """需要重新计算签名的文件夹"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        # 事件模式下首次扫描之后只处理收到事件的文件夹
+        if self.uses_events and self._root_mtime is not None:
+            return dirty
+
+        # 轮询模式：根目录修改时间变化才重新列目录，否则只检查已知文件夹
+        candidates = set(self.signatures) | dirty
+        try:
+            root_mtime = os.stat(self.root_directory).st_mtime_ns
+            if root_mtime != self._root_mtime:
+                self._root_mtime = root_mtime
+                for entry in os.scandir(self.root_directory):
+                    if entry.is_dir():
+                        candidates.add(os.path.join(self.root_directory, entry.name))
+        except OSError as e:
+            logger.warning(f"读取任务根目录失败: {e}")
+        return candidates
+
+    def poll_changes(self) -> Set[str]:
+        """返回自上次调用以来发生变化的任务文件夹"""
+        changed = set()
+        for folder_path in self._candidate_folders():
+            signature = self._compute_signature(folder_path)
+            if signature is None:
+                self.signatures.pop(folder_path, None)
+                continue
+            if self.signatures.get(folder_path) != signature:
+                self.signatures[folder_path] = signature
+                changed.add(folder_path)
+        return changed
+
+    def acknowledge(self, folder_path: str):
+        """
+        确认文件夹的当前状态（程序自己回写状态后调用），
+        避免把自己写入的状态当成用户修改再次触发读取
+        """
+        folder_path = os.path.join(self.root_directory, os.path.basename(folder_path))
+        signature = self._compute_signature(folder_path)
+        if signature is not None:
+            self.signatures[folder_path] = signature
+        with self._lock:
+            self._dirty.discard(folder_path)
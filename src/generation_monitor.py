@@ -0,0 +1,158 @@
+"""
+生成进度监视
+解析网站显示的排队位置和生成进度，根据观察到的排队消化速度估计剩余时间，
+并据此调整轮询间隔：排队靠后时少查，快完成时密集检查
+"""
+
+import re
+import time
+from typing import Dict, Optional, Tuple
+from src.config_manager import config_manager
+
+
+_POSITION_PATTERN = re.compile(r'(\d+)\s*(?:人|位|个)')
+_NUMBER_PATTERN = re.compile(r'\d+')
+_PERCENT_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+
+
+def parse_queue_status(status_text: str, progress_text: str = '') -> Tuple[Optional[int], Optional[float]]:
+    """
+    解析排队位置和进度百分比，无法识别时对应值为None
+    例如 "排队中，前面还有 12 人" -> (12, None)，"生成中 45%" -> (None, 45.0)
+    """
+    position = None
+    progress = None
+    text = f"{status_text or ''} {progress_text or ''}"
+
+    match = _PERCENT_PATTERN.search(text)
+    if match:
+        progress = min(float(match.group(1)), 100.0)
+    if '排队' in text or '前面' in text or '前方' in text:
+        match = _POSITION_PATTERN.search(text) or _NUMBER_PATTERN.search(status_text or '')
+        if match:
+            position = int(match.group(match.lastindex or 0))
+    return position, progress
+
+
+class GenerationMonitor:
+    """
+    生成进度监视器
+    - 排队消化速度（位/秒）和出队后的生成耗时在任务之间共享，用指数平均平滑
+    - next_interval 根据估计的剩余时间决定下一次检查的间隔
+    """
+
+    SMOOTHING = 0.3
+
+    def __init__(self):
+        self.drain_rate: Optional[float] = None         # 每秒前进的排队位置数
+        self.generation_seconds: Optional[float] = None  # 出队到生成完成的耗时
+        self._reset_task()
+
+    def _reset_task(self):
+        self.started_at: Optional[float] = None
+        self.queue_position: Optional[int] = None
+        self.progress: Optional[float] = None
+        self._last_position: Optional[Tuple[float, int]] = None
+        self._dequeued_at: Optional[float] = None
+        self.status_text = ''
+
+    @staticmethod
+    def _settings() -> dict:
+        settings = {'min_interval': 2.0, 'max_interval': 30.0}
+        settings.update(config_manager.get_user_config('generation_poll') or {})
+        return settings
+
+    def _smooth(self, old: Optional[float], new: float) -> float:
+        return new if old is None else old + self.SMOOTHING * (new - old)
+
+    def start_task(self):
+        """点击生成后调用，开始跟踪一个任务"""
+        self._reset_task()
+        self.started_at = time.monotonic()
+
+    def observe(self, status_text: str, progress_text: str = ''):
+        """记录一次检查到的排队状态"""
+        now = time.monotonic()
+        position, progress = parse_queue_status(status_text, progress_text)
+        self.status_text = (status_text or '').strip()
+        self.progress = progress
+
+        if position is not None:
+            if self._last_position is not None:
+                last_time, last_position = self._last_position
+                if position < last_position and now > last_time:
+                    self.drain_rate = self._smooth(self.drain_rate, (last_position - position) / (now - last_time))
+            if self._last_position is None or position != self._last_position[1]:
+                self._last_position = (now, position)
+            self.queue_position = position
+        elif self.queue_position is not None and self._dequeued_at is None:
+            # 不再显示排队位置，说明已经开始生成
+            self._dequeued_at = now
+            self.queue_position = 0
+
+    def finish_task(self, success: bool):
+        """任务结束：成功时更新出队后的生成耗时"""
+        if success and self.started_at is not None:
+            start = self._dequeued_at or self.started_at
+            self.generation_seconds = self._smooth(self.generation_seconds, time.monotonic() - start)
+        self._reset_task()
+
+    def estimate_remaining(self) -> Optional[float]:
+        """估计当前任务剩余的秒数，没有足够数据时返回None"""
+        if self.started_at is None:
+            return None
+        now = time.monotonic()
+        if self.queue_position:
+            if not self.drain_rate:
+                return None
+            queue_wait = self.queue_position / self.drain_rate
+            return queue_wait + (self.generation_seconds or 0.0)
+        elapsed = now - (self._dequeued_at or self.started_at)
+        if self.progress:
+            # 根据进度推算总耗时，有历史耗时时取两者平均
+            projected = elapsed / (self.progress / 100.0)
+            if self.generation_seconds is not None:
+                projected = (projected + self.generation_seconds) / 2
+            return max(projected - elapsed, 0.0)
+        if self.generation_seconds is None:
+            return None
+        return max(self.generation_seconds - elapsed, 0.0)
+
+    def next_interval(self, default_interval: float) -> float:
+        """下一次检查的等待秒数：取剩余时间的一半，限制在配置的上下限之间"""
+        settings = self._settings()
+        min_interval = float(settings['min_interval'])
+        max_interval = float(settings['max_interval'])
+        if self.progress is not None and self.progress >= 90:
+            return min_interval
+        remaining = self.estimate_remaining()
+        if remaining is None:
+            return default_interval
+        return min(max(remaining / 2, min_interval), max_interval)
+
+    def snapshot(self) -> Dict:
+        """当前任务的生成状态（供作业服务和日志使用）"""
+        remaining = self.estimate_remaining()
+        return {
+            'active': self.started_at is not None,
+            'queue_position': self.queue_position,
+            'progress': self.progress,
+            'status_text': self.status_text,
+            'estimated_remaining': round(remaining, 1) if remaining is not None else None,
+            'drain_rate': round(self.drain_rate, 4) if self.drain_rate else None,
+        }
+
+    def describe(self) -> str:
+        parts = []
+        if self.queue_position:
+            parts.append(f"排队第 {self.queue_position} 位")
+        if self.progress is not None:
+            parts.append(f"进度 {self.progress:.0f}%")
+        remaining = self.estimate_remaining()
+        if remaining is not None:
+            parts.append(f"预计还需 {remaining:.0f} 秒")
+        return "，".join(parts) or "视频生成中"
+
+
+# 全局生成进度监视器实例
+generation_monitor = GenerationMonitor()
@@ -0,0 +1,68 @@
+"""
+自适应生成超时
+按视频参数（质量/帧率/分辨率）分别记录最近的生成耗时（保存在 phase_durations.json，跨运行累积），
+每个任务的生成超时取同参数最近耗时的高百分位数乘以余量：
+速度更快/1080P 的任务卡住时能尽早放弃，质量更佳/4K/60帧 的任务也不会被过早判定超时；
+样本不足时使用 video_generation_timeout
+"""
+
+from typing import Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.phase_stats import phase_stats
+from src.run_history import percentile
+
+
+class GenerationTimeout:
+    """
+    自适应生成超时（秒）
+    - record 记录一次成功生成的耗时，note_timeout 把超时当作截尾样本（网站整体异常期间的超时不记录）
+    - timeout_for 计算任务的生成超时
+    """
+
+    @staticmethod
+    def _settings() -> dict:
+        settings = {'enabled': True, 'percentile': 95, 'multiplier': 1.5, 'window': 50, 'min_samples': 10,
+                    'min_timeout': 60, 'max_timeout': 900}
+        settings.update(config_manager.get_user_config('adaptive_timeout') or {})
+        return settings
+
+    @staticmethod
+    def key(video_options: Optional[dict]) -> str:
+        """参数组合的样本名，如 generation/质量更佳/帧率60/4K"""
+        options = video_options or config_manager.get_user_config('video_options') or {}
+        return '/'.join(('generation', options.get('quality', '质量更佳'), options.get('framerate', '帧率60'),
+                         options.get('resolution', '4K')))
+
+    @staticmethod
+    def default_timeout() -> float:
+        return config_manager.get_user_config('video_generation_timeout') / 1000
+
+    def timeout_for(self, video_options: Optional[dict]) -> float:
+        settings = self._settings()
+        if not settings['enabled']:
+            return self.default_timeout()
+        samples = phase_stats.samples(self.key(video_options))[-int(settings['window']):]
+        if len(samples) < int(settings['min_samples']):
+            return self.default_timeout()
+        timeout = percentile(samples, float(settings['percentile'])) * float(settings['multiplier'])
+        return min(max(timeout, float(settings['min_timeout'])), float(settings['max_timeout']))
+
+    def record(self, video_options: Optional[dict], seconds: float):
+        phase_stats.record(self.key(video_options), seconds)
+
+    def note_timeout(self, video_options: Optional[dict], seconds: float):
+        """
+        生成超时：真实耗时未知（至少为 seconds），作为截尾样本记录，避免只统计成功的任务使超时越来越短；
+        样本不超过最近样本中的最大值，超时只能把百分位数推到已观测到的最长耗时，不会逐次放大超时
+        """
+        settings = self._settings()
+        samples = phase_stats.samples(self.key(video_options))[-int(settings['window']):]
+        if not settings['enabled'] or seconds <= 0 or not samples:
+            return
+        self.record(video_options, min(seconds, max(samples)))
+        logger.info(f"{self.key(video_options)} 生成超时（{seconds:.0f} 秒），已记入自适应超时样本")
+
+
+# 全局自适应生成超时实例
+generation_timeout = GenerationTimeout()
@@ -0,0 +1,358 @@
+"""
+作业服务
+常驻进程保持浏览器连接，通过本地HTTP/JSON接口接收作业、查询状态和取消作业
+
+接口:
+    GET  /health              服务状态（含当前任务的排队位置、进度和预计剩余时间）
+    POST /jobs                提交作业 {"folders": [...]} 或 {"tasks": [{"image_path", "prompt", "output_dir"}]}
+                              可选字段: "priority"（数值越大越优先）、"video_options"
+    GET  /jobs                作业列表
+    GET  /jobs/<id>           作业详情（含每个任务的状态）
+    POST /jobs/<id>/cancel    取消作业（DELETE /jobs/<id> 同样有效），正在执行的任务会执行完
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.file_manager import file_manager
+from src.task_source import TaskRecord
+from src.generation_monitor import generation_monitor
+from src.download_client import download_client
+from src.download_scheduler import download_scheduler
+
+
+class JobError(Exception):
+    """作业提交参数错误（返回400）"""
+
+
+class Job:
+    """一次提交的作业"""
+
+    def __init__(self, job_id: str, tasks: List[TaskRecord], source: Dict):
+        self.job_id = job_id
+        self.source = source            # 提交内容摘要（文件夹列表或直接任务数）
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancelled = False
+        self.tasks = tasks
+        self.task_states = ['queued'] * len(tasks)
+
+    @property
+    def status(self) -> str:
+        if self.cancelled:
+            return 'cancelled'
+        if not self.tasks or all(state in ('completed', 'failed', 'skipped') for state in self.task_states):
+            return 'finished'
+        if any(state != 'queued' for state in self.task_states):
+            return 'running'
+        return 'queued'
+
+    def to_dict(self, include_tasks: bool = False) -> Dict:
+        counts = {}
+        for state in self.task_states:
+            counts[state] = counts.get(state, 0) + 1
+        data = {
+            'job_id': self.job_id,
+            'status': self.status,
+            'source': self.source,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'total': len(self.tasks),
+            'counts': counts,
+        }
+        if include_tasks:
+            data['tasks'] = [
+                {
+                    'folder_path': task.folder_path,
+                    'excel_row': task.excel_row,
+                    'image_path': task.image_path,
+                    'prompt': task.prompt,
+                    'status': state,
+                    'video_path': task.video_path,
+                    'attempts': task.attempts,
+                    'failure': task.last_failure.label if task.last_failure else None,
+                }
+                for task, state in zip(self.tasks, self.task_states)
+            ]
+        return data
+
+
+class JobService:
+    """作业服务：HTTP线程只登记作业，任务在事件循环中由工作循环逐个执行"""
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._scheduler = None
+        self._task_jobs: Dict[int, Job] = {}  # id(任务) -> 所属作业
+        self._task_index: Dict[int, int] = {}  # id(任务) -> 在所属作业中的序号
+        self._wakeup: Optional[asyncio.Event] = None
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self.browser_ready = False
+
+    # ---------- 作业管理（HTTP线程调用） ----------
+
+    def submit_job(self, payload: Dict) -> Job:
+        """校验并登记作业，任务交给事件循环入队"""
+        if not isinstance(payload, dict):
+            raise JobError("请求体必须是JSON对象")
+        job_id = uuid.uuid4().hex[:12]
+        priority = payload.get('priority', 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise JobError(f"priority 必须是整数: {priority!r}")
+        video_options = payload.get('video_options') or None
+
+        if payload.get('folders'):
+            tasks = self._tasks_from_folders(payload['folders'], job_id)
+            source = {'folders': list(payload['folders'])}
+        elif payload.get('tasks'):
+            tasks = self._tasks_from_items(payload['tasks'], job_id)
+            source = {'inline_tasks': len(payload['tasks'])}
+        else:
+            raise JobError("需要提供 folders 或 tasks")
+
+        for task in tasks:
+            task.priority = priority if 'priority' in payload else task.priority
+            task.video_options = video_options or task.video_options
+
+        job = Job(job_id, tasks, source)
+        with self._lock:
+            self._prune_jobs()
+            self.jobs[job_id] = job
+            for index, task in enumerate(tasks):
+                self._task_jobs[id(task)] = job
+                self._task_index[id(task)] = index
+        self._loop.call_soon_threadsafe(self._enqueue, tasks)
+        logger.info(f"收到作业 {job_id}: {len(tasks)} 个任务")
+        return job
+
+    def _prune_jobs(self):
+        """
+        清除已结束（完成或取消）的旧作业，避免常驻服务的作业表无限增长（持有锁时调用）
+        结束超过 job_retention 秒的作业，以及超出 max_finished_jobs 个的最早结束的作业
+        """
+        now = time.time()
+        finished = sorted((job for job in self.jobs.values() if job.finished_at is not None),
+                          key=lambda job: job.finished_at)
+        excess = len(finished) - int(config_manager.get_user_config('max_finished_jobs'))
+        for position, job in enumerate(finished):
+            if position >= excess and now - job.finished_at < float(config_manager.get_user_config('job_retention')):
+                continue
+            del self.jobs[job.job_id]
+            for task in job.tasks:
+                self._task_jobs.pop(id(task), None)
+                self._task_index.pop(id(task), None)
+
+    def _tasks_from_folders(self, folders: List[str], job_id: str) -> List[TaskRecord]:
+        tasks = []
+        for folder_path in folders:
+            if not os.path.isdir(folder_path):
+                raise JobError(f"文件夹不存在: {folder_path}")
+            if not file_manager.find_task_file(folder_path):
+                raise JobError(f"文件夹中没有任务清单: {folder_path}")
+            for task in file_manager.iter_pending_tasks(folder_path):
+                task.job_id = job_id
+                tasks.append(task)
+        return tasks
+
+    def _tasks_from_items(self, items: List[Dict], job_id: str) -> List[TaskRecord]:
+        tasks = []
+        for position, item in enumerate(items, start=1):
+            image_path = item.get('image_path') if isinstance(item, dict) else None
+            prompt = str(item.get('prompt') or '').strip() if isinstance(item, dict) else ''
+            if not image_path or not os.path.isfile(image_path):
+                raise JobError(f"第 {position} 个任务的图片不存在: {image_path}")
+            if not prompt:
+                raise JobError(f"第 {position} 个任务缺少提示词")
+            output_dir = item.get('output_dir') or os.path.dirname(os.path.abspath(image_path))
+            if not os.path.isdir(output_dir):
+                raise JobError(f"第 {position} 个任务的输出目录不存在: {output_dir}")
+            # 图片名符合"序号_描述"规则时沿用序号命名视频，否则使用提交顺序
+            try:
+                image_index = int(os.path.basename(image_path).split('_')[0])
+            except ValueError:
+                image_index = position
+            tasks.append(TaskRecord(output_dir, None, image_index, image_path, prompt, job_id=job_id))
+        return tasks
+
+    def cancel_job(self, job_id: str) -> Optional[Job]:
+        """取消作业：排队中的任务不再执行"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancelled = True
+            for i, state in enumerate(job.task_states):
+                if state in ('queued', 'retrying'):
+                    job.task_states[i] = 'cancelled'
+            if job.finished_at is None:
+                job.finished_at = time.time()
+        logger.info(f"作业已取消: {job_id}")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict(include_tasks=True) if job else None
+
+    def list_jobs(self) -> List[Dict]:
+        with self._lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def health(self) -> Dict:
+        with self._lock:
+            queued = sum(job.task_states.count('queued') for job in self.jobs.values())
+        return {
+            'status': 'ok',
+            'browser_ready': self.browser_ready,
+            'queued_tasks': queued,
+            'generation': generation_monitor.snapshot(),
+            'downloads': dict(download_client.stats(), **download_scheduler.stats()),
+        }
+
+    # ---------- 事件循环 ----------
+
+    def _enqueue(self, tasks: List[TaskRecord]):
+        for task in tasks:
+            self._scheduler.add_task(task)
+        self._wakeup.set()
+
+    def _set_task_state(self, task: TaskRecord, state: str):
+        with self._lock:
+            job = self._task_jobs.get(id(task))
+            if job is None:
+                return
+            job.task_states[self._task_index[id(task)]] = state
+            if job.status == 'finished' and job.finished_at is None:
+                job.finished_at = time.time()
+                logger.info(f"作业完成: {job.job_id}")
+
+    def _is_cancelled(self, task: TaskRecord) -> bool:
+        with self._lock:
+            job = self._task_jobs.get(id(task))
+            return job is None or job.cancelled
+
+    async def serve(self, host: str = None, port: int = None):
+        """启动服务：初始化浏览器（保持连接），开启HTTP接口，循环执行作业"""
+        from src.task_processor import task_processor
+        from src.retry_engine import retry_engine
+
+        host = host or config_manager.get_user_config('service_host')
+        port = port or config_manager.get_user_config('service_port')
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._scheduler = task_processor.create_scheduler()
+
+        await task_processor.initialize(require_root_directory=False)
+        self.browser_ready = True
+
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        logger.info(f"作业服务已启动: http://{host}:{port}")
+
+        try:
+            while not task_processor.stop_requested:
+                task = self._scheduler.next_task() or retry_engine.pop_ready()
+                if task is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self._is_cancelled(task):
+                    continue
+                self._set_task_state(task, 'running')
+                success = await task_processor.execute_task(task)
+                if success:
+                    self._set_task_state(task, 'completed')
+                elif retry_engine.is_deferred(task):
+                    self._set_task_state(task, 'retrying')
+                else:
+                    self._set_task_state(task, 'failed')
+        finally:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self.browser_ready = False
+            logger.info("作业服务已停止")
+
+
+def _make_handler(service: JobService):
+    """创建绑定到服务实例的HTTP请求处理类"""
+
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logger.debug(f"HTTP {self.address_string()} - {format % args}")
+
+        def _send_json(self, status: int, data):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _path_parts(self) -> List[str]:
+            return [part for part in self.path.split('?')[0].split('/') if part]
+
+        def do_GET(self):
+            parts = self._path_parts()
+            if parts == ['health']:
+                self._send_json(200, service.health())
+            elif parts == ['jobs']:
+                self._send_json(200, {'jobs': service.list_jobs()})
+            elif len(parts) == 2 and parts[0] == 'jobs':
+                job = service.get_job(parts[1])
+                if job is None:
+                    self._send_json(404, {'error': '作业不存在'})
+                else:
+                    self._send_json(200, job)
+            else:
+                self._send_json(404, {'error': '接口不存在'})
+
+        def do_POST(self):
+            parts = self._path_parts()
+            if parts == ['jobs']:
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                    job = service.submit_job(payload)
+                    self._send_json(201, job.to_dict())
+                except (JobError, ValueError) as e:
+                    self._send_json(400, {'error': str(e)})
+                except Exception as e:
+                    logger.error(f"提交作业失败: {e}")
+                    self._send_json(500, {'error': str(e)})
+            elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+                self._cancel(parts[1])
+            else:
+                self._send_json(404, {'error': '接口不存在'})
+
+        def do_DELETE(self):
+            parts = self._path_parts()
+            if len(parts) == 2 and parts[0] == 'jobs':
+                self._cancel(parts[1])
+            else:
+                self._send_json(404, {'error': '接口不存在'})
+
+        def _cancel(self, job_id: str):
+            job = service.cancel_job(job_id)
+            if job is None:
+                self._send_json(404, {'error': '作业不存在'})
+            else:
+                self._send_json(200, job.to_dict())
+
+    return JobRequestHandler
+
+
+# 全局作业服务实例
+job_service = JobService()
@@ -0,0 +1,182 @@
+"""
+MP4元数据解析（纯Python，无需ffprobe）
+只读取文件的box头和moov box，从中取得时长、分辨率、帧率、编码和码率；
+moov在文件末尾时跳过mdat，不读取视频数据本身
+"""
+
+import os
+import struct
+from typing import Dict, Iterator, Optional, Tuple
+
+# moov中需要继续向下解析的容器box
+_CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'mvex'}
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+
+
+class Mp4ParseError(ValueError):
+    """文件不是有效的MP4或缺少moov"""
+
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int, int]]:
+    """遍历内存中的box，返回 (类型, 内容起点, 内容终点)"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                break
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise Mp4ParseError(f"box {box_type!r} 大小异常")
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _read_moov(f, file_size: int) -> bytes:
+    """在文件顶层查找moov并读出内容"""
+    offset = 0
+    first = True
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        header = f.read(16)
+        if len(header) < 8:
+            break
+        size, box_type = struct.unpack_from('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', header, 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - offset
+        if first and box_type != b'ftyp':
+            raise Mp4ParseError("文件开头不是ftyp")
+        first = False
+        if size < header_size:
+            raise Mp4ParseError(f"box {box_type!r} 大小异常")
+        if box_type == b'moov':
+            if size > MAX_MOOV_SIZE:
+                raise Mp4ParseError("moov过大")
+            f.seek(offset + header_size)
+            body = f.read(size - header_size)
+            if len(body) < size - header_size:
+                raise Mp4ParseError("moov不完整（文件被截断）")
+            return body
+        offset += size
+    raise Mp4ParseError("未找到moov")
+
+
+def _full_box_times(data: bytes, start: int) -> Tuple[int, int]:
+    """mvhd/mdhd：返回 (timescale, duration)"""
+    version = data[start]
+    if version == 1:
+        return struct.unpack_from('>IQ', data, start + 20)
+    return struct.unpack_from('>II', data, start + 12)
+
+
+def _parse_track(data: bytes, start: int, end: int) -> Dict:
+    track = {}
+    stack = [(start, end)]
+    while stack:
+        box_start, box_end = stack.pop()
+        for box_type, body, body_end in _iter_boxes(data, box_start, box_end):
+            if box_type in _CONTAINERS:
+                stack.append((body, body_end))
+            elif box_type == b'tkhd':
+                offset = body + (88 if data[body] == 1 else 76)
+                width, height = struct.unpack_from('>II', data, offset)
+                track['tkhd_size'] = (width >> 16, height >> 16)
+            elif box_type == b'mdhd':
+                track['timescale'], track['duration'] = _full_box_times(data, body)
+            elif box_type == b'hdlr':
+                track['handler'] = data[body + 8:body + 12]
+            elif box_type == b'stsd':
+                entries = struct.unpack_from('>I', data, body + 4)[0]
+                if entries:
+                    entry_type = data[body + 12:body + 16]
+                    track['codec'] = entry_type.decode('latin-1').strip()
+                    if track.get('handler') == b'vide':
+                        track['stsd_size'] = struct.unpack_from('>HH', data, body + 8 + 8 + 24)
+            elif box_type == b'stts':
+                count = struct.unpack_from('>I', data, body + 4)[0]
+                # 每项为 (样本数, 时长)，只累加样本数
+                track['samples'] = sum(struct.unpack_from(f'>{count * 2}I', data, body + 8)[::2])
+            elif box_type == b'stsz':
+                sample_size, count = struct.unpack_from('>II', data, body + 4)
+                if sample_size:
+                    track['bytes'] = sample_size * count
+                else:
+                    track['bytes'] = sum(struct.unpack_from(f'>{count}I', data, body + 12))
+    return track
+
+
+def parse_mp4(path: str) -> Dict:
+    """
+    解析MP4元数据
+    返回: {duration 秒, width, height, fps, codec, bitrate_kbps, has_audio, size}
+    无法解析时抛出 Mp4ParseError
+    """
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        moov = _read_moov(f, file_size)
+
+    movie_duration = None
+    video = None
+    has_audio = False
+    for box_type, body, body_end in _iter_boxes(moov):
+        if box_type == b'mvhd':
+            timescale, duration = _full_box_times(moov, body)
+            movie_duration = duration / timescale if timescale else None
+        elif box_type == b'trak':
+            track = _parse_track(moov, body, body_end)
+            if track.get('handler') == b'vide' and video is None:
+                video = track
+            elif track.get('handler') == b'soun':
+                has_audio = True
+    if video is None:
+        raise Mp4ParseError("没有视频轨道")
+
+    duration = video['duration'] / video['timescale'] if video.get('timescale') and video.get('duration') else None
+    duration = duration or movie_duration
+    width, height = video.get('stsd_size') or video.get('tkhd_size') or (None, None)
+    fps = None
+    if video.get('samples') and duration:
+        fps = round(video['samples'] / duration, 2)
+    stream_bytes = video.get('bytes') or file_size
+    return {
+        'duration': round(duration, 3) if duration else None,
+        'width': width or None,
+        'height': height or None,
+        'fps': fps,
+        'codec': video.get('codec'),
+        'bitrate_kbps': round(stream_bytes * 8 / duration / 1000) if duration else None,
+        'has_audio': has_audio,
+        'size': file_size,
+    }
+
+
+def check_delivery(metadata: Dict, video_options: Optional[Dict]) -> list:
+    """
+    对比实际视频与请求的视频参数，返回不符项列表（空列表表示符合）
+    分辨率按短边比较（竖屏视频同样适用）；质量档位无法从文件判断，不检查
+    """
+    video_options = video_options or {}
+    mismatches = []
+    resolution = str(video_options.get('resolution', '')).lower()
+    width, height = metadata.get('width'), metadata.get('height')
+    if resolution and width and height:
+        short_side = min(width, height)
+        expected = 2160 if resolution == '4k' else 1080 if resolution == '1080p' else None
+        if expected and short_side < expected * 0.95:
+            mismatches.append(f"分辨率 {width}x{height}，请求 {video_options['resolution']}")
+    framerate = video_options.get('framerate')
+    fps = metadata.get('fps')
+    if framerate and fps:
+        expected = 60 if framerate == '帧率60' else 30 if framerate == '帧率30' else None
+        if expected and abs(fps - expected) > expected * 0.1:
+            mismatches.append(f"帧率 {fps:g}，请求 {framerate}")
+    return mismatches
@@ -0,0 +1,185 @@
+"""
+页面状态探针
+向页面注入一个探测函数，一次evaluate返回控制器需要的全部页面状态
+（提示词输入框、上传预览、参数弹窗和选中项、生成卡片状态、视频链接及可见性、限流提示），
+代替每一步多次 query_selector / inner_html / get_attribute / is_visible 的往返
+"""
+
+from typing import Dict, List, Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.selector_resolver import selector_resolver, is_dom_selector, is_xpath
+
+
+# 注入脚本：参数为探针配置，在页面上定义 window.__rpaProbe()
+_INSTALL_SCRIPT = """
+(cfg) => {
+    const find = (sel, root) => {
+        if (!sel) return null;
+        if (Array.isArray(sel)) {
+            // 备选选择器：返回第一个找到的元素
+            for (const one of sel) {
+                const el = find(one, root);
+                if (el) return el;
+            }
+            return null;
+        }
+        if (sel.startsWith('/') || sel.startsWith('(')) {
+            return document.evaluate(sel, root || document, null,
+                XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        }
+        return (root || document).querySelector(sel);
+    };
+    const visible = (el) => !!el && !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    const matchAny = (text, words) => words.find((w) => text.includes(w)) || null;
+    const srcOf = (el) => (el && el.getAttribute('src')) || null;
+
+    window.__rpaProbe = () => {
+        const state = {url: location.href, elements: {}, card: null, rate_limit: null};
+        for (const [name, sel] of Object.entries(cfg.queries)) {
+            const el = find(sel);
+            state.elements[name] = el ? {
+                visible: visible(el),
+                selected: /(^|\\s)selected(\\s|$)/.test(el.getAttribute('class') || '')
+            } : null;
+        }
+        const card = find(cfg.card);
+        if (card) {
+            const html = card.innerHTML;
+            const queue = cfg.queue.container ? card.querySelector(cfg.queue.container) : null;
+            const queueText = queue && cfg.queue.status_text ? queue.querySelector(cfg.queue.status_text) : null;
+            const progress = queue && cfg.queue.progress ? queue.querySelector(cfg.queue.progress) : null;
+            // 与原逻辑相同的取链接顺序：source -> video.video-container -> 任意video
+            const source = card.querySelector('source[type="video/mp4"]');
+            const anyVideo = card.querySelector('video');
+            const containerVideo = card.querySelector('video.video-container');
+            let videoSrc = srcOf(source);
+            let videoEl = anyVideo;
+            if (!videoSrc && srcOf(containerVideo)) {
+                videoSrc = srcOf(containerVideo);
+                videoEl = containerVideo;
+            } else if (!videoSrc) {
+                videoSrc = srcOf(anyVideo);
+            }
+            state.card = {
+                generating: !!matchAny(html, cfg.generating),
+                finished: !!matchAny(html, cfg.finished),
+                video_src: videoSrc,
+                video_visible: visible(videoEl),
+                queue_text: queue ? (queueText || queue).innerText : '',
+                progress_text: progress ? progress.innerText : '',
+            };
+            state.rate_limit = matchAny(html, cfg.rate_limit);
+        }
+        if (!state.rate_limit && cfg.toast) {
+            for (const toast of document.querySelectorAll(cfg.toast)) {
+                state.rate_limit = matchAny(toast.innerText || '', cfg.rate_limit);
+                if (state.rate_limit) break;
+            }
+        }
+        return state;
+    };
+    return window.__rpaProbe();
+}
+"""
+
+_SNAPSHOT_SCRIPT = "() => window.__rpaProbe ? window.__rpaProbe() : null"
+
+# 生成卡片的状态标记（与原来按 inner_html 判断的文字一致）
+GENERATING_MARKERS = ['视频生成中', 'processing', 'loadding']
+FINISHED_MARKERS = ['video-container loaded', 'finished']
+
+
+def in_popup(selector: str) -> str:
+    """把选项选择器限定在基础参数弹窗内（任意深度）；XPath直接拼接，其它写成Playwright的链式选择器"""
+    popup = selector_resolver.primary('basic_params_popup')
+    if is_xpath(popup) and is_xpath(selector):
+        return f"{popup}//{selector.lstrip('/')}"
+    return f"{popup} >> {selector}"
+
+
+def _dom_candidates(key: str, transform=None) -> List[str]:
+    """探针在页面内可执行的备选选择器（text= / role= 等只由Playwright使用）"""
+    candidates = [transform(selector) if transform else selector for selector in selector_resolver.candidates(key)]
+    return [selector for selector in candidates if is_dom_selector(selector)]
+
+
+def build_probe_config() -> Dict:
+    """根据 web_elements.yaml 生成探针配置"""
+    get = config_manager.get_web_element
+    queries = {
+        name: _dom_candidates(name) for name in ('prompt_textarea', 'preview_box', 'file_input', 'basic_params_popup')
+    }
+    for group in ('quality_options', 'fps_options', 'resolution_options'):
+        for name in (get(f'elements.{group}') or {}):
+            queries[f'{group}.{name}'] = _dom_candidates(f'{group}.{name}', in_popup)
+    queue = get('elements.generating_status') or {}
+    return {
+        'queries': {name: sel for name, sel in queries.items() if sel},
+        'card': _dom_candidates('generation_card'),
+        'queue': {
+            'container': queue.get('container'),
+            'status_text': queue.get('status_text'),
+            'progress': queue.get('progress'),
+        },
+        'generating': GENERATING_MARKERS,
+        'finished': FINISHED_MARKERS,
+        'rate_limit': config_manager.get_status_text('rate_limit_indicators') or [],
+        'toast': get('elements.toast_message'),
+    }
+
+
+class PageProbe:
+    """
+    页面状态探针
+    探测函数在页面导航后会丢失，snapshot 发现未注入时自动重新注入（多一次往返）
+    """
+
+    def __init__(self):
+        self._config: Optional[Dict] = None
+        self.round_trips = 0        # 探针发起的evaluate次数（用于基准测试和统计）
+
+    def invalidate(self):
+        """网页元素配置变化后调用，下次快照重新生成探针配置并注入"""
+        self._config = None
+
+    async def install(self, page) -> Dict:
+        """注入探测函数并返回第一份快照"""
+        if self._config is None:
+            self._config = build_probe_config()
+        self.round_trips += 1
+        return await page.evaluate(_INSTALL_SCRIPT, self._config)
+
+    async def snapshot(self, page) -> Dict:
+        """一次往返获取页面状态快照"""
+        if self._config is None:
+            return await self.install(page)
+        self.round_trips += 1
+        state = await page.evaluate(_SNAPSHOT_SCRIPT)
+        if state is None:
+            logger.debug("页面探针未注入或页面已刷新，重新注入")
+            state = await self.install(page)
+        return state
+
+    async def wait_for(self, page, condition: str, timeout: float):
+        """
+        在页面内轮询探针直到条件成立（确保已注入后，整个等待只有一次往返）
+        condition: 以快照变量 s 书写的JS表达式，如 "s.elements.preview_box"
+        timeout: 毫秒
+        """
+        await self.snapshot(page)
+        self.round_trips += 1
+        await page.wait_for_function(
+            f"() => {{ const s = window.__rpaProbe && window.__rpaProbe(); return !!(s && ({condition})); }}",
+            timeout=timeout,
+            polling=200
+        )
+
+    @staticmethod
+    def element(state: Dict, name: str) -> Optional[Dict]:
+        """快照中某个元素的状态（不存在时为None）"""
+        return state.get('elements', {}).get(name)
+
+
+# 全局页面探针实例
+page_probe = PageProbe()
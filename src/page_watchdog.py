@@ -0,0 +1,144 @@
+"""
+页面内存监控
+同一个标签页连续运行数小时后，创作历史中的视频卡片越来越多，JS堆和DOM节点数持续增长，页面查询也越来越慢；
+任务之间通过CDP的 Performance.getMetrics 采样 JSHeapUsedSize、Nodes，并计时一次页面探针快照，
+超过阈值时回收页面（打开新页面、导航、初始设置，完成后关闭旧页面），运行结束时报告各项指标的变化
+"""
+
+import time
+import weakref
+from typing import Dict, List
+from loguru import logger
+from src.config_manager import config_manager
+from src.page_probe import page_probe
+
+MB = 1024 * 1024
+
+
+class PageWatchdog:
+    """
+    页面内存监控
+    - check 在每个任务开始前调用，每 sample_every 个任务采样一次
+    - 回收后至少间隔 min_tasks_between_recycles 个任务才会再次回收（避免网站本身占用高时反复回收）
+    """
+
+    def __init__(self):
+        self._sessions = weakref.WeakKeyDictionary()    # 页面 -> CDP会话
+        self.samples: List[Dict] = []
+        self.recycles = 0
+        self._tasks = 0
+        self._tasks_since_recycle = 0
+        self._generation = 0            # 第几个页面（每次回收加1）
+
+    @staticmethod
+    def _settings() -> dict:
+        settings = {'enabled': True, 'sample_every': 5, 'max_heap_mb': 400, 'max_nodes': 100000, 'max_probe_ms': 800,
+                    'min_tasks_between_recycles': 10}
+        settings.update(config_manager.get_user_config('page_watchdog') or {})
+        return settings
+
+    async def sample(self, context, page) -> Dict:
+        """采样一次：JS堆、DOM节点数、页面探针快照耗时"""
+        session = self._sessions.get(page)
+        if session is None:
+            session = await context.new_cdp_session(page)
+            await session.send('Performance.enable')
+            self._sessions[page] = session
+        result = await session.send('Performance.getMetrics')
+        metrics = {item['name']: item['value'] for item in result['metrics']}
+        start = time.perf_counter()
+        await page_probe.snapshot(page)
+        sample = {
+            'page': self._generation,
+            'task': self._tasks,
+            'heap_mb': metrics.get('JSHeapUsedSize', 0) / MB,
+            'nodes': int(metrics.get('Nodes', 0)),
+            'probe_ms': (time.perf_counter() - start) * 1000,
+        }
+        self.samples.append(sample)
+        return sample
+
+    def over_thresholds(self, sample: Dict) -> List[str]:
+        settings = self._settings()
+        reasons = []
+        if sample['heap_mb'] > float(settings['max_heap_mb']):
+            reasons.append(f"JS堆 {sample['heap_mb']:.0f} MB > {settings['max_heap_mb']} MB")
+        if sample['nodes'] > int(settings['max_nodes']):
+            reasons.append(f"DOM节点 {sample['nodes']} > {settings['max_nodes']}")
+        if sample['probe_ms'] > float(settings['max_probe_ms']):
+            reasons.append(f"页面查询 {sample['probe_ms']:.0f} ms > {settings['max_probe_ms']} ms")
+        return reasons
+
+    async def check(self, controller) -> bool:
+        """任务之间调用：按间隔采样，超过阈值时回收页面，返回是否回收"""
+        settings = self._settings()
+        if not settings['enabled'] or controller.page is None or controller.context is None:
+            return False
+        self._tasks += 1
+        self._tasks_since_recycle += 1
+        if (self._tasks - 1) % max(int(settings['sample_every']), 1):
+            return False
+        try:
+            sample = await self.sample(controller.context, controller.page)
+        except Exception as e:
+            logger.warning(f"页面内存采样失败: {e}")
+            return False
+        logger.debug(f"页面内存: JS堆 {sample['heap_mb']:.0f} MB，DOM节点 {sample['nodes']}，"
+                     f"页面查询 {sample['probe_ms']:.0f} ms")
+        reasons = self.over_thresholds(sample)
+        if not reasons or self._tasks_since_recycle <= int(settings['min_tasks_between_recycles']):
+            return False
+        logger.warning(f"页面资源占用过高（{'；'.join(reasons)}），回收页面")
+        if not await controller.recycle_page():
+            return False
+        self.recycles += 1
+        self._generation += 1
+        self._tasks_since_recycle = 0
+        return True
+
+    def trends(self) -> List[Dict]:
+        """每个页面（两次回收之间）的首末采样"""
+        pages: Dict[int, List[Dict]] = {}
+        for sample in self.samples:
+            pages.setdefault(sample['page'], []).append(sample)
+        result = []
+        for generation, samples in sorted(pages.items()):
+            first, last = samples[0], samples[-1]
+            tasks = last['task'] - first['task']
+            result.append({
+                'page': generation,
+                'tasks': tasks,
+                'first': first,
+                'last': last,
+                'peak_heap_mb': max(sample['heap_mb'] for sample in samples),
+                'heap_mb_per_task': (last['heap_mb'] - first['heap_mb']) / tasks if tasks else None,
+                'probe_ms_per_task': (last['probe_ms'] - first['probe_ms']) / tasks if tasks else None,
+            })
+        return result
+
+    def report(self):
+        if not self.samples:
+            return
+        logger.info(f"页面内存: 采样 {len(self.samples)} 次，回收页面 {self.recycles} 次")
+        for trend in self.trends():
+            first, last = trend['first'], trend['last']
+            growth = ''
+            if trend['tasks']:
+                growth = (f"，每任务 JS堆 {trend['heap_mb_per_task']:+.1f} MB、"
+                          f"页面查询 {trend['probe_ms_per_task']:+.1f} ms")
+            logger.info(
+                f"  页面 {trend['page'] + 1}（任务 {first['task']}~{last['task']}）: "
+                f"JS堆 {first['heap_mb']:.0f}→{last['heap_mb']:.0f} MB（峰值 {trend['peak_heap_mb']:.0f}），"
+                f"DOM节点 {first['nodes']}→{last['nodes']}，页面查询 {first['probe_ms']:.0f}→{last['probe_ms']:.0f} ms{growth}"
+            )
+
+    def reset(self):
+        self.samples.clear()
+        self.recycles = 0
+        self._tasks = 0
+        self._tasks_since_recycle = 0
+        self._generation = 0
+
+
+# 全局页面内存监控实例
+page_watchdog = PageWatchdog()
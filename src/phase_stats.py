@@ -0,0 +1,100 @@
+"""
+任务阶段耗时记录
+记录每个任务各阶段（上传、设置参数、输入提示词、提交、等待生成）的实际耗时，以及视频大小和下载速度，
+保存在数据目录的 phase_durations.json，供模拟器（src/simulator.py）按真实分布抽样；
+阶段耗时不含智能延时，模拟时按当前的 smart_delay 配置另行计算
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from loguru import logger
+from src.config_manager import config_manager
+
+STATS_FILENAME = 'phase_durations.json'
+
+
+class PhaseStats:
+    """
+    阶段耗时样本
+    - 每项最多保留最近 MAX_SAMPLES 个样本（跨运行累积）
+    - measure 期间发生的智能延时通过 note_delay 扣除
+    """
+
+    MAX_SAMPLES = 500
+
+    def __init__(self):
+        self._samples: Dict[str, List[float]] = {}
+        self._loaded = False
+        self._dirty = False
+        self._delay = 0.0
+        self._current: Optional[Dict[str, float]] = None
+
+    @staticmethod
+    def stats_path():
+        return config_manager.get_data_dir() / STATS_FILENAME
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.stats_path(), 'r', encoding='utf-8') as f:
+                for name, values in json.load(f).items():
+                    self._samples[name] = values + self._samples.get(name, [])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"读取阶段耗时记录失败: {e}")
+
+    def record(self, name: str, value: float):
+        self._load()
+        values = self._samples.setdefault(name, [])
+        values.append(round(value, 3))
+        if len(values) > self.MAX_SAMPLES:
+            del values[:len(values) - self.MAX_SAMPLES]
+        self._dirty = True
+
+    def note_delay(self, seconds: float):
+        """智能延时不计入阶段耗时"""
+        self._delay += seconds
+
+    @contextmanager
+    def measure(self, phase: str, *also: str):
+        """记录一个阶段的耗时（阶段失败时不记录），also 为同时记录的其它样本名"""
+        start = time.monotonic()
+        delay_before = self._delay
+        yield
+        elapsed = max(time.monotonic() - start - (self._delay - delay_before), 0.0)
+        for name in (phase,) + also:
+            self.record(name, elapsed)
+        if self._current is not None:
+            self._current[phase] = round(elapsed, 3)
+
+    def begin_task(self):
+        """开始收集一个任务的各阶段耗时"""
+        self._current = {}
+
+    def end_task(self) -> Dict[str, float]:
+        """结束收集，返回本任务的 {阶段: 秒}"""
+        current, self._current = self._current, None
+        return current or {}
+
+    def samples(self, name: str) -> List[float]:
+        self._load()
+        return list(self._samples.get(name, []))
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            with open(self.stats_path(), 'w', encoding='utf-8') as f:
+                json.dump(self._samples, f)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"保存阶段耗时记录失败: {e}")
+
+
+# 全局阶段耗时记录实例
+phase_stats = PhaseStats()
@@ -0,0 +1,125 @@
+"""
+页面资源拦截
+按 config/resource_policy.yaml（与 web_elements.yaml 放在一起）在受控页面上用 page.route 拦截第三方资源：
+放行主机的请求由Playwright按正则直接放行（不经过Python），其它请求按主机和资源类型判断是否拦截，
+运行结束时报告拦截的请求数和估计节省的流量；配置 resource_blocking: false 可关闭拦截
+"""
+
+import re
+import weakref
+from typing import Dict, List, Optional, Pattern
+from urllib.parse import urlsplit
+from loguru import logger
+from src.config_manager import config_manager, file_signature
+
+POLICY_FILENAME = 'resource_policy.yaml'
+KB = 1024
+
+
+def host_pattern(pattern: str) -> str:
+    """主机规则转为正则：匹配该主机及其子域名，* 匹配主机名中的任意字符"""
+    return r'(?:[^/?#@]*\.)?' + re.escape(pattern.strip().lower()).replace(r'\*', r'[^/?#@]*')
+
+
+def host_matches(host: str, patterns: List[str]) -> bool:
+    return any(re.fullmatch(host_pattern(pattern), host) for pattern in patterns)
+
+
+class ResourcePolicy:
+    """
+    资源拦截策略
+    - attach 在页面导航前调用（每个页面一次）
+    - decide 返回拦截原因，放行时返回None
+    """
+
+    def __init__(self):
+        self._policy: Optional[Dict] = None
+        self._signature = None
+        self._pages = weakref.WeakSet()
+        self.blocked = 0
+        self.passed = 0                     # 经过判断后放行的第三方请求
+        self.estimated_bytes = 0
+        self.blocked_by: Dict[str, int] = {}
+
+    @staticmethod
+    def policy_path():
+        return config_manager.project_root / "config" / POLICY_FILENAME
+
+    @property
+    def policy(self) -> Dict:
+        """拦截规则（文件修改后下次使用时重新读取）"""
+        signature = file_signature(self.policy_path())
+        if self._policy is None or signature != self._signature:
+            self._signature = signature
+            self._policy = {}
+            try:
+                import yaml
+                with open(self.policy_path(), 'r', encoding='utf-8') as f:
+                    self._policy = yaml.safe_load(f) or {}
+            except FileNotFoundError:
+                logger.warning(f"未找到资源拦截策略 {self.policy_path()}，不拦截页面资源")
+            except Exception as e:
+                logger.error(f"资源拦截策略加载失败，不拦截页面资源: {e}")
+        return self._policy
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(config_manager.get_user_config('resource_blocking'))
+
+    def route_pattern(self) -> Pattern:
+        """需要判断的请求：http(s)且主机不在放行列表中（在Playwright中匹配，放行的请求不会发到Python）"""
+        allowed = '|'.join(host_pattern(host) for host in self.policy.get('allow_hosts') or [])
+        if not allowed:
+            return re.compile(r'^https?://')
+        return re.compile(rf'^https?://(?!(?:{allowed})(?::\d+)?(?:[/?#]|$))', re.IGNORECASE)
+
+    def decide(self, url: str, resource_type: str) -> Optional[str]:
+        """返回拦截原因（主机或资源类型），放行时返回None"""
+        policy = self.policy
+        host = (urlsplit(url).hostname or '').lower()
+        if host_matches(host, policy.get('allow_hosts') or []):
+            return None
+        if host_matches(host, policy.get('block_hosts') or []):
+            return host
+        if resource_type in (policy.get('block_resource_types') or []):
+            return resource_type
+        return None
+
+    async def attach(self, page):
+        """在页面上注册拦截（同一页面只注册一次）"""
+        if page is None or page in self._pages or not self.enabled() or not self.policy:
+            return
+        await page.route(self.route_pattern(), self._handle)
+        self._pages.add(page)
+
+    async def _handle(self, route):
+        request = route.request
+        reason = self.decide(request.url, request.resource_type) if self.enabled() else None
+        if reason is None:
+            self.passed += 1
+            await route.continue_()
+            return
+        self.blocked += 1
+        self.blocked_by[reason] = self.blocked_by.get(reason, 0) + 1
+        sizes = self.policy.get('estimated_sizes_kb') or {}
+        self.estimated_bytes += int(sizes.get(request.resource_type, sizes.get('default', 0)) * KB)
+        await route.abort('blockedbyclient')
+
+    def report(self):
+        if not self.blocked and not self.passed:
+            return
+        top = sorted(self.blocked_by.items(), key=lambda item: -item[1])[:5]
+        logger.info(
+            f"资源拦截: 拦截 {self.blocked} 个请求，估计节省 {self.estimated_bytes / 1024 / 1024:.1f} MB，"
+            f"放行第三方请求 {self.passed} 个" + (f"（{'，'.join(f'{name} {count}' for name, count in top)}）" if top else '')
+        )
+
+    def reset(self):
+        self.blocked = 0
+        self.passed = 0
+        self.estimated_bytes = 0
+        self.blocked_by.clear()
+
+
+# 全局资源拦截实例
+resource_policy = ResourcePolicy()
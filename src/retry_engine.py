@@ -0,0 +1,213 @@
+"""
+重试引擎
+对任务失败进行分类（临时/永久），临时失败按指数退避加随机抖动重试，
+失败的任务放到批次末尾重新执行，不阻塞后面的任务
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from typing import Dict, List
+from loguru import logger
+from src.config_manager import config_manager
+
+
+class FailureKind:
+    """失败类型"""
+    SELECTOR_NOT_FOUND = 'selector_not_found'   # 页面元素未找到/等待超时
+    UPLOAD_FAILED = 'upload_failed'             # 图片上传验证失败
+    GENERATION_TIMEOUT = 'generation_timeout'   # 视频生成超时
+    CARD_VANISHED = 'card_vanished'             # 生成卡片消失
+    RATE_LIMITED = 'rate_limited'               # 网站提示操作频繁/排队已满
+    HTTP_ERROR = 'http_error'                   # 下载请求失败（网络错误或HTTP状态码异常）
+    INVALID_MP4 = 'invalid_mp4'                 # 下载的文件不是有效的MP4
+    IMAGE_MISSING = 'image_missing'             # 图片文件不存在
+    DEADLINE_EXCEEDED = 'deadline_exceeded'     # 页面操作超出阶段或任务的时间预算
+    UNKNOWN = 'unknown'
+
+    # 失败类型说明（用于最终报告）
+    LABELS = {
+        SELECTOR_NOT_FOUND: '页面元素未找到',
+        UPLOAD_FAILED: '图片上传失败',
+        GENERATION_TIMEOUT: '视频生成超时',
+        CARD_VANISHED: '生成卡片消失',
+        RATE_LIMITED: '网站限流',
+        HTTP_ERROR: '下载请求失败',
+        INVALID_MP4: '视频文件无效',
+        IMAGE_MISSING: '图片文件不存在',
+        DEADLINE_EXCEEDED: '超出时间预算',
+        UNKNOWN: '未知错误',
+    }
+
+
+# 永久失败：重试也不会成功，直接判定失败
+PERMANENT_KINDS = {FailureKind.IMAGE_MISSING}
+
+# 每类失败的默认重试次数（不含第一次执行）
+DEFAULT_RETRY_BUDGETS = {
+    FailureKind.SELECTOR_NOT_FOUND: 2,
+    FailureKind.UPLOAD_FAILED: 2,
+    FailureKind.GENERATION_TIMEOUT: 1,
+    FailureKind.CARD_VANISHED: 2,
+    FailureKind.RATE_LIMITED: 2,
+    FailureKind.HTTP_ERROR: 3,
+    FailureKind.INVALID_MP4: 2,
+    FailureKind.DEADLINE_EXCEEDED: 1,
+    FailureKind.UNKNOWN: 1,
+}
+
+
+class TaskFailure(Exception):
+    """带失败类型的任务异常"""
+
+    def __init__(self, kind: str, message: str, permanent: bool = None):
+        super().__init__(message)
+        self.kind = kind
+        self.permanent = kind in PERMANENT_KINDS if permanent is None else permanent
+        self.outage = False     # 由熔断器标记：发生在网站整体异常期间
+
+    @property
+    def label(self) -> str:
+        return FailureKind.LABELS.get(self.kind, self.kind)
+
+
+def classify_exception(error: BaseException) -> TaskFailure:
+    """把任意异常归类为 TaskFailure"""
+    if isinstance(error, TaskFailure):
+        return error
+    # Playwright的等待超时基本都是元素未出现或不可点击
+    if type(error).__name__ == 'TimeoutError' and type(error).__module__.startswith('playwright'):
+        return TaskFailure(FailureKind.SELECTOR_NOT_FOUND, str(error).splitlines()[0])
+    if isinstance(error, FileNotFoundError):
+        return TaskFailure(FailureKind.IMAGE_MISSING, str(error))
+    return TaskFailure(FailureKind.UNKNOWN, str(error) or type(error).__name__)
+
+
+def http_failure(status_code: int) -> TaskFailure:
+    """按HTTP状态码生成失败：408/429/5xx可重试，其它4xx重试也无意义"""
+    permanent = 400 <= status_code < 500 and status_code not in (408, 429)
+    return TaskFailure(FailureKind.HTTP_ERROR, f"HTTP状态码 {status_code}", permanent=permanent)
+
+
+class RetryEngine:
+    """
+    重试引擎
+    - 临时失败且未用完该类重试次数时，任务延后到 退避时间 之后再执行
+    - 延后的任务在当前队列取空后才执行，退避期间会先处理其它任务
+    - 记录每个任务最终失败的原因，用于最终报告
+    """
+
+    def __init__(self):
+        self._deferred: List[tuple] = []    # 堆：(可执行时间, 序号, 任务)
+        self._serial = itertools.count()
+        self._deferred_ids = set()
+        self.final_failures: List[Dict] = []
+        self.retry_count = 0
+
+    def reset(self):
+        self._deferred.clear()
+        self._deferred_ids.clear()
+        self.final_failures.clear()
+        self.retry_count = 0
+
+    @staticmethod
+    def get_budget(kind: str) -> int:
+        budgets = dict(DEFAULT_RETRY_BUDGETS)
+        budgets.update(config_manager.get_user_config('retry_budgets') or {})
+        return int(budgets.get(kind, 0))
+
+    @staticmethod
+    def backoff_delay(attempt: int) -> float:
+        """第attempt次重试前的等待时间：指数退避，乘以0.5~1.0的随机抖动"""
+        backoff = config_manager.get_user_config('retry_backoff') or {}
+        base = float(backoff.get('base', 10.0))
+        max_delay = float(backoff.get('max', 300.0))
+        delay = min(max_delay, base * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def on_failure(self, task, failure: TaskFailure) -> bool:
+        """
+        处理一次失败，返回是否已安排重试
+        task.attempts 为已执行次数（含本次）
+        网站整体异常期间的失败不消耗任务的重试次数，重新排队后由熔断器控制何时提交；
+        每个任务最多免费重新排队 max_outage_requeues 次，网站长时间异常时按正常重试次数处理，避免批次永远无法结束
+        """
+        if failure.outage and not failure.permanent \
+                and task.outage_requeues < int(config_manager.get_user_config('max_outage_requeues')):
+            task.failures.pop()
+            task.outage_requeues += 1
+            self._defer(task, 0)
+            logger.warning(f"任务 {os.path.basename(task.folder_path)}/{task.image_index} 因网站异常失败，等待恢复后重新执行")
+            return True
+        
+        retries_used = task.failures.count(failure.kind) - 1 if task.failures else 0
+        if not failure.permanent and retries_used < self.get_budget(failure.kind):
+            delay = self.backoff_delay(retries_used + 1)
+            self._defer(task, delay)
+            logger.warning(
+                f"任务 {os.path.basename(task.folder_path)}/{task.image_index} {failure.label}，"
+                f"{delay:.0f} 秒后重试（第 {retries_used + 1} 次重试）"
+            )
+            return True
+
+        self.final_failures.append({
+            'folder_path': task.folder_path,
+            'image_index': task.image_index,
+            'prompt': task.prompt,
+            'kind': failure.kind,
+            'label': failure.label,
+            'message': str(failure),
+            'attempts': task.attempts,
+        })
+        return False
+
+    def _defer(self, task, delay: float):
+        heapq.heappush(self._deferred, (time.monotonic() + delay, next(self._serial), task))
+        self._deferred_ids.add(id(task))
+        self.retry_count += 1
+    
+    def is_deferred(self, task) -> bool:
+        return id(task) in self._deferred_ids
+
+    @property
+    def has_deferred(self) -> bool:
+        return bool(self._deferred)
+
+    def pop_ready(self):
+        """取出已到重试时间的任务，没有则返回None"""
+        if self._deferred and self._deferred[0][0] <= time.monotonic():
+            task = heapq.heappop(self._deferred)[2]
+            self._deferred_ids.discard(id(task))
+            return task
+        return None
+
+    async def wait_next(self):
+        """等待下一个重试任务到期并取出，没有待重试任务时返回None"""
+        if not self._deferred:
+            return None
+        wait = self._deferred[0][0] - time.monotonic()
+        if wait > 0:
+            logger.info(f"等待 {wait:.0f} 秒后重试失败任务")
+            await asyncio.sleep(wait)
+        return self.pop_ready()
+
+    def report(self):
+        """输出失败原因报告"""
+        if not self.final_failures:
+            return
+        counts: Dict[str, int] = {}
+        for item in self.final_failures:
+            counts[item['label']] = counts.get(item['label'], 0) + 1
+        logger.info("失败原因统计: " + "，".join(f"{label} {n} 个" for label, n in counts.items()))
+        for item in self.final_failures:
+            logger.info(
+                f"  {os.path.basename(item['folder_path'])}/{item['image_index']} "
+                f"[{item['label']}] {item['message'][:80]}（共执行 {item['attempts']} 次）"
+            )
+
+
+# 全局重试引擎实例
+retry_engine = RetryEngine()
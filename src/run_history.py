@@ -0,0 +1,317 @@
+"""
+运行历史
+每次运行（开始/结束时间、配置快照、web_elements.yaml 版本）和其中每个任务的每次执行
+（各阶段耗时、失败类型、下载字节数）都记录到数据目录的 run_history.db（SQLite），
+报告命令用于比较多次运行：每小时任务数的变化、按视频参数和按时段的生成耗时 p50/p95、
+web_elements.yaml 修改后的退化
+
+用法:
+    python -m src.run_history                 最近20次运行的报告
+    python -m src.run_history --runs 50
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, List, Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.phase_stats import phase_stats
+from src.task_source import TaskRecord
+from src.retry_engine import FailureKind
+
+HISTORY_FILENAME = 'run_history.db'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL,
+    ended_at REAL,
+    config TEXT,                    -- 用户配置快照（JSON）
+    web_elements TEXT,              -- web_elements.yaml 内容摘要
+    total INTEGER,
+    completed INTEGER,
+    failed INTEGER,
+    bytes_downloaded INTEGER,
+    failures TEXT                   -- {失败类型: 次数}（JSON）
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    run_id INTEGER,
+    folder TEXT,
+    image_index INTEGER,
+    attempt INTEGER,
+    video_options TEXT,
+    started_at REAL,
+    ended_at REAL,
+    success INTEGER,
+    failure TEXT,
+    phases TEXT,                    -- {阶段: 秒}（JSON）
+    bytes INTEGER
+);
+CREATE INDEX IF NOT EXISTS attempts_run ON attempts(run_id);
+"""
+
+
+def web_elements_digest() -> Optional[str]:
+    """web_elements.yaml 的内容摘要（用于识别选择器修改）"""
+    try:
+        with open(config_manager.project_root / "config" / "web_elements.yaml", 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()[:10]
+    except OSError:
+        return None
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """最近秩百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class RunHistory:
+    """
+    运行历史记录
+    - start_run / end_run 由任务处理器在初始化和清理时调用
+    - 没有进行中的运行时（如模拟器）task_finished 不记录
+    """
+
+    def __init__(self):
+        self._connection: Optional[sqlite3.Connection] = None
+        self.run_id: Optional[int] = None
+        self._task_started: Optional[float] = None
+        self._failures: Dict[str, int] = {}
+        self._bytes = 0
+
+    @staticmethod
+    def history_path():
+        return config_manager.get_data_dir() / HISTORY_FILENAME
+
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.history_path())
+            self._connection.executescript(_SCHEMA)
+        return self._connection
+
+    def start_run(self):
+        """开始记录一次运行（上一次未正常结束的运行先结束）"""
+        if self.run_id is not None:
+            self.end_run()
+        self._failures = {}
+        self._bytes = 0
+        try:
+            cursor = self.connection().execute(
+                "INSERT INTO runs (started_at, config, web_elements) VALUES (?, ?, ?)",
+                (time.time(), json.dumps(config_manager.get_user_config(), ensure_ascii=False, default=str),
+                 web_elements_digest())
+            )
+            self.connection().commit()
+            self.run_id = cursor.lastrowid
+        except Exception as e:
+            logger.error(f"记录运行历史失败: {e}")
+
+    def task_started(self):
+        if self.run_id is None:
+            return
+        self._task_started = time.time()
+        phase_stats.begin_task()
+
+    def task_finished(self, task: TaskRecord, success: bool):
+        """记录任务的一次执行"""
+        if self.run_id is None or self._task_started is None:
+            return
+        phases = phase_stats.end_task()
+        failure = None if success or task.last_failure is None else task.last_failure.kind
+        if failure:
+            self._failures[failure] = self._failures.get(failure, 0) + 1
+        size = 0
+        if success and task.video_path and os.path.exists(task.video_path):
+            size = os.path.getsize(task.video_path)
+            self._bytes += size
+        options = task.video_options or config_manager.get_user_config('video_options') or {}
+        try:
+            self.connection().execute(
+                "INSERT INTO attempts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.run_id, task.folder_path, task.image_index, task.attempts,
+                 json.dumps(options, ensure_ascii=False, sort_keys=True), self._task_started, time.time(),
+                 int(success), failure, json.dumps(phases), size)
+            )
+            self.connection().commit()
+        except Exception as e:
+            logger.error(f"记录任务历史失败: {e}")
+        self._task_started = None
+
+    def end_run(self, total: int = 0, completed: int = 0, failed: int = 0):
+        """结束当前运行并写入汇总"""
+        if self.run_id is None:
+            return
+        try:
+            self.connection().execute(
+                "UPDATE runs SET ended_at = ?, total = ?, completed = ?, failed = ?, bytes_downloaded = ?, failures = ? "
+                "WHERE id = ?",
+                (time.time(), total, completed, failed, self._bytes,
+                 json.dumps(self._failures, ensure_ascii=False), self.run_id)
+            )
+            self.connection().commit()
+            logger.info(f"运行记录已保存（第 {self.run_id} 次），查看报告: python -m src.run_history")
+        except Exception as e:
+            logger.error(f"保存运行历史失败: {e}")
+        self.run_id = None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+# 全局运行历史实例
+run_history = RunHistory()
+
+
+# ---------- 报告 ----------
+
+def _generation_latencies(connection, run_ids: List[int]) -> List[tuple]:
+    """返回成功执行的 (视频参数, 开始时间, 生成耗时)"""
+    if not run_ids:
+        return []
+    marks = ','.join('?' * len(run_ids))
+    rows = connection.execute(
+        f"SELECT video_options, started_at, phases FROM attempts WHERE success = 1 AND run_id IN ({marks})", run_ids
+    )
+    result = []
+    for options, started_at, phases in rows:
+        generation = json.loads(phases or '{}').get('generation')
+        if generation is not None:
+            result.append((options, started_at, generation))
+    return result
+
+
+def _run_summary(connection, run) -> Dict:
+    run_id, started_at, ended_at, digest, total, completed, failed, size, failures = run
+    duration = (ended_at or started_at) - started_at
+    latencies = [item[2] for item in _generation_latencies(connection, [run_id])]
+    return {
+        'id': run_id,
+        'started': time.strftime('%Y-%m-%d %H:%M', time.localtime(started_at)),
+        'hours': duration / 3600,
+        'web_elements': digest or '-',
+        'total': total or 0,
+        'completed': completed or 0,
+        'failed': failed or 0,
+        'success_rate': (completed or 0) / total if total else None,
+        'tasks_per_hour': (completed or 0) / (duration / 3600) if duration > 0 else None,
+        'megabytes': (size or 0) / 1024 / 1024,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'failures': json.loads(failures or '{}'),
+    }
+
+
+def _fmt(value, pattern='{:.1f}'):
+    return '-' if value is None else pattern.format(value)
+
+
+def _print_latency_table(title: str, groups: Dict[str, List[float]]):
+    print(f"\n{title}")
+    print(f"{'分组':<44} {'次数':>6} {'p50(秒)':>9} {'p95(秒)':>9}")
+    for key in sorted(groups):
+        values = groups[key]
+        print(f"{key:<44} {len(values):>6} {_fmt(percentile(values, 50)):>9} {_fmt(percentile(values, 95)):>9}")
+
+
+def report(runs_limit: int = 20):
+    """打印运行比较报告"""
+    path = RunHistory.history_path()
+    if not os.path.exists(path):
+        print("还没有运行记录")
+        return
+    with closing(sqlite3.connect(path)) as connection:
+        connection.executescript(_SCHEMA)
+        runs = connection.execute(
+            "SELECT id, started_at, ended_at, web_elements, total, completed, failed, bytes_downloaded, failures "
+            "FROM runs ORDER BY id DESC LIMIT ?", (runs_limit,)
+        ).fetchall()[::-1]
+        if not runs:
+            print("还没有运行记录")
+            return
+        summaries = [_run_summary(connection, run) for run in runs]
+
+        # 1. 每次运行的吞吐量
+        print(f"{'运行':>5} {'开始时间':<17} {'时长(h)':>8} {'任务':>6} {'成功率':>7} {'任务/小时':>9} "
+              f"{'生成p50':>8} {'生成p95':>8} {'下载MB':>8}  web_elements")
+        previous_digest = None
+        for summary in summaries:
+            changed = ' *' if previous_digest and summary['web_elements'] != previous_digest else ''
+            previous_digest = summary['web_elements']
+            print(f"{summary['id']:>5} {summary['started']:<17} {summary['hours']:>8.2f} {summary['total']:>6} "
+                  f"{_fmt(summary['success_rate'], '{:.0%}'):>7} {_fmt(summary['tasks_per_hour']):>9} "
+                  f"{_fmt(summary['p50']):>8} {_fmt(summary['p95']):>8} {summary['megabytes']:>8.1f}  "
+                  f"{summary['web_elements']}{changed}")
+        print("（* 表示该次运行前修改过 web_elements.yaml）")
+        for summary in summaries:
+            if summary['failures']:
+                kinds = sorted(summary['failures'].items(), key=lambda item: -item[1])
+                print(f"  运行 {summary['id']} 失败执行: " + "，".join(
+                    f"{FailureKind.LABELS.get(kind, kind)} {count} 次" for kind, count in kinds))
+
+        # 2. 生成耗时：按视频参数、按时段
+        latencies = _generation_latencies(connection, [summary['id'] for summary in summaries])
+        by_options: Dict[str, List[float]] = {}
+        by_hour: Dict[str, List[float]] = {}
+        for options, started_at, generation in latencies:
+            label = ' / '.join(str(value) for value in json.loads(options).values()) or '默认'
+            by_options.setdefault(label, []).append(generation)
+            by_hour.setdefault(f"{time.localtime(started_at).tm_hour:02d}:00", []).append(generation)
+        if latencies:
+            _print_latency_table("生成耗时（按视频参数）", by_options)
+            _print_latency_table("生成耗时（按开始时段）", by_hour)
+
+        # 3. web_elements.yaml 修改前后的对比
+        _print_regressions(summaries)
+
+
+def _print_regressions(summaries: List[Dict], window: int = 3):
+    """对每次 web_elements.yaml 修改，比较修改前后各最多 window 次运行"""
+    changes = [index for index in range(1, len(summaries))
+               if summaries[index]['web_elements'] != summaries[index - 1]['web_elements']]
+    if not changes:
+        return
+    print("\nweb_elements.yaml 修改前后对比")
+
+    def average(items, key):
+        values = [item[key] for item in items if item[key] is not None]
+        return sum(values) / len(values) if values else None
+
+    for index in changes:
+        digest = summaries[index]['web_elements']
+        before = summaries[max(0, index - window):index]
+        after = [item for item in summaries[index:index + window] if item['web_elements'] == digest]
+        lines = []
+        for key, label, worse in (('success_rate', '成功率', lambda b, a: a < b - 0.1),
+                                  ('tasks_per_hour', '任务/小时', lambda b, a: a < b * 0.8),
+                                  ('p50', '生成p50', lambda b, a: a > b * 1.2)):
+            b, a = average(before, key), average(after, key)
+            if b is None or a is None:
+                continue
+            pattern = '{:.0%}' if key == 'success_rate' else '{:.1f}'
+            flag = '  ← 退化' if worse(b, a) else ''
+            lines.append(f"    {label}: {pattern.format(b)} -> {pattern.format(a)}{flag}")
+        print(f"  运行 {summaries[index]['id']} 起使用 {digest}（之前 {len(before)} 次，之后 {len(after)} 次）")
+        for line in lines:
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="运行历史报告")
+    parser.add_argument("--runs", type=int, default=20, help="比较最近多少次运行，默认20")
+    args = parser.parse_args(argv)
+    report(args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+元素选择器自愈
+web_elements.yaml 中的元素可以配置为多个备选选择器（XPath、CSS、Playwright 的 text= / role= 等），
+操作元素时先用当前排在最前的选择器短超时尝试，失败后所有备选同时等待，先出现的胜出并提到最前，
+学到的顺序保存在数据目录的 selector_order.json，之后的任务直接使用，
+网站小改版时只多花一次短超时，而不是每个任务都等满超时后失败
+"""
+
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, List, Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.retry_engine import TaskFailure, FailureKind
+from src.flight_recorder import flight_recorder
+
+ORDER_FILENAME = 'selector_order.json'
+
+
+def is_timeout(error: Exception) -> bool:
+    """Playwright的超时异常（按类名判断，避免导入Playwright）"""
+    return 'timeout' in type(error).__name__.lower()
+
+
+def is_dom_selector(selector: str) -> bool:
+    """页面内JS可以直接执行的选择器（XPath或CSS），text= / role= 等只能由Playwright解析"""
+    return '>>' not in selector and selector.split('=', 1)[0] not in ('text', 'role', 'xpath', 'css', 'id', 'data-testid')
+
+
+def is_xpath(selector: str) -> bool:
+    return selector.startswith('/') or selector.startswith('(')
+
+
+class SelectorResolver:
+    """
+    选择器自愈
+    - candidates(key) 返回按学到的顺序排列的备选选择器
+    - click / fill / set_input_files 在备选中找到可用的选择器后执行操作
+    """
+
+    def __init__(self):
+        self._order: Optional[Dict[str, List[str]]] = None
+        self.promotions = 0
+
+    @staticmethod
+    def _settings() -> dict:
+        # 未单独设置 timeout 时使用页面的默认超时（GUI中的超时设置）
+        settings = {'fast_timeout': 1500, 'timeout': config_manager.get_user_config('timeout')}
+        settings.update(config_manager.get_user_config('selector_race') or {})
+        return settings
+
+    @staticmethod
+    def order_path():
+        return config_manager.get_data_dir() / ORDER_FILENAME
+
+    @property
+    def order(self) -> Dict[str, List[str]]:
+        if self._order is None:
+            self._order = {}
+            try:
+                with open(self.order_path(), 'r', encoding='utf-8') as f:
+                    self._order = json.load(f)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"读取选择器顺序失败: {e}")
+        return self._order
+
+    def candidates(self, key: str) -> List[str]:
+        """元素的备选选择器（学到的顺序在前，配置中新增的在后）"""
+        configured = config_manager.get_web_element(f'elements.{key}')
+        if configured is None:
+            return []
+        configured = [configured] if isinstance(configured, str) else list(configured)
+        learned = [selector for selector in self.order.get(key, []) if selector in configured]
+        return learned + [selector for selector in configured if selector not in learned]
+
+    def primary(self, key: str) -> Optional[str]:
+        candidates = self.candidates(key)
+        return candidates[0] if candidates else None
+
+    def _promote(self, key: str, selector: str, candidates: List[str]):
+        self.order[key] = [selector] + [candidate for candidate in candidates if candidate != selector]
+        self.promotions += 1
+        logger.warning(f"元素 {key} 的首选选择器已失效，改用备选: {selector}")
+        try:
+            with open(self.order_path(), 'w', encoding='utf-8') as f:
+                json.dump(self.order, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"保存选择器顺序失败: {e}")
+
+    async def _race(self, page, selectors: List[str], state: str, timeout: float) -> Optional[int]:
+        """所有备选同时等待，返回最先出现的序号（同时出现时取排在前面的），都未出现时返回None"""
+        waits = [asyncio.ensure_future(page.wait_for_selector(selector, state=state, timeout=timeout))
+                 for selector in selectors]
+        try:
+            pending = set(waits)
+            while pending:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for index, wait in enumerate(waits):
+                    if wait.done() and not wait.cancelled() and wait.exception() is None:
+                        return index
+            return None
+        finally:
+            for wait in waits:
+                wait.cancel()
+            await asyncio.gather(*waits, return_exceptions=True)
+
+    async def _act(self, page, key: str, action: Callable[[str, float], Awaitable], state: str = 'visible',
+                   transform: Optional[Callable[[str], str]] = None, timeout: Optional[float] = None):
+        """timeout: 本次操作最多等待的毫秒数（任务剩余的时间预算），不超过配置的超时"""
+        candidates = self.candidates(key)
+        if not candidates:
+            raise TaskFailure(FailureKind.SELECTOR_NOT_FOUND, f"未配置元素: {key}")
+        selectors = [transform(selector) for selector in candidates] if transform else candidates
+        settings = self._settings()
+        total = settings['timeout'] if timeout is None else min(settings['timeout'], timeout)
+        flight_recorder.note('action', f"{key}: {selectors[0]}")
+        if len(selectors) == 1:
+            return await action(selectors[0], total)
+
+        # 首选选择器短超时尝试（正常情况下只有这一次往返）
+        fast_timeout = min(settings['fast_timeout'], total)
+        try:
+            return await action(selectors[0], fast_timeout)
+        except Exception as e:
+            if not is_timeout(e):
+                raise
+        flight_recorder.note('selector', f"{key} 首选选择器 {fast_timeout:.0f} ms 内未出现，尝试全部备选")
+        index = await self._race(page, selectors, state, max(total - fast_timeout, 1))
+        if index is None:
+            raise TaskFailure(FailureKind.SELECTOR_NOT_FOUND, f"未找到元素 {key}（已尝试 {len(selectors)} 个选择器）")
+        result = await action(selectors[index], total)
+        if index > 0:
+            self._promote(key, candidates[index], candidates)
+        return result
+
+    async def click(self, page, key: str, transform: Optional[Callable[[str], str]] = None,
+                    timeout: Optional[float] = None):
+        await self._act(page, key, lambda selector, wait: page.click(selector, timeout=wait),
+                        transform=transform, timeout=timeout)
+
+    async def fill(self, page, key: str, value: str, timeout: Optional[float] = None):
+        await self._act(page, key, lambda selector, wait: page.fill(selector, value, timeout=wait), timeout=timeout)
+
+    async def set_input_files(self, page, key: str, files, timeout: Optional[float] = None):
+        await self._act(page, key, lambda selector, wait: page.set_input_files(selector, files, timeout=wait),
+                        state='attached', timeout=timeout)
+
+    def report(self):
+        if self.promotions:
+            logger.info(f"选择器自愈: 本次运行改用备选选择器 {self.promotions} 次（已保存到 {self.order_path()}）")
+
+    def reset(self):
+        self.promotions = 0
+
+
+# 全局选择器自愈实例
+selector_resolver = SelectorResolver()
@@ -0,0 +1,204 @@
+"""
+浏览器会话管理器
+在同一进程的多次运行之间保持CDP连接和已准备好的页面，
+检测失效或崩溃的页面，并用一次轻量的页面检查代替重新导航
+"""
+
+import asyncio
+import threading
+import time
+from typing import Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.page_probe import page_probe
+
+
+class SessionManager:
+    """
+    浏览器会话管理器
+    - 常驻事件循环：Playwright对象绑定在创建它的事件循环上，
+      GUI每次点击开始都在新线程中运行，因此所有运行都提交到同一个常驻事件循环
+    - 会话复用：run结束时只释放不关闭，下次运行先检查连接和页面是否仍然可用
+    """
+
+    def __init__(self):
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.ws_url = None
+        self.bit_browser_id = None
+        self.page_prepared = False      # 页面是否已导航到目标网站并打开创作历史
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._current_future = None
+
+    # ---------- 常驻事件循环 ----------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, name="browser-session", daemon=True)
+            self._loop_thread.start()
+        return self._loop
+
+    def run(self, coro):
+        """在常驻事件循环上执行协程，阻塞等待结果（供GUI工作线程调用）"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        self._current_future = future
+        try:
+            return future.result()
+        finally:
+            self._current_future = None
+
+    def cancel_current(self):
+        """取消正在常驻事件循环上执行的运行"""
+        future = self._current_future
+        if future is not None and not future.done():
+            future.cancel()
+
+    def close(self):
+        """关闭会话并停止常驻事件循环（程序退出时调用）"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self._loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"关闭浏览器会话失败: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join(timeout=5)
+        self._loop.close()
+
+    # ---------- 会话复用 ----------
+
+    async def acquire(self):
+        """
+        获取可用的页面：连接和页面仍然有效时直接复用，
+        页面失效时在原连接上换新页面，连接断开时重新连接
+        """
+        start = time.perf_counter()
+        if self.is_connected():
+            if await self._page_alive():
+                logger.info(f"复用已有浏览器会话（{(time.perf_counter() - start) * 1000:.0f} ms）")
+                return self.page
+            logger.warning("页面已失效，在现有连接上重新打开页面")
+            await self._replace_page()
+            return self.page
+
+        await self._connect()
+        return self.page
+
+    def is_connected(self) -> bool:
+        return bool(self.browser and self.browser.is_connected() and self.context)
+
+    async def _page_alive(self) -> bool:
+        """页面未关闭且能在短时间内执行脚本（崩溃或卡死的页面会超时）"""
+        if self.page is None or self.page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(self.page.evaluate("1"), timeout=3)
+            return True
+        except Exception as e:
+            logger.warning(f"页面无响应: {e}")
+            return False
+
+    async def open_page(self):
+        """在现有连接上打开新页面（不关闭旧页面）"""
+        page = await self.context.new_page()
+        page.set_default_timeout(config_manager.get_user_config('timeout'))
+        return page
+
+    async def _replace_page(self):
+        old_page = self.page
+        self.page = await self.open_page()
+        self.page_prepared = False
+        if old_page is not None:
+            try:
+                await old_page.close()
+            except Exception:
+                pass
+
+    async def _connect(self):
+        """连接到比特浏览器窗口（首次运行或连接断开时）"""
+        # Playwright和requests较重，只在真正开始运行时才导入
+        from playwright.async_api import async_playwright
+        from bit_api import openBrowser
+
+        await self.shutdown()
+        self.playwright = await async_playwright().start()
+        # 从配置读取窗口ID
+        bit_browser_id = config_manager.get_user_config('bit_browser_id')
+        if not bit_browser_id or bit_browser_id == "请填写比特浏览器窗口ID":
+            raise Exception("请在GUI界面中配置比特浏览器窗口ID")
+        # 打开指定窗口，获取ws地址
+        open_res = openBrowser(bit_browser_id)
+        logger.info(f"open_res: {open_res}")
+        # 自动适配ws_url的获取方式
+        ws_data = open_res.get('data', {}).get('ws')
+        if isinstance(ws_data, dict):
+            ws_url = ws_data.get('selenium')
+        else:
+            ws_url = ws_data
+        if not ws_url:
+            raise Exception(f"未获取到比特浏览器ws地址，open_res: {open_res}")
+        self.bit_browser_id = bit_browser_id  # 保存ID用于后续关闭
+        self.ws_url = ws_url
+        self.browser = await self.playwright.chromium.connect_over_cdp(ws_url)
+        logger.info(f"成功连接到比特浏览器: {ws_url}")
+        # 获取浏览器上下文
+        contexts = self.browser.contexts
+        if contexts:
+            self.context = contexts[0]
+            logger.info("使用现有的浏览器上下文")
+        else:
+            self.context = await self.browser.new_context()
+            logger.info("创建新的浏览器上下文")
+        pages = self.context.pages
+        if pages:
+            self.page = pages[0]
+            logger.info("使用现有的浏览器页面")
+        else:
+            self.page = await self.context.new_page()
+            logger.info("创建新的浏览器页面")
+        self.page.set_default_timeout(config_manager.get_user_config('timeout'))
+        self.page_prepared = False
+
+    async def revalidate_page(self) -> bool:
+        """
+        轻量检查已准备好的页面是否还能直接使用：
+        仍在目标网站，且提示词输入框存在（一次页面探针快照完成）
+        """
+        if not self.page_prepared or self.page is None:
+            return False
+        try:
+            state = await asyncio.wait_for(page_probe.snapshot(self.page), timeout=3)
+        except Exception as e:
+            logger.warning(f"页面状态检查失败: {e}")
+            self.page_prepared = False
+            return False
+        if "chatglm.cn/video" not in state['url'] or not state['elements'].get('prompt_textarea'):
+            logger.info(f"页面状态已变化，需要重新准备: {state['url']}")
+            self.page_prepared = False
+            return False
+        return True
+
+    def release(self):
+        """运行结束：保留连接和页面供下次运行复用"""
+        logger.info("浏览器会话已保留，下次运行将直接复用")
+
+    async def shutdown(self):
+        """断开CDP连接并停止Playwright（不关闭比特浏览器窗口和用户的浏览器上下文）"""
+        if self.playwright:
+            try:
+                await self.playwright.stop()
+            except Exception as e:
+                logger.warning(f"停止Playwright失败: {e}")
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.page_prepared = False
+
+
+# 全局会话管理器实例
+session_manager = SessionManager()
@@ -0,0 +1,315 @@
+"""
+批量任务模拟器（容量规划 / 试运行）
+用虚拟时钟运行真实的 TaskProcessor 工作循环、TaskScheduler、重试引擎、熔断器和下载调度器，
+只把浏览器操作和网络传输换成按耗时分布抽样的模拟步骤：没有任务真正等待，几千个任务几秒内跑完
+
+阶段耗时优先使用实际运行记录的样本（phase_stats），样本不足时使用配置 simulation.phases 中的 [均值, 标准差]；
+可同时比较多组 工作窗口数 × 智能延时倍数，输出预计总用时、窗口利用率和下载带宽
+
+用法:
+    python -m src.simulator                          模拟任务根目录下所有待处理任务
+    python -m src.simulator --tasks 5000 --workers 1,2,4 --delay-scale 1,0.5,0
+"""
+
+import argparse
+import asyncio
+import copy
+import math
+import random
+import selectors
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from src.config_manager import config_manager
+from src.task_source import TaskRecord
+from src.retry_engine import TaskFailure, FailureKind
+from src.phase_stats import phase_stats
+from src.deadline import TaskDeadline
+
+PHASES = ('upload', 'params', 'prompt', 'submit', 'generation')
+MIN_RECORDED_SAMPLES = 20       # 少于这么多的记录样本时使用配置的分布
+MB = 1024 * 1024
+
+
+class VirtualClock:
+    """虚拟时钟：事件循环空闲时直接跳到下一个定时器，而不是真的等待"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class _VirtualSelector:
+    """包装真实的selector：只轮询不阻塞，需要等待的时间直接加到虚拟时钟上"""
+
+    def __init__(self, clock: VirtualClock):
+        self._clock = clock
+        self._selector = selectors.DefaultSelector()
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if not events:
+            if timeout is None:
+                raise RuntimeError("模拟中没有可执行的事件（所有任务都在等待）")
+            self._clock.now += timeout
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+@contextmanager
+def virtual_time(clock: VirtualClock):
+    """模拟期间 time.monotonic 返回虚拟时间（事件循环和各模块的计时都使用它）"""
+    real_monotonic = time.monotonic
+    time.monotonic = clock.monotonic
+    try:
+        yield
+    finally:
+        time.monotonic = real_monotonic
+
+
+class Distribution:
+    """耗时分布：有足够记录样本时按样本抽样，否则按 [均值, 标准差] 的对数正态分布抽样"""
+
+    def __init__(self, rng: random.Random, samples: List[float], mean: float, sd: float):
+        self.rng = rng
+        self.samples = samples if len(samples) >= MIN_RECORDED_SAMPLES else None
+        sigma2 = math.log(1 + (sd / mean) ** 2) if mean > 0 else 0.0
+        self.mu = math.log(mean) - sigma2 / 2 if mean > 0 else 0.0
+        self.sigma = math.sqrt(sigma2)
+        self.mean = sum(self.samples) / len(self.samples) if self.samples else mean
+
+    @property
+    def source(self) -> str:
+        return f"记录({len(self.samples)})" if self.samples else "配置"
+
+    def sample(self) -> float:
+        if self.samples:
+            return self.rng.choice(self.samples)
+        return self.rng.lognormvariate(self.mu, self.sigma) if self.mean > 0 else 0.0
+
+
+class SimulatedController:
+    """代替 browser_controller：按分布等待各阶段，按失败率抛出生成超时"""
+
+    def __init__(self, distributions: Dict[str, Distribution], failure_rate: float, rng: random.Random):
+        self.distributions = distributions
+        self.failure_rate = failure_rate
+        self.rng = rng
+        self.context = None
+        self.page = None
+        self.busy_seconds = 0.0
+        self._serial = 0
+
+    async def process_single_task(self, image_path: str, prompt: str, video_options: Optional[dict] = None,
+                                  deadline: Optional[TaskDeadline] = None) -> str:
+        deadline = deadline or TaskDeadline.for_task(video_options)
+        start = time.monotonic()
+        try:
+            for phase in PHASES:
+                # 与真实流程相同的时间预算：超出时该阶段被取消，任务失败
+                await deadline.run_phase(phase, self._phase(phase))
+            if self.rng.random() < self.failure_rate:
+                raise TaskFailure(FailureKind.GENERATION_TIMEOUT, "模拟的生成超时")
+        finally:
+            self.busy_seconds += time.monotonic() - start
+        self._serial += 1
+        return f"https://sim.invalid/videos/{self._serial}.mp4"
+
+    async def _phase(self, phase: str):
+        await asyncio.sleep(self.distributions[phase].sample())
+        # 与真实流程相同的智能延时（上传后、输入后、点击后）
+        delay_type = {'upload': 'upload_after', 'prompt': 'input_after', 'params': 'click_after',
+                      'submit': 'click_after'}.get(phase)
+        if delay_type:
+            await asyncio.sleep(config_manager.get_smart_delay(delay_type))
+
+
+class Simulation:
+    """一次模拟：给定任务、工作窗口数和配置覆盖项，返回统计结果"""
+
+    def __init__(self, tasks: List[TaskRecord], workers: int = 1, delay_scale: float = 1.0, seed: int = 0):
+        self.tasks = tasks
+        self.workers = workers
+        self.delay_scale = delay_scale
+        self.seed = seed
+
+    def _settings(self) -> dict:
+        settings = copy.deepcopy(config_manager.get_default_config()['simulation'])
+        user = config_manager.get_user_config('simulation') or {}
+        settings['phases'].update(user.get('phases', {}))
+        settings.update({key: value for key, value in user.items() if key != 'phases'})
+        return settings
+
+    def _sim_config(self) -> dict:
+        config = dict(config_manager.get_user_config())
+        config['smart_delay'] = {key: value * self.delay_scale
+                                 for key, value in (config.get('smart_delay') or {}).items()}
+        # 不保存视频，不读取视频元数据，不走接口直连
+        config['capture_browser_video'] = False
+        config['generation_mode'] = 'ui'
+        config['video_catalog'] = dict(config.get('video_catalog') or {}, enabled=False)
+        return config
+
+    def run(self) -> Dict:
+        import src.task_processor as task_processor_module
+        from src.download_scheduler import download_scheduler
+
+        rng = random.Random(self.seed)
+        settings = self._settings()
+        distributions = {
+            phase: Distribution(rng, phase_stats.samples(phase), *settings['phases'][phase]) for phase in PHASES
+        }
+        video_mb = Distribution(rng, phase_stats.samples('video_mb'), *settings['video_mb'])
+        link_mbps = Distribution(rng, phase_stats.samples('download_mbps'), settings['link_mbps'], settings['link_mbps'] / 4)
+        controller = SimulatedController(distributions, settings['failure_rate'], rng)
+
+        processor = task_processor_module.TaskProcessor()
+        download_seconds = [0.0]
+
+        async def simulated_transfer(task, folder_path) -> Tuple[str, int]:
+            # 同时进行的下载平分带宽上限，单个下载不超过线路速度
+            size = int(video_mb.sample() * MB)
+            rate = link_mbps.sample() * MB
+            if download_scheduler.bucket.rate > 0:
+                rate = min(rate, download_scheduler.bucket.rate / max(download_scheduler._active, 1))
+            seconds = size / max(rate, 1.0)
+            download_seconds[0] += seconds
+            await asyncio.sleep(seconds)
+            return f"{folder_path}/{task.image_index}.mp4", size
+
+        delays = [0.0]
+        real_get_smart_delay = config_manager.get_smart_delay
+
+        def counted_smart_delay(delay_type=None):
+            value = real_get_smart_delay(delay_type)
+            delays[0] += value
+            return value
+
+        tasks = [TaskRecord(task.folder_path, None, task.image_index, task.image_path, task.prompt,
+                            priority=task.priority, video_options=task.video_options) for task in self.tasks]
+
+        async def main():
+            processor.reset_statistics()
+            scheduler = processor.create_scheduler()
+            for task in tasks:
+                scheduler.add_task(task)
+            await asyncio.gather(*(processor.run_worker(scheduler) for _ in range(self.workers)))
+            return scheduler
+
+        clock = VirtualClock()
+        saved_config = config_manager.user_config
+        saved_controller = task_processor_module.browser_controller
+        loop = asyncio.SelectorEventLoop(_VirtualSelector(clock))
+        logger.disable('src')
+        wall_start = time.perf_counter()
+        try:
+            config_manager.user_config = self._sim_config()
+            config_manager.get_smart_delay = counted_smart_delay
+            task_processor_module.browser_controller = controller
+            download_scheduler._transfer = simulated_transfer
+            # 模拟结果不写入阶段耗时记录（自适应超时和之后的模拟都读取这些样本）
+            phase_stats.record = lambda name, value: None
+            phase_stats.save = lambda: None
+            with virtual_time(clock):
+                random_state = random.getstate()
+                random.seed(self.seed)      # get_smart_delay 使用全局random
+                try:
+                    scheduler = loop.run_until_complete(main())
+                finally:
+                    random.setstate(random_state)
+            stats = download_scheduler.stats()
+        finally:
+            loop.close()
+            del download_scheduler._transfer
+            del phase_stats.record, phase_stats.save
+            task_processor_module.browser_controller = saved_controller
+            del config_manager.get_smart_delay
+            config_manager.user_config = saved_config
+            logger.enable('src')
+        wall = time.perf_counter() - wall_start
+
+        makespan = clock.now
+        capacity = makespan * self.workers
+        return {
+            'workers': self.workers,
+            'delay_scale': self.delay_scale,
+            'tasks': processor.total_tasks,
+            'completed': processor.completed_tasks,
+            'failed': processor.failed_tasks,
+            'makespan_hours': makespan / 3600,
+            'tasks_per_hour': processor.completed_tasks / makespan * 3600 if makespan else 0.0,
+            # 窗口利用率：窗口正在处理任务（含任务内的智能延时）或下载的时间占比
+            'utilization': (controller.busy_seconds + download_seconds[0]) / capacity if capacity else 0.0,
+            'delay_share': delays[0] / capacity if capacity else 0.0,
+            'download_share': download_seconds[0] / capacity if capacity else 0.0,
+            'throughput_mbps': stats['throughput_mbps'] or 0.0,
+            'megabytes': stats['megabytes'],
+            'option_switches': scheduler.option_switches,
+            'sources': {name: dist.source for name, dist in distributions.items()},
+            'wall_seconds': wall,
+        }
+
+
+def synthetic_tasks(count: int) -> List[TaskRecord]:
+    """生成模拟任务（使用全局视频参数）"""
+    return [TaskRecord('/sim', None, index + 1, f'/sim/{index + 1}.jpg', f'模拟任务{index + 1}')
+            for index in range(count)]
+
+
+def pending_tasks() -> List[TaskRecord]:
+    """读取任务根目录下所有待处理任务（只读，模拟不会回写状态）"""
+    from src.file_manager import file_manager
+
+    tasks = []
+    for folder_path in file_manager.get_all_task_folders():
+        tasks.extend(file_manager.iter_pending_tasks(folder_path))
+    return tasks
+
+
+def print_results(results: List[Dict]):
+    first = results[0]
+    print(f"阶段耗时来源: " + ", ".join(f"{name}={source}" for name, source in first['sources'].items()))
+    print(f"{'窗口数':>6} {'延时倍数':>8} {'总用时(小时)':>12} {'任务/小时':>10} {'窗口利用率':>10} "
+          f"{'延时占比':>8} {'下载占比':>8} {'下载MB/s':>9} {'失败':>6}")
+    for result in results:
+        print(f"{result['workers']:>6} {result['delay_scale']:>8g} {result['makespan_hours']:>12.2f} "
+              f"{result['tasks_per_hour']:>10.1f} {result['utilization']:>10.0%} {result['delay_share']:>8.0%} "
+              f"{result['download_share']:>8.0%} {result['throughput_mbps']:>9.2f} {result['failed']:>6}")
+    total = sum(result['tasks'] for result in results)
+    wall = sum(result['wall_seconds'] for result in results)
+    print(f"共模拟 {total} 个任务，用时 {wall:.1f} 秒（{total / max(wall, 1e-9):.0f} 个/秒）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量任务模拟器：估算总用时并比较并发和智能延时设置")
+    parser.add_argument("--config", help="配置文件路径（JSON或YAML），默认使用GUI自动保存的配置")
+    parser.add_argument("--tasks", type=int, help="模拟的任务数，不指定时读取任务根目录下的待处理任务")
+    parser.add_argument("--workers", default="1", help="工作窗口数，多个用逗号分隔，如 1,2,4")
+    parser.add_argument("--delay-scale", default="1", help="智能延时倍数，多个用逗号分隔，如 1,0.5,0")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    if args.config or config_manager.get_user_config_file_path().exists():
+        config_manager.load_user_config_file(args.config)
+    tasks = synthetic_tasks(args.tasks) if args.tasks else pending_tasks()
+    if not tasks:
+        print("没有可模拟的任务（用 --tasks 指定任务数）")
+        return
+
+    results = []
+    for workers in [int(value) for value in args.workers.split(',')]:
+        for delay_scale in [float(value) for value in args.delay_scale.split(',')]:
+            results.append(Simulation(tasks, workers, delay_scale, args.seed).run())
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,30 @@
 """
 
 import asyncio
-from typing import List, Dict
+from typing import Dict, Tuple
 from loguru import logger
 from src.config_manager import config_manager
 from src.file_manager import file_manager
+from src.task_source import TaskRecord
+from src.task_scheduler import TaskScheduler
+from src.folder_watcher import FolderWatcher
 from src.browser_controller import browser_controller
+from src.retry_engine import retry_engine, classify_exception, FailureKind
+from src.circuit_breaker import circuit_breaker
+from src.download_client import download_client
+from src.download_scheduler import download_scheduler
+from src.video_capture import video_capture
+from src.api_mode import api_mode
+from src.video_catalog import video_catalog
+from src.phase_stats import phase_stats
+from src.run_history import run_history
+from src.selector_resolver import selector_resolver
+from src.page_probe import page_probe
+from src.deadline import TaskDeadline
+from src.generation_timeout import generation_timeout
+from src.flight_recorder import flight_recorder
+from src.page_watchdog import page_watchdog
+from src.resource_policy import resource_policy
 
 
 class TaskProcessor:
@@ -16,12 +35,40 @@ class TaskProcessor:
         self.total_tasks = 0
         self.completed_tasks = 0
         self.failed_tasks = 0
+        self.stop_requested = False
     
-    async def initialize(self):
-        """初始化任务处理器"""
+    def reset_statistics(self):
+        """重置统计（同一进程内可能多次运行）"""
+        self.total_tasks = 0
+        self.completed_tasks = 0
+        self.failed_tasks = 0
+        self.stop_requested = False
+        retry_engine.reset()
+        circuit_breaker.reset()
+        download_scheduler.reset()
+        video_capture.reset()
+        api_mode.reset()
+        video_catalog.reset()
+        selector_resolver.reset()
+        flight_recorder.reset()
+        page_watchdog.reset()
+        resource_policy.reset()
+    
+    def request_stop(self):
+        """请求停止监视模式（当前任务完成后退出）"""
+        self.stop_requested = True
+    
+    async def initialize(self, require_root_directory: bool = True):
+        """
+        初始化任务处理器
+        require_root_directory: 是否要求任务根目录有效（服务模式下可以只接收直接提交的任务）
+        """
         try:
+            self.reset_statistics()
+            run_history.start_run()
+            
             # 验证配置
-            if not config_manager.validate_root_directory():
+            if require_root_directory and not config_manager.validate_root_directory():
                 raise Exception("根目录配置无效")
             
             # 初始化浏览器
@@ -41,7 +88,7 @@ class TaskProcessor:
             raise
     
     async def process_all_tasks(self):
-        """处理所有任务"""
+        """处理所有任务：合并所有文件夹的任务，按全局优先级调度"""
         try:
             # 获取所有任务文件夹
             task_folders = file_manager.get_all_task_folders()
@@ -52,9 +99,14 @@ class TaskProcessor:
             
             logger.info(f"找到 {len(task_folders)} 个任务文件夹，开始处理...")
             
-            # 逐个处理文件夹
+            scheduler = self.create_scheduler()
             for folder_path in task_folders:
-                await self.process_folder_tasks(folder_path)
+                scheduler.add_folder(folder_path, file_manager.iter_pending_tasks(folder_path))
+            
+            await self.run_worker(scheduler)
+            
+            if scheduler.option_switches:
+                logger.info(f"视频参数切换次数: {scheduler.option_switches}")
             
             # 输出最终统计
             self.print_final_statistics()
@@ -63,83 +115,200 @@ class TaskProcessor:
             logger.error(f"处理所有任务失败: {e}")
             raise
     
-    async def process_folder_tasks(self, folder_path: str):
-        """处理单个文件夹中的所有任务"""
+    def create_scheduler(self) -> TaskScheduler:
+        """按用户配置创建全局任务调度器"""
+        return TaskScheduler(
+            group_by_video_options=bool(config_manager.get_user_config('group_by_video_options')),
+            lookahead=config_manager.get_user_config('scheduler_lookahead')
+        )
+    
+    async def run_worker(self, scheduler: TaskScheduler):
+        """执行工作循环：从调度器取任务并逐个处理，队列取空后再处理待重试的任务"""
+        while True:
+            task = scheduler.next_task() or retry_engine.pop_ready()
+            if task is None:
+                task = await retry_engine.wait_next()
+            if task is None:
+                break
+            await self.execute_task(task)
+    
+    async def watch_all_tasks(self):
+        """
+        监视模式：持续监视任务根目录，只把新增或变化的任务加入队列
+        浏览器会话一直保持，直到调用 request_stop 或进程被中断
+        """
+        root_dir = config_manager.get_user_config('root_directory')
+        poll_interval = config_manager.get_user_config('watch_poll_interval')
+        scheduler = self.create_scheduler()
+        watcher = FolderWatcher(root_dir)
+        # 本次会话中已入队的任务: (文件夹, 行号) -> 任务，以及已开始执行的任务
+        known_tasks: Dict[Tuple[str, int], TaskRecord] = {}
+        dispatched = set()
+        
+        watcher.start()
+        logger.info(f"进入监视模式: {root_dir}")
         try:
-            logger.info(f"开始处理文件夹: {folder_path}")
-            
-            # 获取待处理任务
-            pending_tasks = file_manager.get_pending_tasks(folder_path)
-            
-            if not pending_tasks:
-                logger.info(f"文件夹 {folder_path} 中没有待处理任务")
-                return
-            
-            logger.info(f"文件夹 {folder_path} 中有 {len(pending_tasks)} 个待处理任务")
-            self.total_tasks += len(pending_tasks)
-            
-            # 逐个处理任务
-            for task in pending_tasks:
-                success = await self.process_single_task(folder_path, task)
+            while not self.stop_requested:
+                for folder_path in watcher.poll_changes():
+                    added = self.ingest_folder_changes(scheduler, folder_path, known_tasks, dispatched)
+                    if added:
+                        logger.info(f"文件夹 {folder_path} 新增 {added} 个任务")
                 
-                if success:
-                    self.completed_tasks += 1
-                    logger.info(f"任务完成: {task['image_index']} - {task['prompt'][:50]}...")
-                else:
-                    self.failed_tasks += 1
-                    logger.error(f"任务失败: {task['image_index']} - {task['prompt'][:50]}...")
+                task = scheduler.next_task() or retry_engine.pop_ready()
+                if task is None:
+                    await asyncio.sleep(poll_interval)
+                    continue
                 
-                # 任务间智能延时，避免请求过于频繁
-                delay_time = config_manager.get_smart_delay()
-                logger.debug(f"任务间延时: {delay_time:.2f}秒")
-                await asyncio.sleep(delay_time)
-            
-            logger.info(f"文件夹 {folder_path} 处理完成")
-            
-        except Exception as e:
-            logger.error(f"处理文件夹任务失败: {e}")
+                dispatched.add((task.folder_path, task.excel_row))
+                await self.execute_task(task)
+                # 程序自己回写了状态和视频文件，更新签名避免再次触发
+                watcher.acknowledge(task.folder_path)
+        finally:
+            watcher.stop()
+            logger.info("监视模式已退出")
+            self.print_final_statistics()
     
-    async def process_single_task(self, folder_path: str, task: Dict) -> bool:
+    def ingest_folder_changes(self, scheduler: TaskScheduler, folder_path: str,
+                              known_tasks: Dict[Tuple[str, int], TaskRecord], dispatched: set) -> int:
+        """
+        读取发生变化的文件夹，与已入队的任务比较，只把增量加入调度器
+        - 新行或新补充了图片的行：加入队列
+        - 还在队列中未执行的行：原地更新提示词、图片和优先级
+        - 已执行过的行：提示词有变化时重新加入队列
+        返回新加入队列的任务数
+        """
+        added = 0
+        for task in file_manager.iter_pending_tasks(folder_path):
+            key = (task.folder_path, task.excel_row)
+            known = known_tasks.get(key)
+            if known is not None and key not in dispatched:
+                known.prompt = task.prompt
+                known.image_path = task.image_path
+                if known.priority != task.priority:
+                    scheduler.update_priority(known, task.priority)
+                known.video_options = task.video_options
+                continue
+            if known is not None and known.prompt == task.prompt:
+                continue
+            dispatched.discard(key)
+            known_tasks[key] = task
+            scheduler.add_task(task)
+            added += 1
+        return added
+    
+    def apply_config_changes(self):
+        """
+        热加载：在任务之间检查配置文件是否被修改，生效后清除依赖旧配置的缓存
+        进行中的任务不受影响（新配置从下一个任务开始使用）
+        """
+        sections = ('download_client', 'download_scheduler')
+        before = {key: config_manager.get_user_config(key) for key in sections}
+        changed = config_manager.reload_if_changed()
+        if 'web_elements' in changed:
+            page_probe.invalidate()
+        if 'user_config' in changed:
+            if config_manager.get_user_config('download_client') != before['download_client']:
+                download_client.close()
+            if config_manager.get_user_config('download_scheduler') != before['download_scheduler']:
+                download_scheduler.reset_bandwidth()
+    
+    async def execute_task(self, task: TaskRecord) -> bool:
+        """
+        执行单个任务并更新统计，返回是否成功
+        临时失败的任务交给重试引擎延后重新执行，不计入失败
+        """
+        self.apply_config_changes()
+        # 页面内存和DOM过大时先回收页面
+        await page_watchdog.check(browser_controller)
+        if task.attempts == 0:
+            self.total_tasks += 1
+        task.attempts += 1
+        await flight_recorder.begin_task(f"{task.folder_path} #{task.image_index} 第{task.attempts}次")
+        run_history.task_started()
+        success = await self.process_single_task(task.folder_path, task)
+        run_history.task_finished(task, success)
+        await flight_recorder.end_task(task, success, browser_controller.page)
+        # 每个任务结束时保存阶段耗时（作业服务模式下不会打印最终统计，运行也可能被中断）
+        phase_stats.save()
+        
+        if success:
+            self.completed_tasks += 1
+            logger.info(f"任务完成: {task.image_index} - {task.prompt[:50]}...")
+        elif not retry_engine.on_failure(task, task.last_failure):
+            self.failed_tasks += 1
+            logger.error(f"任务失败: {task.image_index} - {task.prompt[:50]}... [{task.last_failure.label}]")
+        
+        # 任务间智能延时，避免请求过于频繁
+        delay_time = config_manager.get_smart_delay()
+        logger.debug(f"任务间延时: {delay_time:.2f}秒")
+        await asyncio.sleep(delay_time)
+        return success
+    
+    async def process_single_task(self, folder_path: str, task: TaskRecord) -> bool:
         """
         处理单个任务
-        返回是否成功
+        返回是否成功，失败原因分类后记录在 task.last_failure
         """
         try:
-            logger.info(f"处理任务: 图片 {task['image_index']} - {task['prompt']}")
-            
-            # 使用浏览器控制器处理任务
-            video_url = await browser_controller.process_single_task(
-                task['image_path'], 
-                task['prompt']
-            )
-            
-            if video_url:
-                # 下载并保存视频
-                video_path = file_manager.save_video_file(
-                    video_url, 
+            logger.info(f"处理任务: 图片 {task.image_index} - {task.prompt}")
+            
+            if task.video_url:
+                # 上次已生成视频但下载失败，只重试下载
+                logger.info(f"复用已生成的视频链接，重新下载: {task.video_url}")
+            else:
+                # 网站限流或故障时等待熔断器放行
+                await circuit_breaker.before_submit()
+                deadline = TaskDeadline.for_task(task.video_options)
+                try:
+                    # 使用浏览器控制器处理任务
+                    task.video_url = await browser_controller.process_single_task(
+                        task.image_path, 
+                        task.prompt,
+                        task.video_options,
+                        deadline
+                    )
+                except Exception as e:
+                    failure = classify_exception(e)
+                    failure.outage = circuit_breaker.record_failure(failure)
+                    # 网站整体异常期间的超时不代表正常生成耗时，不计入自适应超时
+                    if failure.kind == FailureKind.GENERATION_TIMEOUT and not failure.outage:
+                        generation_timeout.note_timeout(task.video_options, deadline.elapsed.get('generation', 0))
+                    raise failure
+                circuit_breaker.record_success()
+            
+            # 优先使用浏览器预览时已加载的视频，不完整时再下载
+            video_path = None
+            if video_capture.enabled():
+                video_path = await video_capture.save(task.video_url, folder_path, task.image_index, task.prompt)
+            if video_path is None:
+                # 下载并保存视频（CDN需要时带上浏览器的Cookie）
+                await download_client.sync_from_browser(
+                    browser_controller.context, browser_controller.page, task.video_url
+                )
+                with phase_stats.measure('download'):
+                    video_path = await download_scheduler.download(task, folder_path)
+            task.video_path = video_path
+            
+            # 检查实际分辨率/帧率并写入视频目录，不符时状态写为需重新生成
+            mismatches = await video_catalog.record(task, video_path)
+            status = video_catalog.requeue_status() if mismatches else None
+            
+            # 更新Excel状态（直接提交的任务没有清单）
+            if task.excel_row is not None:
+                file_manager.update_task_status(
                     folder_path, 
-                    task['image_index'],
-                    task['prompt']
+                    task.excel_row,
+                    status
                 )
-                
-                if video_path:
-                    # 更新Excel状态
-                    file_manager.update_task_status(
-                        folder_path, 
-                        task['excel_row']
-                    )
-                    
-                    logger.info(f"任务完成: 视频已保存到 {video_path}")
-                    return True
-                else:
-                    logger.error("视频下载失败")
-                    return False
-            else:
-                logger.error("未获取到视频链接")
-                return False
+            
+            logger.info(f"任务完成: 视频已保存到 {video_path}")
+            return True
                 
         except Exception as e:
-            logger.error(f"处理单个任务失败: {e}")
+            failure = classify_exception(e)
+            task.last_failure = failure
+            task.failures = (task.failures or []) + [failure.kind]
+            logger.error(f"处理单个任务失败: [{failure.label}] {failure}")
             return False
     
     def print_final_statistics(self):
@@ -154,16 +323,38 @@ class TaskProcessor:
             success_rate = (self.completed_tasks / self.total_tasks) * 100
             logger.info(f"成功率: {success_rate:.1f}%")
         
+        if retry_engine.retry_count:
+            logger.info(f"重试次数: {retry_engine.retry_count}")
+        retry_engine.report()
+        circuit_breaker.report()
+        download_client.report()
+        download_scheduler.report()
+        video_capture.report()
+        api_mode.report()
+        video_catalog.report()
+        selector_resolver.report()
+        flight_recorder.report()
+        page_watchdog.report()
+        resource_policy.report()
+        
         logger.info("=" * 50)
     
     async def cleanup(self):
-        """清理资源"""
+        """清理资源（浏览器会话保留给下次运行）"""
+        run_history.end_run(self.total_tasks, self.completed_tasks, self.failed_tasks)
+        phase_stats.save()
         try:
             await browser_controller.cleanup()
             logger.info("任务处理器清理完成")
             
         except Exception as e:
             logger.error(f"清理任务处理器失败: {e}")
+    
+    async def shutdown(self):
+        """彻底释放浏览器连接（进程退出前调用）"""
+        await browser_controller.shutdown()
+        download_client.close()
+        video_catalog.close()
 
 
 # 全局任务处理器实例
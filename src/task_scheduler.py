@@ -0,0 +1,153 @@
+"""
+任务调度器
+将所有文件夹的待处理任务合并到一个全局优先级队列中，
+同优先级的文件夹之间轮流出队（公平分享），可选按视频参数分组减少参数切换
+"""
+
+import heapq
+import itertools
+from typing import Dict, Iterator, List, Optional
+from loguru import logger
+from src.task_source import TaskRecord
+
+
+def video_options_key(video_options: Optional[dict]):
+    """把视频参数转换为可比较的分组键，None表示使用全局配置"""
+    if not video_options:
+        return None
+    return tuple(sorted(video_options.items()))
+
+
+class _FolderQueue:
+    """单个文件夹的任务队列，从任务迭代器中按需预读"""
+
+    def __init__(self, folder_path: str, tasks: Iterator[TaskRecord], lookahead: int):
+        self.folder_path = folder_path
+        self.tasks = tasks
+        self.lookahead = lookahead
+        self.buffer: List[tuple] = []   # 堆：(-优先级, 序号, 任务)
+        self.exhausted = False
+        self.last_served = -1           # 上一次出队的调度轮次，越小越久没被服务
+        self._serial = itertools.count()
+
+    def refill(self):
+        """预读任务直到填满预读窗口（lookahead<=0 时整表预读）"""
+        while not self.exhausted and (self.lookahead <= 0 or len(self.buffer) < self.lookahead):
+            try:
+                task = next(self.tasks)
+            except StopIteration:
+                self.exhausted = True
+                break
+            self.push(task)
+
+    def push(self, task: TaskRecord):
+        heapq.heappush(self.buffer, (-task.priority, next(self._serial), task))
+
+    def head(self) -> Optional[TaskRecord]:
+        return self.buffer[0][2] if self.buffer else None
+
+    def reprioritize(self, task: TaskRecord, priority: int) -> bool:
+        """修改队列中任务的优先级并调整堆（保留原序号），任务不在队列中时返回False"""
+        for index, (_, serial, queued) in enumerate(self.buffer):
+            if queued is task:
+                task.priority = priority
+                self.buffer[index] = (-priority, serial, task)
+                heapq.heapify(self.buffer)
+                return True
+        return False
+
+    def pop(self) -> TaskRecord:
+        return heapq.heappop(self.buffer)[2]
+
+    @property
+    def finished(self) -> bool:
+        return self.exhausted and not self.buffer
+
+
+class TaskScheduler:
+    """
+    全局任务调度器
+    - 优先处理优先级最高的任务（行优先级 > 文件夹优先级 > 0）
+    - 同优先级的文件夹轮流出队，避免大文件夹饿死其它文件夹
+    - group_by_video_options 开启时，同优先级下优先选择与上一个任务视频参数相同的文件夹，
+      但连续同参数任务超过 max_group_run 个后恢复轮转，避免其它参数的文件夹一直等待
+    - 行优先级只在每个文件夹的预读窗口内比较（lookahead<=0 时整表比较）
+    """
+
+    def __init__(self, group_by_video_options: bool = False, lookahead: int = 50, max_group_run: int = 20):
+        self.group_by_video_options = group_by_video_options
+        self.lookahead = lookahead
+        self.max_group_run = max_group_run
+        self._group_run = 0         # 连续相同视频参数的任务数
+        self._folders: Dict[str, _FolderQueue] = {}
+        self._round = 0
+        self._last_options_key = None
+        self.option_switches = 0    # 视频参数切换次数
+
+    def add_folder(self, folder_path: str, tasks: Iterator[TaskRecord]):
+        """添加一个文件夹的任务来源（任务迭代器按需读取）"""
+        if folder_path in self._folders:
+            logger.warning(f"文件夹已在调度队列中，跳过: {folder_path}")
+            return
+        self._folders[folder_path] = _FolderQueue(folder_path, iter(tasks), self.lookahead)
+
+    def add_task(self, task: TaskRecord):
+        """添加单个任务（例如重新入队的任务）"""
+        queue = self._folders.get(task.folder_path)
+        if queue is None:
+            queue = _FolderQueue(task.folder_path, iter(()), self.lookahead)
+            queue.exhausted = True
+            self._folders[task.folder_path] = queue
+        queue.push(task)
+
+    def update_priority(self, task: TaskRecord, priority: int):
+        """修改已入队任务的优先级（直接修改 task.priority 会破坏队列的堆顺序）"""
+        queue = self._folders.get(task.folder_path)
+        if queue is None or not queue.reprioritize(task, priority):
+            task.priority = priority
+
+    def has_folder(self, folder_path: str) -> bool:
+        return folder_path in self._folders
+
+    def next_task(self) -> Optional[TaskRecord]:
+        """取出下一个要执行的任务，所有队列为空时返回None"""
+        candidates = []
+        for folder_path, queue in list(self._folders.items()):
+            queue.refill()
+            if queue.finished:
+                logger.info(f"文件夹 {folder_path} 的任务已全部调度")
+                del self._folders[folder_path]
+                continue
+            candidates.append(queue)
+
+        if not candidates:
+            return None
+
+        best_priority = max(queue.head().priority for queue in candidates)
+        candidates = [queue for queue in candidates if queue.head().priority == best_priority]
+
+        if self.group_by_video_options and self._group_run < self.max_group_run:
+            same_options = [
+                queue for queue in candidates
+                if video_options_key(queue.head().video_options) == self._last_options_key
+            ]
+            if same_options:
+                candidates = same_options
+
+        # 公平分享：选择最久没有被服务的文件夹
+        queue = min(candidates, key=lambda q: q.last_served)
+        task = queue.pop()
+        queue.last_served = self._round
+        self._round += 1
+
+        options_key = video_options_key(task.video_options)
+        if self._round > 1 and options_key != self._last_options_key:
+            self.option_switches += 1
+            self._group_run = 0
+        self._group_run += 1
+        self._last_options_key = options_key
+        return task
+
+    @property
+    def is_empty(self) -> bool:
+        return all(queue.finished for queue in self._folders.values())
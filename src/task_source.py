@@ -0,0 +1,198 @@
+"""
+任务数据源
+以流式方式读取任务清单，只读取提示词列和状态列，逐行产出任务
+支持的清单格式：Excel(.xlsx/.xls)、CSV、JSONL、Parquet
+"""
+
+import io
+import os
+import csv
+import json
+from typing import Iterator, Tuple, Any, Dict, List, Optional
+
+# 任务清单扩展名，同一文件夹有多个清单时按此顺序优先选择
+MANIFEST_EXTENSIONS = ['.xlsx', '.xls', '.csv', '.jsonl', '.parquet']
+
+# 非Excel清单的状态不回写源文件，而是追加到同名的状态旁路文件中
+STATUS_SIDECAR_SUFFIX = '.status.jsonl'
+
+
+class TaskRecord:
+    """待处理任务记录（使用__slots__，大批量任务时内存占用更小）"""
+    __slots__ = ('folder_path', 'excel_row', 'image_index', 'image_path', 'prompt', 'priority', 'video_options',
+                 'job_id', 'video_path', 'video_url', 'attempts', 'failures', 'last_failure', 'outage_requeues')
+
+    def __init__(self, folder_path: str, excel_row: Optional[int], image_index: int, image_path: str, prompt: str,
+                 priority: int = 0, video_options: Optional[dict] = None, job_id: Optional[str] = None):
+        self.folder_path = folder_path  # 任务文件夹，也是视频保存目录
+        self.excel_row = excel_row      # 数据行序号，从0开始（不含表头）；None表示没有清单（直接提交的任务）
+        self.image_index = image_index  # 对应图片序号，等于 excel_row + 1
+        self.image_path = image_path
+        self.prompt = prompt
+        self.priority = priority        # 数值越大越优先
+        self.video_options = video_options  # 文件夹级视频参数，None表示使用全局配置
+        self.job_id = job_id            # 所属作业（服务模式）
+        self.video_path = None          # 完成后保存的视频路径
+        self.video_url = None           # 已生成视频的链接（下载失败重试时不再重新生成）
+        self.attempts = 0               # 已执行次数
+        self.failures = None            # 历次失败类型列表（首次失败时创建）
+        self.last_failure = None        # 最近一次失败（TaskFailure）
+        self.outage_requeues = 0        # 因网站整体异常重新排队的次数
+
+    def __repr__(self):
+        return f"TaskRecord(folder={self.folder_path!r}, row={self.excel_row}, image={self.image_index})"
+
+
+def iter_manifest_rows(manifest_path: str, prompt_column: int, status_column: int,
+                       priority_column: int = 0) -> Iterator[Tuple[int, Any, Any, Any]]:
+    """
+    按清单格式流式读取提示词列、状态列和优先级列（列号从1开始，0表示不读取）
+    非Excel清单的状态以旁路文件中的记录为准
+    返回: 迭代 (数据行序号, 提示词, 状态, 优先级)
+    """
+    ext = os.path.splitext(manifest_path)[1].lower()
+    readers = {
+        '.xlsx': iter_excel_rows,
+        '.xls': iter_excel_rows,
+        '.csv': iter_csv_rows,
+        '.jsonl': iter_jsonl_rows,
+        '.parquet': iter_parquet_rows,
+    }
+    reader = readers.get(ext)
+    if reader is None:
+        raise ValueError(f"不支持的任务清单格式: {manifest_path}")
+
+    columns = [prompt_column, status_column, priority_column]
+    sidecar_status = read_sidecar_status(manifest_path) if uses_status_sidecar(manifest_path) else {}
+    for row_index, (prompt, status, priority) in reader(manifest_path, columns):
+        yield row_index, prompt, sidecar_status.get(row_index, status), priority
+
+
+def iter_excel_rows(excel_path: str, columns: List[int]) -> Iterator[Tuple[int, tuple]]:
+    """
+    流式读取Excel中指定的列（列号从1开始，0表示不读取，第1行为表头）
+    返回: 迭代 (数据行序号, 与columns对应的取值)
+    """
+    if excel_path.lower().endswith('.xls'):
+        # openpyxl不支持旧版.xls格式，只能退回pandas整表读取
+        yield from _iter_xls_rows(excel_path, columns)
+        return
+
+    from openpyxl import load_workbook
+
+    # 先把文件读入内存再解析：处理过程中会回写状态到同一个文件，
+    # 只读模式若一直占用文件句柄，Windows下会导致保存失败
+    with open(excel_path, 'rb') as f:
+        data = io.BytesIO(f.read())
+
+    workbook = load_workbook(data, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        wanted = [column for column in columns if column > 0]
+        min_col = min(wanted)
+        max_col = max(wanted)
+        rows = sheet.iter_rows(min_row=2, min_col=min_col, max_col=max_col, values_only=True)
+        for row_index, values in enumerate(rows):
+            yield row_index, tuple(_pick(values, column - min_col + 1) if column > 0 else None for column in columns)
+    finally:
+        workbook.close()
+
+
+def _iter_xls_rows(excel_path: str, columns: List[int]) -> Iterator[Tuple[int, tuple]]:
+    """读取旧版.xls文件（依赖pandas）"""
+    import pandas as pd
+
+    df = pd.read_excel(excel_path)
+    for row_index, row in enumerate(df.itertuples(index=False)):
+        values = tuple(None if pd.isna(value) else value for value in row)
+        yield row_index, tuple(_pick(values, column) for column in columns)
+
+
+def iter_csv_rows(csv_path: str, columns: List[int]) -> Iterator[Tuple[int, tuple]]:
+    """流式读取CSV（第1行为表头，兼容Excel导出的带BOM文件）"""
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row_index, row in enumerate(reader):
+            yield row_index, tuple(_pick(row, column) or None for column in columns)
+
+
+def iter_jsonl_rows(jsonl_path: str, columns: List[int]) -> Iterator[Tuple[int, tuple]]:
+    """
+    流式读取JSONL（无表头，每行一个任务）
+    每行可以是数组，也可以是对象（按字段书写顺序对应列号）
+    """
+    with open(jsonl_path, 'r', encoding='utf-8-sig') as f:
+        row_index = 0
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            values = list(record.values()) if isinstance(record, dict) else list(record)
+            yield row_index, tuple(_pick(values, column) for column in columns)
+            row_index += 1
+
+
+def iter_parquet_rows(parquet_path: str, columns: List[int]) -> Iterator[Tuple[int, tuple]]:
+    """按批流式读取Parquet，只解码需要的列（依赖pyarrow）"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("读取Parquet任务清单需要安装pyarrow: pip install pyarrow")
+
+    parquet_file = pq.ParquetFile(parquet_path)
+    names = [_pick(parquet_file.schema_arrow.names, column) for column in columns]
+    wanted = [name for name in dict.fromkeys(names) if name is not None]
+    if not wanted:
+        return
+
+    row_index = 0
+    for batch in parquet_file.iter_batches(columns=wanted):
+        data = batch.to_pydict()
+        for i in range(batch.num_rows):
+            yield row_index, tuple(data[name][i] if name is not None else None for name in names)
+            row_index += 1
+
+
+def _pick(values, column: int):
+    """按列号（从1开始）取值，列号为0或超出范围时返回None"""
+    if column <= 0 or len(values) < column:
+        return None
+    return values[column - 1]
+
+
+def get_sidecar_path(manifest_path: str) -> str:
+    """获取清单对应的状态旁路文件路径"""
+    return manifest_path + STATUS_SIDECAR_SUFFIX
+
+
+def uses_status_sidecar(manifest_path: str) -> bool:
+    """判断清单的状态是否写入旁路文件（非Excel格式）"""
+    return os.path.splitext(manifest_path)[1].lower() not in ('.xlsx', '.xls')
+
+
+def read_sidecar_status(manifest_path: str) -> Dict[int, Any]:
+    """读取状态旁路文件，返回 {数据行序号: 状态}，同一行以最后一条记录为准"""
+    sidecar_path = get_sidecar_path(manifest_path)
+    statuses = {}
+    if not os.path.exists(sidecar_path):
+        return statuses
+    with open(sidecar_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                statuses[int(record['row'])] = record.get('status')
+            except (ValueError, KeyError, TypeError):
+                # 进程中断可能留下半行记录，跳过即可
+                continue
+    return statuses
+
+
+def append_sidecar_status(manifest_path: str, row_index: int, status: str):
+    """追加一条状态记录到旁路文件（不改写源清单）"""
+    with open(get_sidecar_path(manifest_path), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'row': row_index, 'status': status}, ensure_ascii=False) + '\n')
@@ -0,0 +1,148 @@
+"""
+视频响应捕获
+生成完成后页面的<video>已经在加载MP4用于预览，这里记录页面收到的视频响应，
+任务完成时直接从浏览器取出响应内容写入任务文件夹，省去再从CDN下载一次；
+浏览器只加载了部分内容（分段请求未覆盖整个文件）时返回None，由调用方改为正常下载
+"""
+
+import os
+import re
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+from loguru import logger
+from src.config_manager import config_manager
+from src.file_manager import file_manager
+
+_CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+
+def _url_key(url: str) -> str:
+    """同一视频的地址可能只差查询参数（签名），按主机+路径匹配"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+class VideoCapture:
+    """
+    视频响应捕获
+    - 只保存Response对象（内容仍在浏览器中），按视频地址分组，最多保留 MAX_URLS 个地址
+    - 完整的200响应直接使用；206分段响应拼接后必须覆盖整个文件
+    """
+
+    MAX_URLS = 20
+
+    def __init__(self):
+        self._responses: "OrderedDict[str, List]" = OrderedDict()
+        self._attached_pages = weakref.WeakSet()
+        self.captured = 0
+        self.captured_bytes = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(config_manager.get_user_config('capture_browser_video'))
+
+    def attach(self, page):
+        """在页面上监听响应（同一页面只注册一次）"""
+        if page is None or page in self._attached_pages or not self.enabled():
+            return
+        page.on('response', self._on_response)
+        self._attached_pages.add(page)
+
+    def _on_response(self, response):
+        content_type = (response.headers.get('content-type') or '').lower()
+        if 'video/mp4' not in content_type and not urlsplit(response.url).path.lower().endswith('.mp4'):
+            return
+        if response.status not in (200, 206):
+            return
+        key = _url_key(response.url)
+        self._responses.setdefault(key, []).append(response)
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.MAX_URLS:
+            self._responses.popitem(last=False)
+
+    async def _assemble(self, responses: List) -> Optional[bytes]:
+        """从捕获的响应拼出完整文件，不完整时返回None"""
+        segments: Dict[int, bytes] = {}
+        total = None
+        for response in responses:
+            try:
+                body = await response.body()
+            except Exception as e:
+                logger.debug(f"读取浏览器视频响应失败: {e}")
+                continue
+            headers = response.headers
+            if response.status == 200:
+                expected = headers.get('content-length')
+                if expected is None or int(expected) == len(body):
+                    return body
+                continue
+            match = _CONTENT_RANGE.match(headers.get('content-range') or '')
+            if not match:
+                continue
+            start = int(match.group(1))
+            if match.group(3) != '*':
+                total = int(match.group(3))
+            if len(body) > len(segments.get(start, b'')):
+                segments[start] = body
+
+        if not total or not segments:
+            return None
+        data = bytearray()
+        for start in sorted(segments):
+            if start > len(data):
+                return None     # 中间有空缺
+            data.extend(segments[start][len(data) - start:])
+        return bytes(data[:total]) if len(data) >= total else None
+
+    async def save(self, video_url: str, folder_path: str, image_index: int, prompt: str) -> Optional[str]:
+        """
+        把浏览器已加载的视频写入任务文件夹，返回保存路径；
+        未捕获到或内容不完整时返回None
+        """
+        responses = self._responses.get(_url_key(video_url))
+        if not responses:
+            self.fallbacks += 1
+            logger.info("浏览器未加载该视频，改为下载")
+            return None
+        data = await self._assemble(responses)
+        if data is None:
+            self.fallbacks += 1
+            logger.info("浏览器只加载了部分视频内容，改为下载")
+            return None
+
+        video_path = file_manager.get_video_path(folder_path, image_index, prompt)
+        with open(video_path, 'wb') as f:
+            f.write(data)
+        if not file_manager.is_valid_video_file(video_path):
+            os.remove(video_path)
+            self.fallbacks += 1
+            logger.warning("浏览器中的视频内容无效，改为下载")
+            return None
+
+        self._responses.pop(_url_key(video_url), None)
+        self.captured += 1
+        self.captured_bytes += len(data)
+        logger.info(f"已从浏览器取得视频，无需重新下载: {video_path}（{len(data) / 1024 / 1024:.1f} MB）")
+        return video_path
+
+    def report(self):
+        """输出捕获统计"""
+        if not self.captured and not self.fallbacks:
+            return
+        logger.info(
+            f"浏览器视频捕获: 成功 {self.captured} 个（节省下载 {self.captured_bytes / 1024 / 1024:.1f} MB），"
+            f"改为下载 {self.fallbacks} 个"
+        )
+
+    def reset(self):
+        """重置统计（已捕获的响应保留）"""
+        self.captured = 0
+        self.captured_bytes = 0
+        self.fallbacks = 0
+
+
+# 全局视频捕获实例
+video_capture = VideoCapture()
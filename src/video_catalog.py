@@ -0,0 +1,179 @@
+"""
+视频目录
+每个视频保存后在进程池中解析MP4元数据（不占用事件循环），结果写入根目录下的 video_catalog.db（SQLite），
+下游工具可直接查询时长、分辨率、帧率等，无需逐个打开视频；
+实际参数与请求的 video_options 不符时标记为需重新生成
+
+查询示例:
+    sqlite3 video_catalog.db "SELECT path, width, height, fps FROM videos WHERE needs_regeneration = 1"
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from typing import Dict, List, Optional
+from loguru import logger
+from src.config_manager import config_manager
+from src.mp4_metadata import parse_mp4, check_delivery
+from src.task_source import TaskRecord
+
+CATALOG_FILENAME = 'video_catalog.db'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    path TEXT PRIMARY KEY,          -- 相对于根目录的路径
+    folder TEXT,
+    image_index INTEGER,
+    prompt TEXT,
+    size INTEGER,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    codec TEXT,
+    bitrate_kbps INTEGER,
+    has_audio INTEGER,
+    requested TEXT,                 -- 请求的视频参数（JSON）
+    mismatch TEXT,                  -- 不符项，多个用分号分隔
+    needs_regeneration INTEGER,
+    checked_at TEXT
+)
+"""
+
+
+class VideoCatalog:
+    """
+    视频目录
+    - 元数据在进程池中解析（进程池不可用时改为线程）
+    - 每个根目录一个数据库，直接提交的任务（不在根目录下）写入所在文件夹
+    """
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._connections: Dict[str, sqlite3.Connection] = {}
+        self.checked = 0
+        self.mismatched = 0
+        self.unreadable = 0
+
+    @staticmethod
+    def _settings() -> dict:
+        settings = {'enabled': True, 'workers': 2, 'requeue_mismatched': True, 'mismatch_status': '需重新生成'}
+        settings.update(config_manager.get_user_config('video_catalog') or {})
+        return settings
+
+    def enabled(self) -> bool:
+        return bool(self._settings()['enabled'])
+
+    def _catalog_root(self, folder_path: str) -> str:
+        folder = os.path.abspath(folder_path)
+        root = config_manager.get_user_config('root_directory')
+        if root:
+            root = os.path.abspath(root)
+            if os.path.commonpath([root, folder]) == root:
+                return root
+        return folder
+
+    def _connection(self, root: str) -> sqlite3.Connection:
+        connection = self._connections.get(root)
+        if connection is None:
+            connection = sqlite3.connect(os.path.join(root, CATALOG_FILENAME))
+            connection.execute(_SCHEMA)
+            self._connections[root] = connection
+        return connection
+
+    async def _parse(self, video_path: str) -> Dict:
+        loop = asyncio.get_running_loop()
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=max(1, int(self._settings()['workers'])))
+        try:
+            return await loop.run_in_executor(self._pool, parse_mp4, video_path)
+        except (BrokenProcessPool, NotImplementedError, PermissionError) as e:
+            # 打包环境等无法启动子进程时改用线程
+            logger.warning(f"元数据解析进程池不可用，改用线程: {e}")
+            self._pool = None
+            return await asyncio.to_thread(parse_mp4, video_path)
+
+    async def record(self, task: TaskRecord, video_path: str) -> List[str]:
+        """解析视频并写入目录，返回与请求参数的不符项（解析失败时返回空列表）"""
+        if not self.enabled():
+            return []
+        requested = task.video_options or config_manager.get_user_config('video_options') or {}
+        try:
+            metadata = await self._parse(video_path)
+        except Exception as e:
+            self.unreadable += 1
+            logger.warning(f"无法读取视频元数据: {video_path} {e}")
+            return []
+
+        mismatches = check_delivery(metadata, requested)
+        root = self._catalog_root(task.folder_path)
+        try:
+            connection = self._connection(root)
+            connection.execute(
+                "INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    os.path.relpath(os.path.abspath(video_path), root), os.path.relpath(os.path.abspath(task.folder_path), root),
+                    task.image_index, task.prompt, metadata['size'], metadata['duration'],
+                    metadata['width'], metadata['height'], metadata['fps'], metadata['codec'],
+                    metadata['bitrate_kbps'], int(metadata['has_audio']),
+                    json.dumps(requested, ensure_ascii=False), '；'.join(mismatches) or None,
+                    int(bool(mismatches)), time.strftime('%Y-%m-%d %H:%M:%S'),
+                )
+            )
+            connection.commit()
+        except Exception as e:
+            logger.error(f"写入视频目录失败: {e}")
+
+        self.checked += 1
+        if mismatches:
+            self.mismatched += 1
+            logger.warning(f"视频参数与请求不符，已标记为需重新生成: {video_path}（{'；'.join(mismatches)}）")
+        else:
+            logger.info(
+                f"视频参数: {metadata['width']}x{metadata['height']} {metadata['fps']}fps "
+                f"{metadata['codec']} {metadata['bitrate_kbps']}kbps，时长 {metadata['duration']} 秒"
+            )
+        return mismatches
+
+    def requeue_status(self) -> Optional[str]:
+        """参数不符的任务写入的状态（不是完成状态，下次运行会重新生成）；不重新生成时返回None"""
+        settings = self._settings()
+        return settings['mismatch_status'] if settings['requeue_mismatched'] else None
+
+    def flagged(self, root: str) -> List[Dict]:
+        """查询根目录下标记为需重新生成的视频"""
+        path = os.path.join(root, CATALOG_FILENAME)
+        if not os.path.exists(path):
+            return []
+        with closing(sqlite3.connect(path)) as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute("SELECT * FROM videos WHERE needs_regeneration = 1 ORDER BY folder, image_index")
+            return [dict(row) for row in rows]
+
+    def report(self):
+        """输出检查统计"""
+        if not self.checked and not self.unreadable:
+            return
+        logger.info(f"视频参数检查: {self.checked} 个，不符 {self.mismatched} 个，无法读取 {self.unreadable} 个")
+
+    def reset(self):
+        self.checked = 0
+        self.mismatched = 0
+        self.unreadable = 0
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+
+# 全局视频目录实例
+video_catalog = VideoCatalog()